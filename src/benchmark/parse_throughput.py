@@ -0,0 +1,77 @@
+# schedule parsing throughput
+# parses a generated schedule with multi-digit transaction ids and long
+# data item names three ways: split with parse_input then parse_schedule,
+# tokenize_schedule over the whole string, streamed from a file with
+# read_operations and iter_schedule, and replayed from a binary trace with
+# iter_trace
+
+# usage
+# python3 src/benchmark/parse_throughput.py [operations]
+
+import random
+import tempfile
+import time
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from concurrency_control.TwoPhaseLocking import parse_schedule, tokenize_schedule, iter_schedule, iter_trace, convert_schedule
+from util.Util import parse_input, read_operations, SymbolTable
+from util.Trace import Trace
+
+def schedule_text(operations: int, transactions: int = 10000, data_items: int = 100000, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(operations):
+        transaction_id = rng.randrange(1, transactions + 1)
+        choice = rng.random()
+        if choice < 0.1:
+            parts.append(f"C{transaction_id}")
+        elif choice < 0.55:
+            parts.append(f"R{transaction_id}(account_{rng.randrange(data_items)})")
+        else:
+            parts.append(f"W{transaction_id}(account_{rng.randrange(data_items)})")
+    return "; ".join(parts) + ";"
+
+def measure(function) -> tuple:
+    start = time.perf_counter()
+    count = function()
+    return count, time.perf_counter() - start
+
+def count(iterable) -> int:
+    n = 0
+    for _ in iterable:
+        n += 1
+    return n
+
+if __name__ == "__main__":
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    text = schedule_text(operations)
+    megabytes = len(text) / 2**20
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "schedule")
+        with open(path, "w") as f:
+            f.write(text)
+        trace_path = os.path.join(directory, "schedule.trace")
+        convert_schedule(path, trace_path)
+        trace = Trace(trace_path)
+
+        runs = [
+            ("parse_input + parse_schedule", lambda: len(parse_schedule(parse_input(text), SymbolTable()))),
+            ("tokenize_schedule", lambda: count(tokenize_schedule(text, SymbolTable()))),
+            ("read_operations + iter_schedule", lambda: count(iter_schedule(read_operations(path), SymbolTable()))),
+            ("iter_trace", lambda: count(iter_trace(trace, SymbolTable()))),
+        ]
+
+        print(f"{operations} operations, {megabytes:.1f} MB")
+        print(f"{'parser':<32} {'seconds':>8} {'ops/s':>12} {'MB/s':>8}")
+        for name, function in runs:
+            parsed, seconds = measure(function)
+            assert parsed == operations
+            print(f"{name:<32} {seconds:>8.3f} {parsed / seconds:>12.0f} {megabytes / seconds:>8.1f}")
+        trace.close()
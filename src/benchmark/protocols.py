@@ -0,0 +1,199 @@
+# cross protocol benchmark
+# runs TwoPhaseLocking with every combination of its options, OCC, MVCC and
+# timestamp ordering on the same generated workloads and prints one JSON
+# object per run, so results can be diffed between commits
+
+# reported per run
+# operations_per_second  workload operations (commits included) per second
+# abort_rate             aborts per transaction of the workload
+# wasted_operations      executed operations thrown away by aborts
+# peak_memory            peak bytes allocated during a second, traced run
+# serializable           whether the committed history is conflict
+#                        serializable, TwoPhaseLocking runs are checked from
+#                        their history, OCC and timestamp ordering in a
+#                        third run recording one, MVCC is not checked as
+#                        snapshot isolation is not meant to be serializable
+# a run that fails, ends in a deadlock, processes more than STEP_LIMIT
+# operations per workload operation (a livelock, TwoPhaseLocking only) or
+# commits a history that is not conflict serializable stops the benchmark
+# with an error naming the configuration, nothing is reported as a result
+
+# configurations without deadlock handling, the "none" policy and queued
+# lock requests, only run with --unhandled, meant for workloads that cannot
+# deadlock
+
+# usage
+# python3 src/benchmark/protocols.py [--transactions N] [--operations N]
+#     [--read-ratio R] [--keys N] [--skew S] [--concurrency N] [--seed N]
+#     [--runs N] [--no-memory] [--no-check] [--unhandled]
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import time
+import tracemalloc
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, IndexedLockManager, LockRequestManager
+from concurrency_control.OCC import OCCTransaction, OCC
+from concurrency_control.MVCC import MVCCTransaction, MVCC
+from concurrency_control.TimestampOrdering import TimestampOrdering
+from transaction.Transaction import Transaction
+from util.Util import DEADLOCK_POLICIES
+from util.Workload import Workload
+from concurrency_control.Serializability import HistoryRecorder, check_serializable
+
+# processed operations per workload operation stay below 25 for every policy
+# on contended workloads (20 keys), a livelock never finishes
+STEP_LIMIT = 100
+
+def tpl_configurations(unhandled: bool = False) -> list:
+    # (name, options) of every TwoPhaseLocking run, unhandled adds the ones
+    # without deadlock handling
+    configurations = []
+    policies = DEADLOCK_POLICIES if unhandled else [p for p in DEADLOCK_POLICIES if p != "none"]
+    for upgrade, deadlock, wakeup in itertools.product(
+            [False, True], policies, ["all", "targeted"]):
+        configurations.append(("2PL", {
+            "lock_manager": "indexed", "upgrade": upgrade,
+            "deadlock": deadlock, "wakeup": wakeup,
+        }))
+    # queued lock requests only run without deadlock handling
+    if unhandled:
+        for upgrade in [False, True]:
+            configurations.append(("2PL", {
+                "lock_manager": "queued", "upgrade": upgrade,
+                "deadlock": "none", "wakeup": "all",
+            }))
+    return configurations
+
+def make_tpl(workload: Workload, options: dict, recorder: HistoryRecorder = None):
+    lockmanager = LockRequestManager() if options["lock_manager"] == "queued" else IndexedLockManager()
+    tpl = TwoPhaseLocking(workload.schedule(), lockmanager)
+
+    def run():
+        tpl.run(upgrade=options["upgrade"], wakeup=options["wakeup"], deadlock=options["deadlock"],
+                max_steps=STEP_LIMIT * len(workload))
+        statistics = tpl.policy.statistics()
+        return statistics["aborts"], statistics["wasted_operations"], tpl
+    return run
+
+def make_engine(engine_class, transaction_class, deferred_writes: bool = None, **kwargs):
+    # deferred_writes is how a HistoryRecorder places the engine's writes,
+    # None if its runs are not checked
+    def factory(workload: Workload, options: dict, recorder: HistoryRecorder = None):
+        transactions, schedule = workload.transaction_schedule(transaction_class)
+        engine = engine_class(transactions, schedule, tracer=recorder, **kwargs)
+
+        def run():
+            engine.run()
+            # rolled back queries are executed again
+            return engine.aborts, engine.executed - len(schedule), recorder
+        return run
+    factory.deferred_writes = deferred_writes
+    return factory
+
+ENGINES = [
+    ("OCC", {}, make_engine(OCC, OCCTransaction, deferred_writes=True)),
+    ("MVCC", {}, make_engine(MVCC, MVCCTransaction)),
+    ("TO", {"thomas_write_rule": False}, make_engine(TimestampOrdering, Transaction, deferred_writes=True)),
+    ("TO", {"thomas_write_rule": True}, make_engine(TimestampOrdering, Transaction, deferred_writes=True,
+                                                    thomas_write_rule=True)),
+]
+
+def configurations(unhandled: bool = False) -> list:
+    # (protocol, options, factory), a factory builds the engine for a
+    # workload and returns a function running it to (aborts, wasted
+    # operations, its history if it has one)
+    return [(name, options, make_tpl) for name, options in tpl_configurations(unhandled)] + ENGINES
+
+def check(factory, workload: Workload, options: dict, history) -> bool:
+    if history is None:
+        deferred_writes = getattr(factory, "deferred_writes", None)
+        if deferred_writes is None:
+            return None
+        run = factory(workload, options, HistoryRecorder(deferred_writes))
+        with contextlib.redirect_stdout(io.StringIO()):
+            history = run()[2]
+    return check_serializable(history).is_serializable()
+
+def measure(factory, workload: Workload, options: dict, memory: bool, serializable: bool = True) -> dict:
+    run = factory(workload, options)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        aborts, wasted, history = run()
+    seconds = time.perf_counter() - start
+
+    result = {
+        "seconds": seconds,
+        "operations_per_second": len(workload) / seconds if seconds else 0.0,
+        "aborts": aborts,
+        "abort_rate": aborts / workload.transactions,
+        "wasted_operations": wasted,
+    }
+
+    if serializable:
+        result["serializable"] = check(factory, workload, options, history)
+        if result["serializable"] is False:
+            raise Exception("History is not conflict serializable")
+
+    if memory:
+        # a second run, tracing slows the engines down
+        run = factory(workload, options)
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run()
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def benchmark(workload: Workload, memory: bool = True, serializable: bool = True, unhandled: bool = False):
+    # yields one result per configuration, raises on the first one that fails
+    parameters = {
+        "transactions": workload.transactions,
+        "operations": workload.operations,
+        "read_ratio": workload.read_ratio,
+        "keys": workload.keys,
+        "skew": workload.skew,
+        "concurrency": workload.concurrency,
+        "seed": workload.seed,
+    }
+    for protocol, options, factory in configurations(unhandled):
+        result = {"protocol": protocol, "options": options, "workload": parameters}
+        try:
+            result.update(measure(factory, workload, options, memory, serializable))
+        except Exception as e:
+            raise Exception(f"{protocol} {json.dumps(options)} on {json.dumps(parameters)}: {e}") from e
+        yield result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross protocol benchmark")
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=10)
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=0.8)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=1, help="workloads, with seeds seed .. seed + runs - 1")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--no-check", action="store_true", help="skip the serializability check")
+    parser.add_argument("--unhandled", action="store_true",
+                        help="also run the configurations without deadlock handling, which fail on workloads that deadlock")
+    args = parser.parse_args()
+
+    for seed in range(args.seed, args.seed + args.runs):
+        workload = Workload(args.transactions, args.operations, args.read_ratio,
+                            args.keys, args.skew, args.concurrency, seed)
+        for result in benchmark(workload, not args.no_memory, not args.no_check, args.unhandled):
+            print(json.dumps(result), flush=True)
@@ -0,0 +1,95 @@
+# schedule length scaling benchmark
+# runs TwoPhaseLocking, OCC, MVCC and timestamp ordering on schedules of growing length and reports
+# the time per operation, which should stay flat if execution is linear.
+# reads and writes go to an in memory store or, with mmap, to a memory
+# mapped file
+
+# usage
+# python3 src/benchmark/schedule_scaling.py [max_operations] [memory|mmap]
+
+import contextlib
+import io
+import tempfile
+import time
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, IndexedLockManager
+from concurrency_control.OCC import OCCTransaction, OCC
+from concurrency_control.MVCC import MVCCTransaction, MVCC
+from concurrency_control.TimestampOrdering import TimestampOrdering
+from transaction.Transaction import Transaction
+from transaction.Query import Read, Write
+from storage.Storage import MemoryStore, MappedStore
+
+STORAGE = "memory"
+DIRECTORY = tempfile.TemporaryDirectory()
+
+def make_storage():
+    if STORAGE == "mmap":
+        return MappedStore(tempfile.mktemp(dir=DIRECTORY.name))
+    return MemoryStore()
+
+def tpl_schedule(length: int) -> list:
+    # interleave two transactions that always touch different items,
+    # transaction ids are reused after each commit
+    schedule = []
+    batch = 0
+    while len(schedule) < length:
+        schedule += [f"R1(A{batch})", f"R2(B{batch})", f"W1(A{batch})",
+                     f"W2(B{batch})", "C1", "C2"]
+        batch += 1
+    return schedule
+
+def occ_workload(length: int, transaction_class=OCCTransaction) -> tuple:
+    transactions = []
+    schedule = []
+    for timestamp in range(1, length // 2 + 1):
+        transactions.append(transaction_class(timestamp, [
+            Read(f"A{timestamp}"),
+            Write(f"A{timestamp}")
+        ]))
+        schedule += [timestamp, timestamp]
+    return transactions, schedule
+
+def measure(function) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    return time.perf_counter() - start
+
+def run_tpl(length: int) -> float:
+    tpl = TwoPhaseLocking(tpl_schedule(length), IndexedLockManager(), make_storage())
+    return measure(lambda: tpl.run(upgrade=True))
+
+def run_occ(length: int) -> float:
+    transactions, schedule = occ_workload(length)
+    occ = OCC(transactions, schedule, make_storage())
+    return measure(occ.run)
+
+def run_mvcc(length: int) -> float:
+    transactions, schedule = occ_workload(length, MVCCTransaction)
+    mvcc = MVCC(transactions, schedule, make_storage())
+    return measure(mvcc.run)
+
+def run_to(length: int) -> float:
+    transactions, schedule = occ_workload(length, Transaction)
+    to = TimestampOrdering(transactions, schedule, thomas_write_rule=True, storage=make_storage())
+    return measure(to.run)
+
+if __name__ == "__main__":
+    max_operations = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    STORAGE = sys.argv[2] if len(sys.argv) > 2 else "memory"
+
+    print(f"{'engine':<6} {'operations':>10} {'seconds':>10} {'us/op':>8}")
+    for name, runner in [("2PL", run_tpl), ("OCC", run_occ), ("MVCC", run_mvcc), ("TO", run_to)]:
+        length = 1000
+        while length <= max_operations:
+            seconds = runner(length)
+            print(f"{name:<6} {length:>10} {seconds:>10.4f} {seconds / length * 1e6:>8.2f}")
+            length *= 2
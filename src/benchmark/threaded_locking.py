@@ -0,0 +1,44 @@
+# lock manager throughput under threads
+# runs the same random workload with a growing number of worker threads
+# against ConcurrentLockManager and reports throughput, aborts and lock
+# latency
+
+# usage
+# python3 src/benchmark/threaded_locking.py [transactions] [data_items]
+
+import random
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from concurrency_control.ThreadedLocking import ThreadedTwoPhaseLocking
+from concurrency_control.TwoPhaseLocking import Operation
+
+def workload(transactions: int, data_items: int, length: int = 4, seed: int = 0) -> list:
+    # every transaction reads and writes length distinct random items in
+    # sorted order, so there are conflicts but no deadlocks
+    rng = random.Random(seed)
+    operations = []
+    for transaction_id in range(1, transactions + 1):
+        for item in sorted(rng.sample(range(data_items), length)):
+            operation = Operation.WRITE if rng.random() < 0.5 else Operation.READ
+            operations.append((operation, transaction_id, f"I{item}"))
+        operations.append((Operation.COMMIT, transaction_id, ""))
+    return operations
+
+if __name__ == "__main__":
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    data_items = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    operations = workload(transactions, data_items)
+
+    print(f"{'workers':>7} {'txn/s':>10} {'aborts':>7} {'lock p50 us':>12} {'lock p99 us':>12}")
+    for workers in [1, 2, 4, 8, 16]:
+        tpl = ThreadedTwoPhaseLocking.from_operations(operations, workers=workers)
+        tpl.run()
+        s = tpl.statistics()
+        print(f"{workers:>7} {s['transactions_per_second']:>10.0f} {s['aborts']:>7} "
+              f"{s['lock_latency_p50_us']:>12.1f} {s['lock_latency_p99_us']:>12.1f}")
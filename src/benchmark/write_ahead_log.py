@@ -0,0 +1,92 @@
+# write-ahead log and restart
+# commit latency: threads commit small transactions against one log, with
+# and without group commit delay, and report throughput, fsyncs and latency
+# recovery: crashes after a growing number of transactions (a tenth of them
+# left uncommitted) and reports the restart time against the log size
+
+# usage
+# python3 src/benchmark/write_ahead_log.py [transactions]
+
+import random
+import tempfile
+import threading
+import time
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from recovery.WriteAheadLog import WriteAheadLog
+from recovery.RecoveryManager import RecoveryManager
+from concurrency_control.ThreadedLocking import percentile
+
+def commit_latency(path: str, threads: int, transactions: int, group_delay: float) -> dict:
+    manager = RecoveryManager(WriteAheadLog(path, group_delay=group_delay))
+    latch = threading.Lock()
+    ids = iter(range(1, transactions + 1))
+    latencies = []
+
+    def worker():
+        while True:
+            with latch:
+                transaction_id = next(ids, None)
+                if transaction_id is None:
+                    return
+                started = time.perf_counter()
+                manager.begin(transaction_id)
+                manager.write(transaction_id, f"I{transaction_id % 100}", b"x" * 64)
+            manager.commit(transaction_id)
+            latencies.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    manager.wal.close()
+
+    return {
+        "transactions_per_second": transactions / elapsed,
+        "fsyncs": manager.wal.fsyncs,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1e3,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+def recovery_time(path: str, transactions: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    manager = RecoveryManager(WriteAheadLog(path, sync=False))
+    for transaction_id in range(1, transactions + 1):
+        manager.begin(transaction_id)
+        for item in rng.sample(range(1000), 4):
+            manager.write(transaction_id, f"I{item}", b"x" * 64)
+        if rng.random() < 0.9:
+            manager.commit(transaction_id)
+        else:
+            manager.wal.flush()
+    manager.crash()
+
+    return RecoveryManager(WriteAheadLog(path, sync=False), manager.disk).restart()
+
+if __name__ == "__main__":
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'threads':>7} {'delay ms':>8} {'txn/s':>10} {'fsyncs':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for threads in [1, 4, 16]:
+            for group_delay in [0.0, 0.001]:
+                path = os.path.join(directory, f"commit-{threads}-{group_delay}")
+                s = commit_latency(path, threads, transactions, group_delay)
+                print(f"{threads:>7} {group_delay * 1e3:>8.1f} {s['transactions_per_second']:>10.0f} "
+                      f"{s['fsyncs']:>7} {s['latency_p50_ms']:>8.2f} {s['latency_p99_ms']:>8.2f}")
+
+        print()
+        print(f"{'transactions':>12} {'log MB':>8} {'redone':>8} {'undone':>8} {'seconds':>8}")
+        for size in [transactions, transactions * 4, transactions * 16]:
+            s = recovery_time(os.path.join(directory, f"recovery-{size}"), size)
+            print(f"{size:>12} {s['log_bytes'] / 2**20:>8.2f} {s['redone']:>8} "
+                  f"{s['undone']:>8} {s['seconds']:>8.3f}")
@@ -0,0 +1,311 @@
+# asyncio front end for the concurrency control engines
+# transactions are coroutines taking a handle and awaiting its read, write
+# and commit methods. the scheduler suspends a coroutine while it waits for
+# a lock (a future resolved when the lock is granted) and raises
+# TransactionAborted into it when it has to roll back, after which the
+# executor runs the coroutine again
+
+# example
+# async def transfer(t):
+#     balance = await t.read("A")
+#     await t.write("A", balance)
+#     await t.write("B")
+#
+# engine = AsyncTwoPhaseLocking()
+# await engine.run([transfer, transfer])
+
+import asyncio
+import itertools
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from transaction.LockManager import LockRequestManager, LockType
+from transaction.Query import Read, Write
+from concurrency_control.Deadlock import WaitsForGraph
+from concurrency_control.OCC import OCCTransaction, ValidationIndex
+from storage.Storage import Storage, MemoryStore
+from util.Util import SymbolTable
+
+class TransactionAborted(Exception):
+    def __init__(self, transaction_id: int, reason: str):
+        super().__init__(f"T{transaction_id} aborted: {reason}")
+        self.transaction_id = transaction_id
+        self.reason = reason
+
+class AsyncTransaction:
+    '''
+    Handle a transaction coroutine uses to talk to its scheduler.
+
+    Attributes:
+        transaction_id (int): The transaction id, kept across retries.
+        scheduler (AsyncScheduler): The scheduler running the transaction.
+        committed (bool): True once commit returned.
+
+    Methods:
+        read(data_item) -> bytes:
+            Reads the data item, suspending while the scheduler makes it wait,
+            and returns its value.
+        write(data_item, value) -> None:
+            Writes the data item, suspending while the scheduler makes it wait.
+        commit() -> None:
+            Commits the transaction.
+    '''
+    def __init__(self, scheduler: 'AsyncScheduler', transaction_id: int):
+        self.scheduler = scheduler
+        self.transaction_id = transaction_id
+        self.committed = False
+
+    async def read(self, data_item: str) -> bytes:
+        return await self.scheduler.read(self.transaction_id, data_item)
+
+    async def write(self, data_item: str, value: bytes = None):
+        await self.scheduler.write(self.transaction_id, data_item, value)
+
+    async def commit(self):
+        await self.scheduler.commit(self.transaction_id)
+        self.committed = True
+
+class AsyncScheduler:
+    '''
+    Base class of the asyncio schedulers.
+
+    Attributes:
+        commits (int): Committed transactions.
+        aborts (int): Aborted attempts.
+        max_retries (int): Aborts after which a transaction gives up.
+
+    Methods:
+        execute(function) -> object:
+            Runs the transaction coroutine function to commit, retrying it
+            when it is aborted, and returns its result.
+        run(functions) -> list:
+            Executes the transaction coroutine functions concurrently.
+        statistics() -> dict:
+            Returns the commit and abort counts.
+    '''
+    name = "none"
+
+    def __init__(self, max_retries: int = 100):
+        self.ids = itertools.count(1)
+        self.commits = 0
+        self.aborts = 0
+        self.max_retries = max_retries
+
+    async def execute(self, function):
+        transaction_id = next(self.ids)
+        for _ in range(self.max_retries + 1):
+            transaction = AsyncTransaction(self, transaction_id)
+            self.begin(transaction_id)
+            try:
+                result = await function(transaction)
+                if not transaction.committed:
+                    await transaction.commit()
+            except TransactionAborted:
+                self.abort(transaction_id)
+                self.aborts += 1
+                # let the transactions that were woken run first
+                await asyncio.sleep(0)
+                continue
+            except BaseException:
+                self.abort(transaction_id)
+                raise
+            self.commits += 1
+            return result
+        raise Exception(f"T{transaction_id} aborted {self.max_retries + 1} times")
+
+    async def run(self, functions: list) -> list:
+        return await asyncio.gather(*(self.execute(function) for function in functions))
+
+    def begin(self, transaction_id: int):
+        pass
+
+    async def read(self, transaction_id: int, data_item: str) -> bytes:
+        raise NotImplementedError()
+
+    async def write(self, transaction_id: int, data_item: str, value: bytes = None):
+        raise NotImplementedError()
+
+    async def commit(self, transaction_id: int):
+        raise NotImplementedError()
+
+    def abort(self, transaction_id: int):
+        pass
+
+    def statistics(self) -> dict:
+        return {
+            "scheduler": self.name,
+            "commits": self.commits,
+            "aborts": self.aborts,
+        }
+
+class AsyncTwoPhaseLocking(AsyncScheduler):
+    '''
+    Strict two phase locking on a LockRequestManager. A request that is not
+    granted waits on a future resolved when the manager grants it; a wait
+    that closes a cycle in the waits-for graph aborts the youngest
+    transaction of the cycle. Writes go to the storage in place once their
+    X lock is granted, keeping the value they replaced, and an abort
+    restores those values before it releases the locks.
+
+    Attributes:
+        locks_manager (LockRequestManager): The lock manager.
+        storage (Storage): The data the transactions read and write.
+        undo (dict): transaction_id -> (data item, value it replaced) of
+            its writes.
+        waits_for (WaitsForGraph): The waits-for graph.
+        futures (dict): transaction_id -> future of its queued lock request.
+        deadlocks (int): Number of cycles found.
+    '''
+    name = "2pl"
+
+    def __init__(self, lockmanager: LockRequestManager = None, storage: Storage = None,
+                 max_retries: int = 100):
+        super().__init__(max_retries)
+        self.locks_manager = LockRequestManager() if lockmanager is None else lockmanager
+        self.storage = MemoryStore() if storage is None else storage
+        self.undo = {}
+        self.waits_for = WaitsForGraph()
+        self.futures = {}
+        self.deadlocks = 0
+
+    async def read(self, transaction_id: int, data_item: str) -> bytes:
+        await self.lock(transaction_id, data_item, LockType.S)
+        return self.storage.get(data_item)
+
+    async def write(self, transaction_id: int, data_item: str, value: bytes = None):
+        await self.lock(transaction_id, data_item, LockType.X)
+        # a write without a value writes the transaction's name, as
+        # Transaction.write_value does
+        value = f"T{transaction_id}".encode() if value is None else value
+        self.undo.setdefault(transaction_id, []).append((data_item, self.storage.get(data_item)))
+        self.storage.put(data_item, value)
+
+    async def lock(self, transaction_id: int, data_item: str, lock_type: LockType):
+        if self.locks_manager.request(transaction_id, data_item, lock_type):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.futures[transaction_id] = future
+
+        # the new edges may close several cycles, abort until none is left
+        cycle = self.waits_for.add_waits(transaction_id, self.blockers(transaction_id, data_item))
+        while cycle:
+            self.deadlocks += 1
+            victim = max(cycle)
+            if victim == transaction_id:
+                del self.futures[transaction_id]
+                raise TransactionAborted(transaction_id, "deadlock")
+            self.futures.pop(victim).set_exception(TransactionAborted(victim, "deadlock"))
+            self.rollback(victim)
+            cycle = [] if future.done() else self.waits_for.find_cycle(transaction_id)
+
+        await future
+
+    def blockers(self, transaction_id: int, data_item: str) -> list:
+        # the holders of the item and the requests queued ahead of ours
+        queue = self.locks_manager.queues[data_item]
+        blockers = list(queue.granted)
+        for waiter, _ in queue.waiting:
+            if waiter == transaction_id:
+                break
+            blockers.append(waiter)
+        return blockers
+
+    def release(self, transaction_id: int):
+        self.waits_for.remove_transaction(transaction_id)
+        for granted, _, _, _ in self.locks_manager.release(transaction_id):
+            self.waits_for.clear_waits(granted)
+            future = self.futures.pop(granted)
+            if not future.done():
+                future.set_result(None)
+
+    def rollback(self, transaction_id: int):
+        # the old values are back before anyone else gets the locks
+        for data_item, value in reversed(self.undo.pop(transaction_id, [])):
+            self.storage.put(data_item, value)
+        self.release(transaction_id)
+
+    async def commit(self, transaction_id: int):
+        self.undo.pop(transaction_id, None)
+        self.release(transaction_id)
+
+    def abort(self, transaction_id: int):
+        future = self.futures.pop(transaction_id, None)
+        if future is not None and not future.done():
+            future.cancel()
+        self.rollback(transaction_id)
+
+    def statistics(self) -> dict:
+        statistics = super().statistics()
+        statistics["deadlocks"] = self.deadlocks
+        return statistics
+
+class AsyncOCC(AsyncScheduler):
+    '''
+    Optimistic concurrency control on the OCCTransaction and ValidationIndex
+    of the OCC engine. Every attempt is an OCCTransaction with a new start
+    timestamp, its queries are appended as the coroutine awaits them and run
+    by next_query, so reads return values from the storage or the write set
+    and writes stay in the write set. Commit validates the transaction with
+    the same ValidationIndex test as OCC and installs the write set.
+
+    Attributes:
+        storage (Storage): The data the transactions read and write.
+        symbols (SymbolTable): Ids of the data items of all transactions.
+        index (ValidationIndex): Running and committed transactions.
+        clock (int): Last start or validation timestamp given out.
+        running (dict): transaction_id -> OCCTransaction of its attempt.
+    '''
+    name = "occ"
+
+    def __init__(self, storage: Storage = None, max_retries: int = 100):
+        super().__init__(max_retries)
+        self.storage = MemoryStore() if storage is None else storage
+        self.symbols = SymbolTable()
+        self.index = ValidationIndex()
+        self.clock = 0
+        self.running = {}
+
+    def begin(self, transaction_id: int):
+        self.clock += 1
+        transaction = OCCTransaction(self.clock, [])
+        # writes without a value store the name of the logical transaction
+        transaction.transaction_id = transaction_id
+        transaction.storage = self.storage
+        transaction.symbols = self.symbols
+        self.index.start(self.clock)
+        self.running[transaction_id] = transaction
+
+    def query(self, transaction_id: int, query) -> bytes:
+        transaction = self.running[transaction_id]
+        transaction.list_of_queries.append(query)
+        transaction.next_query()
+        return query.value
+
+    async def read(self, transaction_id: int, data_item: str) -> bytes:
+        return self.query(transaction_id, Read(data_item))
+
+    async def write(self, transaction_id: int, data_item: str, value: bytes = None):
+        self.query(transaction_id, Write(data_item, value))
+
+    async def commit(self, transaction_id: int):
+        transaction = self.running[transaction_id]
+        self.clock += 1
+        if not self.index.validate(transaction, self.clock):
+            raise TransactionAborted(transaction_id, "validation")
+
+        transaction.commit()
+        transaction.end_timestamp = self.clock
+        self.index.commit(transaction)
+        del self.running[transaction_id]
+        self.index.collect(self.index.oldest_running())
+
+    def abort(self, transaction_id: int):
+        transaction = self.running.pop(transaction_id, None)
+        if transaction is not None:
+            self.index.abort(transaction.start_timestamp)
@@ -0,0 +1,147 @@
+# batch replay of schedule files
+# runs TwoPhaseLocking on every schedule of a directory or glob, text
+# schedules are streamed with from_file and binary traces (util.Trace)
+# replayed with from_trace. files are fanned out over a process pool in
+# chunks, every worker process keeps one Replayer, and the per file results
+# are merged into totals
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from concurrency_control.TwoPhaseLocking import TwoPhaseLocking
+from transaction.LockManager import IndexedLockManager, LockRequestManager
+from util.Trace import Trace, MAGIC
+from util.Util import DEADLOCK_POLICIES
+
+DEFAULT_OPTIONS = {
+    "lock_manager": "indexed",
+    "upgrade": False,
+    "deadlock": "none",
+    "wakeup": "all",
+    "max_steps": None,
+    "history": False,
+}
+
+def find_schedules(pattern: str) -> list:
+    # every file of a directory, or the files matching a glob, sorted
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+def is_trace(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class Replayer:
+    '''
+    Replays schedule files with one set of TwoPhaseLocking options.
+
+    The lock manager is reused from one schedule to the next while every
+    run leaves it empty, a failed run may leave locks behind and gets a
+    new one.
+
+    Attributes:
+        options (dict): DEFAULT_OPTIONS, updated with the given options.
+        lockmanager (LockManager): Lock manager of the next run.
+
+    Methods:
+        replay(path) -> dict:
+            Runs one schedule file and returns its result.
+    '''
+    def __init__(self, options: dict = None):
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options or {})
+        if self.options["lock_manager"] not in ("indexed", "queued"):
+            raise Exception("Invalid lock manager")
+        if self.options["deadlock"] not in DEADLOCK_POLICIES:
+            raise Exception("Invalid deadlock policy")
+        if self.options["lock_manager"] == "queued" and self.options["deadlock"] != "none":
+            raise Exception("Deadlock handling is not supported with queued lock requests")
+        self.lockmanager = self.new_lockmanager()
+
+    def new_lockmanager(self):
+        return LockRequestManager() if self.options["lock_manager"] == "queued" else IndexedLockManager()
+
+    def replay(self, path: str) -> dict:
+        options = self.options
+        result = {"path": path}
+        started = time.perf_counter()
+        trace = None
+        try:
+            if is_trace(path):
+                trace = Trace(path)
+                tpl = TwoPhaseLocking.from_trace(trace, self.lockmanager)
+            else:
+                tpl = TwoPhaseLocking.from_file(path, self.lockmanager)
+            tpl.run(upgrade=options["upgrade"], deadlock=options["deadlock"],
+                    wakeup=options["wakeup"], max_steps=options["max_steps"])
+
+            statistics = tpl.policy.statistics()
+            result["operations"] = tpl.steps
+            result["events"] = len(tpl.history)
+            result["aborts"] = statistics["aborts"]
+            result["wasted_operations"] = statistics["wasted_operations"]
+            if options["history"]:
+                result["result"] = tpl.result
+        except Exception as e:
+            self.lockmanager = self.new_lockmanager()
+            result["error"] = str(e)
+        finally:
+            if trace is not None:
+                # an unfinished replay still holds a view of the mapping
+                tpl = None
+                trace.close()
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+# the Replayer of a worker process, set by init_worker
+REPLAYER = None
+
+def init_worker(options: dict):
+    global REPLAYER
+    REPLAYER = Replayer(options)
+
+def replay_in_worker(path: str) -> dict:
+    return REPLAYER.replay(path)
+
+def merge(results: list, seconds: float) -> dict:
+    # totals of the per file results
+    succeeded = [r for r in results if "error" not in r]
+    operations = sum(r["operations"] for r in succeeded)
+    return {
+        "files": len(results),
+        "failed": len(results) - len(succeeded),
+        "operations": operations,
+        "aborts": sum(r["aborts"] for r in succeeded),
+        "wasted_operations": sum(r["wasted_operations"] for r in succeeded),
+        "cpu_seconds": sum(r["seconds"] for r in results),
+        "seconds": seconds,
+        "operations_per_second": operations / seconds if seconds else 0.0,
+    }
+
+def replay_schedules(paths, options: dict = None, workers: int = None,
+                     chunksize: int = None) -> tuple:
+    # returns (per file results in the order of paths, merged totals).
+    # workers defaults to the number of cpus, 1 replays in this process
+    paths = find_schedules(paths) if isinstance(paths, str) else list(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    started = time.perf_counter()
+    # invalid options fail here, before any worker starts
+    replayer = Replayer(options)
+
+    if workers <= 1 or len(paths) <= 1:
+        results = [replayer.replay(path) for path in paths]
+    else:
+        # a few chunks per worker keeps them busy when file sizes differ
+        if chunksize is None:
+            chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(options,)) as executor:
+            results = list(executor.map(replay_in_worker, paths, chunksize=chunksize))
+
+    return results, merge(results, time.perf_counter() - started)
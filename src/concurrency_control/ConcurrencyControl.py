@@ -1,5 +1,7 @@
-from typing import List
+from typing import Dict, List
 from transaction.Transaction import Transaction
+from storage.Storage import Storage, MemoryStore
+from util.Tracer import Tracer, NO_TRACER
 
 class ConcurrencyControl:
     '''
@@ -8,19 +10,72 @@ class ConcurrencyControl:
     Attributes:
         transactions (List[Transaction]): The list of transactions.
         schedule (List[int]): The schedule of the transactions.
+        storage (Storage): The data the transactions read and write.
+        tracer (Tracer): Receives the events of the run, ignores them by default.
+        by_timestamp (Dict[int, Transaction]): Transactions by current start timestamp.
+        by_id (Dict[int, Transaction]): Transactions by transaction id.
+        executed (int): Number of executed queries, including rolled back ones.
+        commits (int): Number of commits.
+        aborts (int): Number of rollbacks.
+        elapsed (float): Seconds spent in run.
 
     Methods:
         get_transaction(start_timestamp: int) -> Transaction:
             Returns the transaction with the given start timestamp.
+        get_transaction_by_id(transaction_id: int) -> Transaction:
+            Returns the transaction with the given transaction id.
+        rollback(transaction: Transaction, new_timestamp: int) -> None:
+            Rollbacks the transaction and moves it to its new start timestamp.
+        statistics() -> Dict[str, float]:
+            Returns the counters of the run and its throughput.
         run() -> None:
             Runs the concurrency control algorithm.
     '''
-    def __init__(self, transactions: List[Transaction], schedule: List[int]) -> None:
+    def __init__(self, transactions: List[Transaction], schedule: List[int], storage: Storage = None,
+                 tracer: Tracer = None) -> None:
         self.transactions = transactions
         self.schedule = schedule
+        self.storage = MemoryStore() if storage is None else storage
+        self.tracer = NO_TRACER if tracer is None else tracer
+        for transaction in transactions:
+            transaction.storage = self.storage
+            transaction.tracer = self.tracer
+
+        self.by_timestamp: Dict[int, Transaction] = {}
+        self.by_id: Dict[int, Transaction] = {}
+        for transaction in transactions:
+            self.register(transaction)
+
+        self.executed = 0
+        self.commits = 0
+        self.aborts = 0
+        self.elapsed = 0.0
+
+    def register(self, transaction: Transaction) -> None:
+        if transaction.start_timestamp in self.by_timestamp:
+            raise Exception(f"Duplicate start timestamp {transaction.start_timestamp}")
+        self.by_timestamp[transaction.start_timestamp] = transaction
+        self.by_id[transaction.transaction_id] = transaction
 
     def get_transaction(self, start_timestamp: int) -> Transaction:
-        return next(transaction for transaction in self.transactions if transaction.start_timestamp == start_timestamp)
+        return self.by_timestamp[start_timestamp]
+
+    def get_transaction_by_id(self, transaction_id: int) -> Transaction:
+        return self.by_id[transaction_id]
+
+    def rollback(self, transaction: Transaction, new_timestamp: int) -> None:
+        del self.by_timestamp[transaction.start_timestamp]
+        transaction.rollback(new_timestamp)
+        self.register(transaction)
+
+    def statistics(self) -> Dict[str, float]:
+        return {
+            "operations": self.executed,
+            "commits": self.commits,
+            "aborts": self.aborts,
+            "seconds": self.elapsed,
+            "operations_per_second": self.executed / self.elapsed if self.elapsed else 0.0,
+        }
 
     def run(self):
         raise NotImplementedError()
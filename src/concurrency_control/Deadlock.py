@@ -0,0 +1,329 @@
+# deadlock handling policies for two phase locking
+# a policy decides what happens when a lock request conflicts: wait, abort
+# the requester or abort the holders. every policy counts the aborts it
+# caused and the executed operations those aborts threw away
+
+# a transaction's id is its timestamp and a restart keeps it, so a
+# transaction aborted by wait-die or wound-wait only grows older and is
+# eventually the oldest, which neither policy aborts. an aborted
+# transaction waits until the locks blocking it are released and an abort
+# only wakes the waiters its released locks unblock
+
+from collections import deque
+
+from util.Tracer import TraceEvent
+
+class WaitsForGraph:
+    '''
+    Waits-for graph between transactions.
+
+    An edge T1 -> T2 means T1 waits for a lock held by T2. The graph is kept
+    acyclic: a cycle can only be closed by the edges just added, so
+    detection only searches from the transaction that started waiting,
+    until no cycle through it is left.
+
+    Attributes:
+        edges (dict): transaction_id -> set of transaction ids it waits for.
+
+    Methods:
+        add_waits(transaction_id, holders) -> list:
+            Adds the edges and returns the cycle they close, or an empty list.
+        clear_waits(transaction_id) -> None:
+            Removes the outgoing edges of the transaction.
+        remove_transaction(transaction_id) -> None:
+            Removes the transaction and every edge touching it.
+    '''
+    def __init__(self):
+        self.edges = {}
+
+    def add_waits(self, transaction_id: int, holders: list) -> list:
+        # an upgrade waits for the other holders of its shared lock, a
+        # transaction holding the lock alone never has to wait for it
+        others = [t for t in holders if t != transaction_id]
+        if not others:
+            if holders:
+                raise Exception(f"T{transaction_id} waits for its own lock")
+            return []
+        holders = others
+
+        self.edges.setdefault(transaction_id, set()).update(holders)
+        return self.find_cycle(transaction_id)
+
+    def find_cycle(self, transaction_id: int) -> list:
+        # iterative depth first search for a path back to transaction_id
+        path = [transaction_id]
+        stack = [iter(self.edges.get(transaction_id, ()))]
+        visited = {transaction_id}
+
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                path.pop()
+                continue
+            if node == transaction_id:
+                return list(path)
+            if node in visited:
+                continue
+            visited.add(node)
+            path.append(node)
+            stack.append(iter(self.edges.get(node, ())))
+        return []
+
+    def clear_waits(self, transaction_id: int):
+        self.edges.pop(transaction_id, None)
+
+    def remove_transaction(self, transaction_id: int):
+        self.edges.pop(transaction_id, None)
+        for waits in self.edges.values():
+            waits.discard(transaction_id)
+
+    def is_waiting(self, transaction_id: int) -> bool:
+        return transaction_id in self.edges
+
+# victim cost functions, the transaction with the lowest cost is aborted
+# ties go to the youngest transaction
+VICTIM_COSTS = {
+    "ops": lambda tpl, t: (tpl.executed_operations(t), -t),
+    "youngest": lambda tpl, t: -t,
+    "locks": lambda tpl, t: (len(tpl.locks_manager.get_locked_items(t)), -t),
+}
+
+def choose_victim(tpl, cycle: list, cost: str) -> int:
+    if cost not in VICTIM_COSTS:
+        raise Exception("Invalid victim cost")
+    return min(cycle, key=lambda t: VICTIM_COSTS[cost](tpl, t))
+
+class DeadlockPolicy:
+    '''
+    Deadlock handling policy, the base class simply waits.
+
+    Attributes:
+        aborts (int): Number of transactions aborted by the policy.
+        wasted_operations (int): Executed operations undone by those aborts.
+
+    Methods:
+        on_conflict(tpl, operation, transaction_id, data_item) -> None:
+            Called when a lock request conflicts with the current holders.
+        on_step(tpl) -> None:
+            Called after every processed operation.
+        on_idle(tpl) -> bool:
+            Called when the schedule is empty but transactions still wait,
+            returns True if operations were scheduled again.
+        on_wait_end(tpl, transaction_id) -> None:
+            Called when a waiting transaction is woken or aborted.
+        on_commit(tpl, transaction_id) -> None:
+            Called when a transaction commits.
+        statistics() -> dict:
+            Returns the abort and wasted operation counts.
+    '''
+    name = "none"
+
+    def __init__(self):
+        self.aborts = 0
+        self.wasted_operations = 0
+
+    def on_conflict(self, tpl, operation, transaction_id: int, data_item: str):
+        tpl.wait_for_lock(operation, transaction_id, data_item)
+
+    def on_step(self, tpl):
+        pass
+
+    def on_idle(self, tpl) -> bool:
+        return False
+
+    def on_wait_end(self, tpl, transaction_id: int):
+        pass
+
+    def on_commit(self, tpl, transaction_id: int):
+        pass
+
+    def abort(self, tpl, transaction_id: int, wait_item: str, lock_item: str = None, wake: bool = True):
+        self.aborts += 1
+        if tpl.tracer.enabled:
+            tpl.tracer.event(TraceEvent.ABORT, transaction_id, tpl.item_name(wait_item))
+        self.wasted_operations += tpl.abort_transaction(transaction_id, wait_item, lock_item, wake)
+
+    def die(self, tpl, operation, transaction_id: int, data_item: str):
+        # abort the requester, it restarts once the holder releases data_item
+        if not tpl.locks_manager.is_locked_by(transaction_id):
+            self.aborts += 1
+            if tpl.tracer.enabled:
+                tpl.tracer.event(TraceEvent.ABORT, transaction_id, tpl.item_name(data_item))
+        else:
+            self.abort(tpl, transaction_id, data_item)
+        tpl.add_queue(operation, transaction_id, data_item)
+
+    def statistics(self) -> dict:
+        return {
+            "policy": self.name,
+            "aborts": self.aborts,
+            "wasted_operations": self.wasted_operations,
+        }
+
+class WoundWait(DeadlockPolicy):
+    '''
+    Wound-wait: an older requester wounds (rolls back) the younger holders,
+    a younger requester waits.
+    '''
+    name = "wound-wait"
+
+    def on_conflict(self, tpl, operation, transaction_id: int, data_item: str):
+        conflicting_transactions = tpl.locks_manager.get_transaction_ids(data_item) + [transaction_id]
+        oldest_transaction = min(conflicting_transactions)
+        younger_transactions = [t for t in conflicting_transactions if t > oldest_transaction]
+
+        if oldest_transaction < transaction_id:
+            tpl.wait_for_lock(operation, transaction_id, data_item)
+            return
+
+        if not younger_transactions:
+            tpl.wait_for_lock(operation, transaction_id, data_item)
+            return
+
+        if tpl.tracer.enabled:
+            tpl.tracer.event(TraceEvent.WOUND, transaction_id, tpl.item_name(data_item), younger_transactions)
+        for t in younger_transactions:
+            self.abort(tpl, t, data_item, lock_item=data_item)
+
+        # the wounded released data_item, the requester takes it first
+        tpl.operations.appendleft((operation, transaction_id, data_item))
+
+class WaitDie(DeadlockPolicy):
+    '''
+    Wait-die: an older requester waits, a younger requester dies.
+    '''
+    name = "wait-die"
+
+    def on_conflict(self, tpl, operation, transaction_id: int, data_item: str):
+        holders = tpl.locks_manager.get_transaction_ids(data_item)
+        if all(transaction_id < t for t in holders if t != transaction_id):
+            tpl.wait_for_lock(operation, transaction_id, data_item)
+            return
+        self.die(tpl, operation, transaction_id, data_item)
+
+class NoWait(DeadlockPolicy):
+    '''
+    No-wait: every conflicting requester is aborted immediately.
+    '''
+    name = "no-wait"
+
+    def on_conflict(self, tpl, operation, transaction_id: int, data_item: str):
+        self.die(tpl, operation, transaction_id, data_item)
+
+class Timeout(DeadlockPolicy):
+    '''
+    Timeout: a transaction waiting longer than timeout steps is aborted.
+
+    Attributes:
+        timeout (int): Number of processed operations a transaction may wait.
+        since (dict): transaction_id -> step it started waiting.
+    '''
+    name = "timeout"
+
+    def __init__(self, timeout: int = 10):
+        super().__init__()
+        self.timeout = timeout
+        self.since = {}
+        self.order = deque()
+
+    def on_conflict(self, tpl, operation, transaction_id: int, data_item: str):
+        tpl.wait_for_lock(operation, transaction_id, data_item)
+        self.since[transaction_id] = tpl.steps
+        self.order.append((tpl.steps, transaction_id))
+
+    def on_wait_end(self, tpl, transaction_id: int):
+        self.since.pop(transaction_id, None)
+
+    def on_step(self, tpl):
+        while self.order and self.order[0][0] + self.timeout <= tpl.steps:
+            self.expire(tpl, restart=True)
+
+    def on_idle(self, tpl) -> bool:
+        # nothing left to run, so the clock runs until the next timeout
+        while self.order and not tpl.operations:
+            self.expire(tpl, restart=False)
+        return len(tpl.operations) > 0
+
+    def expire(self, tpl, restart: bool):
+        step, transaction_id = self.order.popleft()
+        if self.since.get(transaction_id) != step:
+            return
+
+        if tpl.locks_manager.is_locked_by(transaction_id):
+            self.abort(tpl, transaction_id, tpl.wait_item[transaction_id])
+        elif restart:
+            # holds nothing another transaction could be waiting for
+            self.since[transaction_id] = tpl.steps
+            self.order.append((tpl.steps, transaction_id))
+
+class WaitsForDetection(DeadlockPolicy):
+    '''
+    Deadlock detection: transactions wait, and when a wait closes a cycle in
+    the waits-for graph the cheapest transaction of the cycle is aborted.
+
+    Attributes:
+        victim (str): Victim cost, one of VICTIM_COSTS.
+        waits_for (WaitsForGraph): The waits-for graph.
+        deadlocks (int): Number of cycles found.
+    '''
+    name = "detect"
+
+    def __init__(self, victim: str = "youngest"):
+        super().__init__()
+        if victim not in VICTIM_COSTS:
+            raise Exception("Invalid victim cost")
+        self.victim = victim
+        self.waits_for = WaitsForGraph()
+        self.deadlocks = 0
+
+    def on_conflict(self, tpl, operation, transaction_id: int, data_item: str):
+        tpl.wait_for_lock(operation, transaction_id, data_item)
+        cycle = self.waits_for.add_waits(transaction_id,
+            tpl.locks_manager.get_transaction_ids(data_item))
+        # the new edges may close several cycles
+        while cycle:
+            self.resolve(tpl, cycle)
+            cycle = self.waits_for.find_cycle(transaction_id) if tpl.is_waiting(transaction_id) else []
+
+    def resolve(self, tpl, cycle: list):
+        victim = choose_victim(tpl, cycle, self.victim)
+        self.deadlocks += 1
+
+        if tpl.tracer.enabled:
+            tpl.tracer.event(TraceEvent.DEADLOCK, victim, tpl.item_name(tpl.wait_item[victim]), cycle)
+        self.abort(tpl, victim, tpl.wait_item[victim])
+        self.waits_for.remove_transaction(victim)
+
+    def on_wait_end(self, tpl, transaction_id: int):
+        self.waits_for.clear_waits(transaction_id)
+
+    def on_commit(self, tpl, transaction_id: int):
+        self.waits_for.remove_transaction(transaction_id)
+
+    def statistics(self) -> dict:
+        statistics = super().statistics()
+        statistics["deadlocks"] = self.deadlocks
+        return statistics
+
+POLICIES = {
+    "none": DeadlockPolicy,
+    "wound-wait": WoundWait,
+    "wait-die": WaitDie,
+    "no-wait": NoWait,
+    "timeout": Timeout,
+    "detect": WaitsForDetection,
+}
+
+def make_policy(policy, victim: str = "youngest", timeout: int = 10) -> DeadlockPolicy:
+    if isinstance(policy, DeadlockPolicy):
+        return policy
+    if policy is None:
+        return DeadlockPolicy()
+    if policy not in POLICIES:
+        raise Exception("Invalid deadlock policy")
+    if policy == "detect":
+        return WaitsForDetection(victim)
+    if policy == "timeout":
+        return Timeout(timeout)
+    return POLICIES[policy]()
@@ -0,0 +1,107 @@
+# execution history of a concurrency control run
+# events are kept as compact columns (event type, transaction id, data item,
+# lock type) and only turned into strings like "XL1(X)" when asked for
+
+import enum
+from array import array
+
+from transaction.LockManager import LockType
+from util.Util import SymbolTable, NO_ITEM
+
+class EventType(enum.IntEnum):
+    REMOVED = 0                 # rolled back entry
+    READ = 1
+    WRITE = 2
+    COMMIT = 3
+    LOCK = 4
+    UPGRADE = 5
+    UNLOCK = 6
+    ROLLBACK = 7
+
+# prefix of the formatted event, lock and upgrade events are prefixed
+# with the lock type name
+EVENT_PREFIX = {
+    EventType.READ: "R",
+    EventType.WRITE: "W",
+    EventType.COMMIT: "C",
+    EventType.LOCK: "L",
+    EventType.UPGRADE: "U",
+    EventType.UNLOCK: "UL",
+    EventType.ROLLBACK: "RB",
+}
+
+class History:
+    '''
+    Column store of the events of a run.
+
+    Attributes:
+        event_types (array): EventType of every event, REMOVED once rolled back.
+        transaction_ids (array): Transaction id of every event.
+        symbols (SymbolTable): Ids of the data items, filled in by the parser.
+        data_items (array): Data item id of every event, NO_ITEM for commits.
+        lock_types (array): LockType value of lock and upgrade events, 0 otherwise.
+
+    Methods:
+        append(event_type, transaction_id, data_item, lock_type) -> int:
+            Records an event on the symbol of its data item and returns its
+            position.
+        remove(position) -> None:
+            Marks the event at position as rolled back.
+        events(event_types, transaction_id) -> Iterator:
+            Yields (event_type, transaction_id, data_item, lock_type) of the
+            events still in the history, optionally filtered.
+        data_item(position) -> str:
+            Returns the data item of the event at position.
+        to_strings() -> list:
+            Formats the events still in the history.
+    '''
+    def __init__(self, symbols: SymbolTable = None):
+        self.symbols = SymbolTable() if symbols is None else symbols
+        self.event_types = array('b')
+        self.transaction_ids = array('q')
+        self.data_items = array('l')
+        self.lock_types = array('b')
+
+    def __len__(self) -> int:
+        return len(self.event_types)
+
+    def append(self, event_type: EventType, transaction_id: int,
+               data_item: int = NO_ITEM, lock_type: LockType = None) -> int:
+        self.event_types.append(event_type)
+        self.transaction_ids.append(transaction_id)
+        self.data_items.append(data_item)
+        self.lock_types.append(0 if lock_type is None else lock_type.value)
+        return len(self.event_types) - 1
+
+    def remove(self, position: int):
+        self.event_types[position] = EventType.REMOVED
+
+    def events(self, event_types: set = None, transaction_id: int = None):
+        for position, event_type in enumerate(self.event_types):
+            if event_type == EventType.REMOVED:
+                continue
+            if event_types is not None and event_type not in event_types:
+                continue
+            if transaction_id is not None and self.transaction_ids[position] != transaction_id:
+                continue
+            lock_type = self.lock_types[position]
+            yield (EventType(event_type), self.transaction_ids[position],
+                   self.data_item(position), LockType(lock_type) if lock_type else None)
+
+    def data_item(self, position: int) -> str:
+        symbol = self.data_items[position]
+        return self.symbols.name(symbol) if symbol != NO_ITEM else ""
+
+    def format(self, position: int) -> str:
+        event_type = EventType(self.event_types[position])
+        out = EVENT_PREFIX[event_type]
+        if event_type in (EventType.LOCK, EventType.UPGRADE):
+            out = LockType(self.lock_types[position]).name + out
+        out += str(self.transaction_ids[position])
+        if self.data_items[position] != NO_ITEM:
+            out += "(" + self.symbols.name(self.data_items[position]) + ")"
+        return out
+
+    def to_strings(self) -> list:
+        return [self.format(position) for position, event_type in enumerate(self.event_types)
+                if event_type != EventType.REMOVED]
@@ -0,0 +1,251 @@
+from __future__ import annotations
+from typing import Deque, Dict, List, Tuple
+from collections import deque
+from bisect import bisect_right
+import heapq
+import sys
+import time
+
+from .ConcurrencyControl import ConcurrencyControl
+from transaction.Transaction import Transaction
+from transaction.Query import Query, Read, Write
+from storage.Storage import Storage, MemoryStore
+from util.Tracer import Tracer, TraceEvent
+
+class MVCCTransaction(Transaction):
+    '''
+    Transaction for Multiversion Concurrency Control
+
+    Attributes:
+        start_timestamp (int): The start timestamp of the transaction.
+        list_of_queries (List[Query]): The list of queries in the transaction.
+        snapshot (int): Commit timestamp of the snapshot the transaction reads.
+        commit_timestamp (int): The commit timestamp of the transaction.
+        data_item_written (Dict[str, bytes]): The values written, in order.
+        versions_read (List[Tuple[str, int]]): (data item, writer transaction id)
+            of every read, 0 for the initial version.
+
+    Methods:
+        next_query(versions: VersionStore) -> None:
+            Executes the next query in the transaction.
+        rollback(new_timestamp: int) -> None:
+            Rollbacks the transaction to the new timestamp.
+    '''
+    def __init__(self, start_timestamp: int, list_of_queries: List[Query]) -> None:
+        super().__init__(start_timestamp, list_of_queries)
+
+        self.snapshot: int = 0
+        self.commit_timestamp: int = sys.maxsize
+
+        # Writes are buffered until commit, reads see the snapshot
+        self.data_item_written: Dict[str, bytes] = {}
+        self.versions_read: List[Tuple[str, int]] = []
+
+    def next_query(self, versions: VersionStore) -> None:
+        current_query = self.current_query
+        item = current_query.get_data_item()
+        if isinstance(current_query, Write):
+            self.data_item_written[item] = self.write_value(current_query)
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.WRITE, self.start_timestamp, item)
+
+        if isinstance(current_query, Read):
+            if item in self.data_item_written:
+                writer = self.transaction_id
+                current_query.value = self.data_item_written[item]
+            else:
+                writer = versions.read(item, self.snapshot)
+                current_query.value = versions.value(item, self.snapshot)
+            self.versions_read.append((item, writer))
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.READ, self.start_timestamp, item)
+
+        super().next_query()
+
+    def rollback(self, new_timestamp: int) -> None:
+        self.snapshot = 0
+        self.commit_timestamp = sys.maxsize
+        self.data_item_written = {}
+        self.versions_read = []
+
+        super().rollback(new_timestamp)
+
+
+class VersionStore:
+    '''
+    Per data item version chains.
+
+    Attributes:
+        chains (Dict[str, Tuple[List[int], List[int]]]): data item ->
+            (commit timestamps, writer transaction ids), oldest first.
+        values (Dict[str, List[bytes]]): data item -> values of its versions.
+        initial (Dict[str, bytes]): Values the data items had in the storage
+            before their first version.
+        storage (Storage): Receives the latest version of every data item.
+        superseded (Dict[str, None]): Data items with more than one version.
+        created (int): Number of versions created.
+        collected (int): Number of versions garbage-collected.
+
+    Methods:
+        read(data_item: str, snapshot: int) -> int:
+            Returns the writer of the latest version committed at or before
+            snapshot, 0 for the initial version.
+        value(data_item: str, snapshot: int) -> bytes:
+            Returns the value of the latest version committed at or before
+            snapshot.
+        latest(data_item: str) -> int:
+            Returns the commit timestamp of the latest version, 0 if none.
+        install(data_item: str, commit_timestamp: int, writer: int, value: bytes) -> None:
+            Adds a committed version.
+        collect(oldest_snapshot: int) -> None:
+            Drops the versions no snapshot at or after oldest_snapshot can read.
+    '''
+    def __init__(self, storage: Storage = None) -> None:
+        self.chains: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.values: Dict[str, List[bytes]] = {}
+        self.initial: Dict[str, bytes] = {}
+        self.storage = MemoryStore() if storage is None else storage
+        self.superseded: Dict[str, None] = {}
+        self.created = 0
+        self.collected = 0
+
+    def read(self, data_item: str, snapshot: int) -> int:
+        chain = self.chains.get(data_item)
+        if chain is None:
+            return 0
+        index = bisect_right(chain[0], snapshot)
+        return chain[1][index - 1] if index else 0
+
+    def value(self, data_item: str, snapshot: int) -> bytes:
+        chain = self.chains.get(data_item)
+        if chain is None:
+            return self.storage.get(data_item)
+        index = bisect_right(chain[0], snapshot)
+        return self.values[data_item][index - 1] if index else self.initial.get(data_item)
+
+    def latest(self, data_item: str) -> int:
+        chain = self.chains.get(data_item)
+        return chain[0][-1] if chain is not None else 0
+
+    def install(self, data_item: str, commit_timestamp: int, writer: int, value: bytes = None) -> None:
+        chain = self.chains.get(data_item)
+        if chain is None:
+            self.chains[data_item] = ([commit_timestamp], [writer])
+            self.values[data_item] = [value]
+            self.initial[data_item] = self.storage.get(data_item)
+        else:
+            chain[0].append(commit_timestamp)
+            chain[1].append(writer)
+            self.values[data_item].append(value)
+            self.superseded[data_item] = None
+        self.storage.put(data_item, value)
+        self.created += 1
+
+    def collect(self, oldest_snapshot: int) -> None:
+        for data_item in list(self.superseded):
+            timestamps, writers = self.chains[data_item]
+            # keep the latest version visible to the oldest snapshot
+            index = bisect_right(timestamps, oldest_snapshot) - 1
+            if index > 0:
+                del timestamps[:index]
+                del writers[:index]
+                del self.values[data_item][:index]
+                self.collected += index
+            if len(timestamps) == 1:
+                del self.superseded[data_item]
+
+
+class MVCC(ConcurrencyControl):
+    '''
+    Multiversion Concurrency Control with snapshot isolation
+
+    Every transaction reads the snapshot of the versions committed before
+    its first operation, so reads never wait or abort. Writes are buffered
+    and installed as new versions at commit; of two concurrent transactions
+    writing the same data item the first to commit wins and the other is
+    rolled back and restarted at the end of the schedule.
+
+    Attributes:
+        transactions (List[MVCCTransaction]): The list of transactions.
+        schedule (List[int]): The schedule of the transactions.
+        versions (VersionStore): The version chains.
+        storage (Storage): Holds the latest committed value of every data item.
+        tracer (Tracer): Receives the events of the run.
+
+    Methods:
+        run() -> None:
+            Runs the MVCC algorithm.
+        statistics() -> Dict[str, float]:
+            Returns the run statistics and the version counts.
+    '''
+    def __init__(self, transactions: List[MVCCTransaction], schedule: List[int], storage: Storage = None,
+                 tracer: Tracer = None) -> None:
+        super().__init__(transactions, schedule, storage, tracer)
+
+        self.versions = VersionStore(self.storage)
+
+    def run(self):
+        started = time.perf_counter()
+        tracer = self.tracer
+        temp_schedule: Deque[int] = deque(self.schedule)
+        clock = 0
+        next_timestamp = max(self.by_timestamp, default=0) + 1
+
+        # Snapshots of the running transactions, with stale heap entries
+        snapshots: Dict[int, int] = {}
+        snapshot_heap: List[Tuple[int, int]] = []
+        oldest_snapshot = 0
+
+        # Run until all transactions are finished
+        while temp_schedule:
+            current_timestamp = temp_schedule.popleft()
+
+            transaction: MVCCTransaction = self.get_transaction(current_timestamp)
+
+            if current_timestamp not in snapshots:
+                transaction.snapshot = clock
+                snapshots[current_timestamp] = clock
+                heapq.heappush(snapshot_heap, (clock, current_timestamp))
+                if tracer.enabled:
+                    tracer.event(TraceEvent.START, current_timestamp)
+
+            transaction.next_query(self.versions)
+            self.executed += 1
+            clock += 1
+
+            if not transaction.is_finished():
+                continue
+
+            del snapshots[current_timestamp]
+            conflict = next((item for item in transaction.data_item_written
+                             if self.versions.latest(item) > transaction.snapshot), None)
+
+            if conflict is None:
+                transaction.commit_timestamp = clock
+                for item, value in transaction.data_item_written.items():
+                    self.versions.install(item, clock, transaction.transaction_id, value)
+                transaction.commit()
+                self.commits += 1
+
+            else:
+                if tracer.enabled:
+                    tracer.event(TraceEvent.ABORT, current_timestamp, conflict)
+                self.rollback(transaction, next_timestamp)
+                self.aborts += 1
+                temp_schedule.extend(next_timestamp for _ in range(transaction.length))
+                next_timestamp += 1
+
+            while snapshot_heap and snapshots.get(snapshot_heap[0][1]) != snapshot_heap[0][0]:
+                heapq.heappop(snapshot_heap)
+            snapshot = snapshot_heap[0][0] if snapshot_heap else clock
+            if snapshot > oldest_snapshot:
+                oldest_snapshot = snapshot
+                self.versions.collect(oldest_snapshot)
+
+        self.elapsed += time.perf_counter() - started
+
+    def statistics(self) -> Dict[str, float]:
+        statistics = super().statistics()
+        statistics["versions_created"] = self.versions.created
+        statistics["versions_collected"] = self.versions.collected
+        return statistics
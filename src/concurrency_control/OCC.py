@@ -1,10 +1,16 @@
 from __future__ import annotations
-from typing import List, Set
+from typing import Deque, Dict, List, Set, Tuple
+from collections import Counter, deque
+import heapq
 import sys
+import time
 
 from .ConcurrencyControl import ConcurrencyControl
 from transaction.Transaction import Transaction
 from transaction.Query import Query, Read, Write
+from util.Util import SymbolTable
+from storage.Storage import Storage
+from util.Tracer import Tracer, TraceEvent
 
 class OCCTransaction(Transaction):
     '''
@@ -14,14 +20,18 @@ class OCCTransaction(Transaction):
         start_timestamp (int): The start timestamp of the transaction.
         list_of_queries (List[Query]): The list of queries in the transaction.
         end_timestamp (int): The end timestamp of the transaction.
-        data_item_written (Set[str]): The set of data items written in the transaction.
-        data_item_read (Set[str]): The set of data items read in the transaction.
+        symbols (SymbolTable): Ids of the data items, shared by the transactions of one OCC run.
+        data_item_written (int): Bitset of the ids of the data items written in the transaction.
+        data_item_read (int): Bitset of the ids of the data items read in the transaction.
+        write_set (Dict[str, bytes]): Values written, installed in the storage at commit.
 
     Methods:
         validation_test(validation_timestamp: int, other: OCCTransaction) -> bool:
             Returns True if the transaction is valid, False otherwise.
         next_query() -> None:
             Executes the next query in the transaction.
+        commit() -> None:
+            Installs the write set in the storage.
         rollback(new_timestamp: int) -> None:
             Rollbacks the transaction to the new timestamp.
     '''
@@ -32,39 +42,158 @@ class OCCTransaction(Transaction):
         self.end_timestamp: int = sys.maxsize
 
         # Recording data items written and data items read
-        self.data_item_written: Set[str] = set()
-        self.data_item_read: Set[str] = set()
+        self.symbols = SymbolTable()
+        self.data_item_written: int = 0
+        self.data_item_read: int = 0
+
+        # Writes are private until commit
+        self.write_set: Dict[str, bytes] = {}
 
     def validation_test(self, validation_timestamp: int, other: OCCTransaction) -> bool:
         if self.start_timestamp <= other.start_timestamp:
             return True
         if self.start_timestamp >= other.end_timestamp:
             return True
-        if self.start_timestamp < other.end_timestamp and validation_timestamp >= other.end_timestamp and not self.data_item_read.intersection(other.data_item_written):
+        if self.start_timestamp < other.end_timestamp and validation_timestamp >= other.end_timestamp and not self.data_item_read & other.data_item_written:
             return True
         return False
 
     def next_query(self) -> None:
         current_query = self.current_query
+        item = current_query.get_data_item()
         if isinstance(current_query, Write):
-            item = current_query.get_data_item()
-            self.data_item_written.add(item)
-            current_query.show(self.start_timestamp)
+            self.data_item_written |= 1 << self.symbols.intern(item)
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.WRITE, self.start_timestamp, item)
 
         if isinstance(current_query, Read):
-            item = current_query.get_data_item()
-            self.data_item_read.add(item)
-            current_query.show(self.start_timestamp)
+            self.data_item_read |= 1 << self.symbols.intern(item)
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.READ, self.start_timestamp, item)
 
+        self.execute()
         super().next_query()
 
+    def read(self, data_item: str) -> bytes:
+        if data_item in self.write_set:
+            return self.write_set[data_item]
+        return self.storage.get(data_item)
+
+    def write(self, data_item: str, value: bytes) -> None:
+        self.write_set[data_item] = value
+
+    def commit(self) -> None:
+        for data_item, value in self.write_set.items():
+            self.storage.put(data_item, value)
+        self.write_set = {}
+
+        super().commit()
+
     def rollback(self, new_timestamp: int) -> None:
-        self.data_item_written = set()
-        self.data_item_read = set()
+        self.data_item_written = 0
+        self.data_item_read = 0
+        self.write_set = {}
 
         super().rollback(new_timestamp)        
 
 
+class ValidationIndex:
+    '''
+    Backward validation index for OCC.
+
+    Gives the same answer as running validation_test against every started
+    transaction. Only two kinds of transactions can fail it: a started,
+    unfinished transaction with a smaller start timestamp, or a committed
+    transaction whose lifetime (start timestamp, end timestamp) contains
+    the validating transaction's start timestamp.
+
+    Committed lifetimes are split into aligned blocks of 2^level timestamps
+    and each block keeps the union of the written sets and the latest end
+    timestamp of the lifetimes covering it, so validation looks at one
+    block per level instead of at every committed transaction.
+
+    Attributes:
+        running (Set[int]): Start timestamps of started, unfinished transactions.
+        running_heap (List[int]): Min-heap over running, with stale entries.
+        blocks (Dict[Tuple[int, int], List[int]]): (level, timestamp >> level)
+            -> [written bitset, latest end timestamp].
+        levels (int): Number of levels in use.
+        expiry (List[Tuple[int, Tuple[int, int]]]): Min-heap of (last
+            timestamp, block key), used to drop old blocks.
+
+    Methods:
+        start(start_timestamp: int) -> None:
+            Registers a started transaction.
+        abort(start_timestamp: int) -> None:
+            Forgets an aborted transaction.
+        validate(transaction: OCCTransaction, validation_timestamp: int) -> bool:
+            Returns True if the transaction passes validation.
+        commit(transaction: OCCTransaction) -> None:
+            Records the write set of a committed transaction.
+        collect(horizon: int) -> None:
+            Drops the blocks no transaction with a start timestamp of at
+            least horizon has to check.
+    '''
+    def __init__(self) -> None:
+        self.running: Set[int] = set()
+        self.running_heap: List[int] = []
+        self.blocks: Dict[Tuple[int, int], List[int]] = {}
+        self.levels = 0
+        self.expiry: List[Tuple[int, Tuple[int, int]]] = []
+
+    def start(self, start_timestamp: int) -> None:
+        self.running.add(start_timestamp)
+        heapq.heappush(self.running_heap, start_timestamp)
+
+    def abort(self, start_timestamp: int) -> None:
+        self.running.discard(start_timestamp)
+
+    def oldest_running(self) -> int:
+        heap = self.running_heap
+        while heap and heap[0] not in self.running:
+            heapq.heappop(heap)
+        return heap[0] if heap else sys.maxsize
+
+    def validate(self, transaction: OCCTransaction, validation_timestamp: int) -> bool:
+        start = transaction.start_timestamp
+        if self.oldest_running() < start:
+            return False
+
+        written = 0
+        end = 0
+        for level in range(self.levels):
+            block = self.blocks.get((level, start >> level))
+            if block is not None:
+                written |= block[0]
+                end = max(end, block[1])
+        return validation_timestamp >= end and not transaction.data_item_read & written
+
+    def commit(self, transaction: OCCTransaction) -> None:
+        self.running.discard(transaction.start_timestamp)
+
+        # the validating start timestamps that see this transaction
+        first = transaction.start_timestamp + 1
+        last = transaction.end_timestamp - 1
+        while first <= last:
+            level = 0
+            while first % (2 << level) == 0 and first + (2 << level) - 1 <= last:
+                level += 1
+            key = (level, first >> level)
+            block = self.blocks.get(key)
+            if block is None:
+                self.blocks[key] = [transaction.data_item_written, transaction.end_timestamp]
+                heapq.heappush(self.expiry, (first + (1 << level) - 1, key))
+            else:
+                block[0] |= transaction.data_item_written
+                block[1] = max(block[1], transaction.end_timestamp)
+            self.levels = max(self.levels, level + 1)
+            first += 1 << level
+
+    def collect(self, horizon: int) -> None:
+        while self.expiry and self.expiry[0][0] < horizon:
+            del self.blocks[heapq.heappop(self.expiry)[1]]
+
+
 class OCC(ConcurrencyControl):
     '''
     Optimistic Concurrency Control
@@ -72,53 +201,103 @@ class OCC(ConcurrencyControl):
     Attributes:
         transactions (List[OCCTransaction]): The list of transactions.
         schedule (List[int]): The schedule of the transactions.
+        symbols (SymbolTable): Ids of the data items of all transactions.
+        storage (Storage): The data the transactions read and write.
+        tracer (Tracer): Receives the events of the run.
 
     Methods:
         run() -> None:
             Runs the OCC algorithm.
     '''
-    def __init__(self, transactions: List[OCCTransaction], schedule: List[int]) -> None:
-        super().__init__(transactions, schedule)
+    def __init__(self, transactions: List[OCCTransaction], schedule: List[int], storage: Storage = None,
+                 tracer: Tracer = None) -> None:
+        super().__init__(transactions, schedule, storage, tracer)
+
+        self.symbols = SymbolTable()
+        for transaction in transactions:
+            transaction.symbols = self.symbols
 
     def run(self):
-        temp_schedule: List[int] = [timestamp for timestamp in self.schedule]
-        active_timestamp: List[int] = []
+        started = time.perf_counter()
+        tracer = self.tracer
+        temp_schedule: Deque[int] = deque(self.schedule)
+        # Insertion ordered, used as an ordered set
+        active_timestamp: Dict[int, None] = {}
         counter = 0
+        # restarts move past every start timestamp given out so far, the
+        # position based timestamp alone can repeat one
+        last_timestamp = max(self.by_timestamp, default=0)
+
+        # Entries of aborted transactions are dropped lazily when they reach
+        # the head of the schedule instead of rebuilding it on every abort
+        pending: Counter[int] = Counter(temp_schedule)
+        stale: Counter[int] = Counter()
+        remaining = len(temp_schedule)
+
+        # Committed write sets are kept until every transaction that still
+        # has operations left starts at or after their end timestamp
+        index = ValidationIndex()
+        unfinished: List[int] = list(pending)
+        heapq.heapify(unfinished)
 
         # Run until all transactions are finished
         while temp_schedule:
-            current_timestamp = temp_schedule.pop(0)
+            current_timestamp = temp_schedule.popleft()
+
+            if stale[current_timestamp]:
+                stale[current_timestamp] -= 1
+                continue
+
+            pending[current_timestamp] -= 1
+            remaining -= 1
 
             if current_timestamp not in active_timestamp:
-                active_timestamp.append(current_timestamp)
-                print(f"T{current_timestamp} started.")
+                active_timestamp[current_timestamp] = None
+                index.start(current_timestamp)
+                if tracer.enabled:
+                    tracer.event(TraceEvent.START, current_timestamp)
 
             transaction: OCCTransaction = self.get_transaction(current_timestamp)
 
             transaction.next_query()
+            self.executed += 1
 
             if transaction.is_finished():
-                # Validation test for all active transactions
-                valid = all(transaction.validation_test(
-                    current_timestamp +
-                    counter, self.get_transaction(timestamp)
-                ) for timestamp in active_timestamp)
+                # Validation test against the transactions it overlaps
+                valid = index.validate(transaction, current_timestamp + counter)
 
                 if valid:
                     transaction.commit()
+                    self.commits += 1
                     transaction.end_timestamp = current_timestamp + counter
+                    index.commit(transaction)
+
+                    while unfinished and pending[unfinished[0]] <= 0:
+                        heapq.heappop(unfinished)
+                    index.collect(unfinished[0] if unfinished else sys.maxsize)
 
                 else:
-                    temp_schedule = [ts for ts in temp_schedule if ts != current_timestamp]
-                    active_timestamp = [ts for ts in active_timestamp if ts != current_timestamp]
-                    new_timestamp = current_timestamp + counter + len(temp_schedule)
+                    dropped = pending.pop(current_timestamp, 0)
+                    stale[current_timestamp] += dropped
+                    remaining -= dropped
+                    del active_timestamp[current_timestamp]
+                    index.abort(current_timestamp)
+                    new_timestamp = max(current_timestamp + counter + remaining, last_timestamp + 1)
+                    last_timestamp = new_timestamp
 
-                    print(f"Conflict with T{active_timestamp[-1]}.")
+                    if tracer.enabled:
+                        tracer.event(TraceEvent.ABORT, current_timestamp, detail=next(reversed(active_timestamp)))
 
-                    transaction.rollback(new_timestamp)
+                    self.rollback(transaction, new_timestamp)
+                    self.aborts += 1
 
                     temp_schedule.extend(
                         new_timestamp for _ in range(transaction.length)
                     )
+                    pending[new_timestamp] += transaction.length
+                    remaining += transaction.length
+                    heapq.heappush(unfinished, new_timestamp)
 
             counter += 1
+
+        self.elapsed += time.perf_counter() - started
@@ -0,0 +1,212 @@
+# conflict serializability of histories
+# the precedence graph is built in one pass over the history. every data
+# item keeps its last writer and the transactions that read it since, so a
+# read adds one edge and a write adds one edge per reader instead of
+# comparing every pair of operations. edges to earlier writers and readers
+# are implied through the last writer, which keeps the same reachability
+# and so the same cycles and serial orders as the full graph
+
+# a transaction is a node from its first operation to its commit, a
+# transaction id used again after its commit is a new node
+
+# histories are (operation, transaction_id, data_item) tuples, operation is
+# an Operation or an EventType, other event types are ignored. the history
+# should only hold committed work: TwoPhaseLocking removes rolled back
+# operations from its history and HistoryRecorder drops them
+
+from collections import deque
+
+from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, Operation
+from concurrency_control.History import History, EventType
+from util.Tracer import Tracer, TraceEvent
+
+READ = Operation.READ.value
+WRITE = Operation.WRITE.value
+COMMIT = Operation.COMMIT.value
+
+class PrecedenceGraph:
+    '''
+    Precedence graph of a history.
+
+    Attributes:
+        transactions (list): node -> transaction id.
+        edges (list): node -> set of nodes that must come after it.
+        active (dict): transaction id -> node of its uncommitted operations.
+        writer (dict): data item -> node of its last writer.
+        readers (dict): data item -> nodes that read it since its last write.
+        operations (int): Reads and writes seen.
+
+    Methods:
+        add(code, transaction_id, data_item) -> None:
+            Adds one operation, code is the value of its Operation.
+        add_operations(operations) -> PrecedenceGraph:
+            Adds (operation, transaction_id, data_item) tuples.
+        add_history(history) -> PrecedenceGraph:
+            Adds the reads, writes and commits still in a History.
+        serial_order() -> list:
+            Returns the transaction ids in an equivalent serial order, None
+            if the history is not conflict serializable.
+        find_cycle() -> list:
+            Returns the transaction ids of a cycle, empty if there is none.
+    '''
+    def __init__(self):
+        self.transactions = []
+        self.edges = []
+        self.active = {}
+        self.writer = {}
+        self.readers = {}
+        self.operations = 0
+
+    def node(self, transaction_id: int) -> int:
+        node = self.active.get(transaction_id)
+        if node is None:
+            node = self.active[transaction_id] = len(self.transactions)
+            self.transactions.append(transaction_id)
+            self.edges.append(set())
+        return node
+
+    def add(self, code: int, transaction_id: int, data_item):
+        if code == READ:
+            node = self.node(transaction_id)
+            writer = self.writer.get(data_item)
+            if writer is not None and writer != node:
+                self.edges[writer].add(node)
+            readers = self.readers.get(data_item)
+            if readers is None:
+                readers = self.readers[data_item] = set()
+            readers.add(node)
+            self.operations += 1
+        elif code == WRITE:
+            node = self.node(transaction_id)
+            writer = self.writer.get(data_item)
+            if writer is not None and writer != node:
+                self.edges[writer].add(node)
+            readers = self.readers.pop(data_item, None)
+            if readers is not None:
+                for reader in readers:
+                    if reader != node:
+                        self.edges[reader].add(node)
+            self.writer[data_item] = node
+            self.operations += 1
+        elif code == COMMIT:
+            self.active.pop(transaction_id, None)
+
+    def add_operations(self, operations) -> 'PrecedenceGraph':
+        add = self.add
+        for operation, transaction_id, data_item in operations:
+            add(operation.value, transaction_id, data_item)
+        return self
+
+    def add_history(self, history: History) -> 'PrecedenceGraph':
+        # read straight from the columns, data items stay symbol ids
+        add = self.add
+        for code, transaction_id, data_item in zip(history.event_types, history.transaction_ids, history.data_items):
+            if code == EventType.READ or code == EventType.WRITE or code == EventType.COMMIT:
+                add(code, transaction_id, data_item)
+        return self
+
+    def topological_order(self) -> list:
+        # Kahn's algorithm, nodes on or behind a cycle are left out
+        indegree = [0] * len(self.edges)
+        for successors in self.edges:
+            for successor in successors:
+                indegree[successor] += 1
+        ready = deque(node for node, degree in enumerate(indegree) if degree == 0)
+        order = []
+        while ready:
+            node = ready.popleft()
+            order.append(node)
+            for successor in self.edges[node]:
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    ready.append(successor)
+        return order
+
+    def is_serializable(self) -> bool:
+        return len(self.topological_order()) == len(self.edges)
+
+    def serial_order(self) -> list:
+        order = self.topological_order()
+        if len(order) != len(self.edges):
+            return None
+        return [self.transactions[node] for node in order]
+
+    def find_cycle(self) -> list:
+        # iterative depth first search from the nodes the topological order
+        # could not place, every one of them reaches a cycle
+        placed = set(self.topological_order())
+        state = {}
+        for start in range(len(self.edges)):
+            if start in placed or start in state:
+                continue
+            path = [start]
+            state[start] = 1
+            stack = [iter(self.edges[start])]
+            while stack:
+                successor = next(stack[-1], None)
+                if successor is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state.get(successor) == 1:
+                    cycle = path[path.index(successor):]
+                    return [self.transactions[node] for node in cycle]
+                elif successor not in state and successor not in placed:
+                    state[successor] = 1
+                    path.append(successor)
+                    stack.append(iter(self.edges[successor]))
+        return []
+
+class HistoryRecorder(Tracer):
+    '''
+    Records the committed history of a traced OCC or timestamp ordering run.
+
+    Operations of a transaction are kept until it commits and dropped when
+    it rolls back. With deferred_writes, as in OCC and timestamp ordering,
+    writes take effect when the transaction commits instead of when they
+    run.
+
+    Attributes:
+        deferred_writes (bool): Place writes at the commit.
+        history (list): Committed (operation, transaction_id, data_item) tuples.
+        positions (dict): transaction_id -> positions of its uncommitted entries.
+        writes (dict): transaction_id -> data items of its deferred writes.
+    '''
+    enabled = True
+
+    def __init__(self, deferred_writes: bool = False):
+        self.deferred_writes = deferred_writes
+        self.history = []
+        self.positions = {}
+        self.writes = {}
+
+    def event(self, event: TraceEvent, transaction_id: int, data_item: str = "", detail=None):
+        if event == TraceEvent.READ or (event == TraceEvent.WRITE and not self.deferred_writes):
+            operation = Operation.READ if event == TraceEvent.READ else Operation.WRITE
+            self.positions.setdefault(transaction_id, []).append(len(self.history))
+            self.history.append((operation, transaction_id, data_item))
+        elif event == TraceEvent.WRITE:
+            self.writes.setdefault(transaction_id, {})[data_item] = None
+        elif event == TraceEvent.COMMIT:
+            for data_item in self.writes.pop(transaction_id, ()):
+                self.history.append((Operation.WRITE, transaction_id, data_item))
+            self.history.append((Operation.COMMIT, transaction_id, ""))
+            self.positions.pop(transaction_id, None)
+        elif event == TraceEvent.ROLLBACK:
+            self.writes.pop(transaction_id, None)
+            for position in self.positions.pop(transaction_id, ()):
+                self.history[position] = None
+
+    def operations(self):
+        return (operation for operation in self.history if operation is not None)
+
+def check_serializable(history) -> PrecedenceGraph:
+    # history is a TwoPhaseLocking run, a History, a HistoryRecorder or
+    # (operation, transaction_id, data_item) tuples
+    graph = PrecedenceGraph()
+    if isinstance(history, TwoPhaseLocking):
+        history = history.history
+    if isinstance(history, History):
+        return graph.add_history(history)
+    if isinstance(history, HistoryRecorder):
+        history = history.operations()
+    return graph.add_operations(history)
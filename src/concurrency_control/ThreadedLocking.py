@@ -0,0 +1,193 @@
+# multithreaded strict two phase locking
+# every transaction of the schedule runs in a worker thread against a
+# ConcurrentLockManager, so lock waits are real condition variable waits.
+# a lock request that is not granted within timeout seconds aborts the
+# transaction (releasing its locks, which also breaks deadlocks) and it
+# retries after a random backoff
+
+# the schedule only decides which operations each transaction runs and in
+# which order, the interleaving is left to the threads
+
+import queue
+import random
+import threading
+import time
+
+import os, sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from transaction.LockManager import ConcurrentLockManager, LockType
+from concurrency_control.TwoPhaseLocking import Operation, parse_schedule
+from util.Util import parse_input
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class WorkerStatistics:
+    '''
+    Counters of one worker thread, merged after the run.
+
+    Attributes:
+        commits (int): Committed transactions.
+        aborts (int): Lock timeouts that aborted a transaction.
+        operations (int): Executed reads and writes, including aborted ones.
+        lock_latencies (list): Seconds each granted lock request took.
+        transaction_latencies (list): Seconds from first attempt to commit.
+    '''
+    def __init__(self):
+        self.commits = 0
+        self.aborts = 0
+        self.operations = 0
+        self.lock_latencies = []
+        self.transaction_latencies = []
+
+class ThreadedTwoPhaseLocking:
+    '''
+    Strict two phase locking with one thread per running transaction.
+
+    Attributes:
+        transactions (dict): transaction_id -> [(operation, data_item)] up to its commit.
+        locks_manager (ConcurrentLockManager): The thread-safe lock manager.
+        workers (int): Number of worker threads, None for one per transaction.
+        timeout (float): Seconds a lock request may wait before aborting.
+        think_time (float): Seconds spent on every read or write.
+        max_retries (int): Aborts after which a transaction gives up.
+        commit_order (list): Transaction ids in commit order.
+
+    Methods:
+        from_operations(operations, **options) -> ThreadedTwoPhaseLocking:
+            Builds the engine from parsed operations instead of a schedule.
+        run() -> None:
+            Runs every transaction to commit.
+        statistics() -> dict:
+            Returns throughput, abort and latency figures of the run.
+    '''
+    def __init__(self, schedule: list, lockmanager: ConcurrentLockManager = None,
+                 workers: int = None, timeout: float = 0.05, think_time: float = 0.0,
+                 max_retries: int = 100):
+        self.transactions = {}
+        self.add_operations(parse_schedule(schedule))
+
+        self.locks_manager = ConcurrentLockManager() if lockmanager is None else lockmanager
+        self.workers = workers
+        self.timeout = timeout
+        self.think_time = think_time
+        self.max_retries = max_retries
+
+        self.commit_order = []
+        self.commit_latch = threading.Lock()
+        self.worker_statistics = []
+        self.elapsed = 0.0
+
+    @classmethod
+    def from_operations(cls, operations: list, **options) -> 'ThreadedTwoPhaseLocking':
+        # build from parsed (operation, transaction_id, data_item) tuples
+        tpl = cls([], **options)
+        tpl.add_operations(operations)
+        return tpl
+
+    def add_operations(self, operations: list):
+        for operation, transaction_id, data_item in operations:
+            queued = self.transactions.setdefault(transaction_id, [])
+            if operation != Operation.COMMIT:
+                queued.append((operation, data_item))
+
+    def run_transaction(self, transaction_id: int, statistics: WorkerStatistics):
+        first_attempt = time.perf_counter()
+        for _ in range(self.max_retries + 1):
+            if self.attempt(transaction_id, statistics):
+                statistics.commits += 1
+                statistics.transaction_latencies.append(time.perf_counter() - first_attempt)
+                return
+            statistics.aborts += 1
+            time.sleep(random.uniform(0, self.timeout))
+        raise Exception(f"T{transaction_id} aborted {self.max_retries + 1} times")
+
+    def attempt(self, transaction_id: int, statistics: WorkerStatistics) -> bool:
+        for operation, data_item in self.transactions[transaction_id]:
+            lock_type = LockType.X if operation == Operation.WRITE else LockType.S
+            requested = time.perf_counter()
+            if not self.locks_manager.acquire(transaction_id, data_item, lock_type, self.timeout):
+                self.locks_manager.release(transaction_id)
+                return False
+            statistics.lock_latencies.append(time.perf_counter() - requested)
+            statistics.operations += 1
+            if self.think_time:
+                time.sleep(self.think_time)
+
+        with self.commit_latch:
+            self.commit_order.append(transaction_id)
+        self.locks_manager.release(transaction_id)
+        return True
+
+    def worker(self, transactions: queue.Queue, statistics: WorkerStatistics, errors: list):
+        while True:
+            try:
+                transaction_id = transactions.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self.run_transaction(transaction_id, statistics)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    def run(self):
+        transactions = queue.Queue()
+        for transaction_id in self.transactions:
+            transactions.put(transaction_id)
+
+        workers = len(self.transactions) if self.workers is None else self.workers
+        self.worker_statistics = [WorkerStatistics() for _ in range(workers)]
+        errors = []
+        threads = [threading.Thread(target=self.worker, args=(transactions, statistics, errors))
+                   for statistics in self.worker_statistics]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - started
+
+        if errors:
+            raise errors[0]
+
+    def statistics(self) -> dict:
+        commits = sum(s.commits for s in self.worker_statistics)
+        operations = sum(s.operations for s in self.worker_statistics)
+        lock_latencies = [l for s in self.worker_statistics for l in s.lock_latencies]
+        transaction_latencies = [l for s in self.worker_statistics for l in s.transaction_latencies]
+        elapsed = self.elapsed if self.elapsed else float("inf")
+
+        return {
+            "workers": len(self.worker_statistics),
+            "commits": commits,
+            "aborts": sum(s.aborts for s in self.worker_statistics),
+            "operations": operations,
+            "seconds": self.elapsed,
+            "transactions_per_second": commits / elapsed,
+            "operations_per_second": operations / elapsed,
+            "lock_latency_p50_us": percentile(lock_latencies, 0.5) * 1e6,
+            "lock_latency_p99_us": percentile(lock_latencies, 0.99) * 1e6,
+            "transaction_latency_p50_ms": percentile(transaction_latencies, 0.5) * 1e3,
+            "transaction_latency_p99_ms": percentile(transaction_latencies, 0.99) * 1e3,
+        }
+
+if __name__ == "__main__":
+
+    sample_input_6 = "W1(X); W2(Y); W1(Y); W2(X); C1; C2"             # deadlock
+    schedule = parse_input(sample_input_6)
+
+    transaction = ThreadedTwoPhaseLocking(schedule, think_time=0.01)
+    transaction.run()
+    print("Commit order: ", transaction.commit_order)
+    for key, value in transaction.statistics().items():
+        print(key + ": " + str(value))
@@ -0,0 +1,220 @@
+from typing import Deque, Dict, List
+from collections import Counter, deque
+import time
+
+from .ConcurrencyControl import ConcurrencyControl
+from transaction.Transaction import Transaction
+from transaction.Query import Read, Write
+from storage.Storage import Storage
+from util.Tracer import Tracer, TraceEvent
+
+class TimestampOrdering(ConcurrencyControl):
+    '''
+    Timestamp Ordering
+
+    The start timestamp of a transaction is its position in the serial
+    order. A read of an item written by a younger transaction, or a write
+    of an item read or written by a younger transaction, rolls the
+    transaction back; it restarts with a new, larger timestamp at the end
+    of the schedule. With Thomas's write rule a write of an item only
+    written (not read) by a younger transaction is obsolete and skipped
+    instead.
+
+    Writes are buffered until the transaction commits, so a rollback never
+    touches the storage. A query on a data item with a buffered write of
+    an older, unfinished transaction waits until that transaction commits
+    or rolls back, so nothing reads or overwrites an uncommitted value
+    (strict timestamp ordering). Waits only go from younger to older
+    transactions and cannot deadlock.
+
+    Attributes:
+        transactions (List[Transaction]): The list of transactions.
+        schedule (List[int]): The schedule of the transactions.
+        thomas_write_rule (bool): Skip obsolete writes instead of aborting.
+        storage (Storage): The data the transactions read and write.
+        tracer (Tracer): Receives the events of the run.
+        read_timestamp (Dict[str, int]): Largest timestamp that read each data item.
+        write_timestamp (Dict[str, int]): Largest timestamp that wrote each data item.
+        writers (Dict[str, int]): data item -> timestamp of the unfinished
+            transaction with a buffered write of it.
+        write_sets (Dict[int, Dict[str, bytes]]): timestamp -> values written
+            by the unfinished transaction, installed at commit.
+        skipped_writes (int): Number of writes skipped by Thomas's write rule.
+        waits (int): Number of queries that waited for an older writer.
+
+    Methods:
+        blocker(transaction: Transaction) -> int:
+            Returns the timestamp of the older transaction with a buffered
+            write of the data item of the current query, 0 if there is none.
+        conflict(transaction: Transaction) -> int:
+            Runs the current query of the transaction if the timestamp rules
+            allow it, otherwise returns the timestamp of the younger
+            transaction it conflicts with.
+        run() -> None:
+            Runs the timestamp ordering algorithm.
+        statistics() -> Dict[str, float]:
+            Returns the run statistics, the number of skipped writes and of
+            waits.
+    '''
+    def __init__(self, transactions: List[Transaction], schedule: List[int], thomas_write_rule: bool = False,
+                 storage: Storage = None, tracer: Tracer = None) -> None:
+        super().__init__(transactions, schedule, storage, tracer)
+
+        self.thomas_write_rule = thomas_write_rule
+        self.read_timestamp: Dict[str, int] = {}
+        self.write_timestamp: Dict[str, int] = {}
+        self.writers: Dict[str, int] = {}
+        self.write_sets: Dict[int, Dict[str, bytes]] = {}
+        self.skipped_writes = 0
+        self.waits = 0
+
+    def blocker(self, transaction: Transaction) -> int:
+        writer = self.writers.get(transaction.current_query.get_data_item(), 0)
+        return writer if writer < transaction.start_timestamp else 0
+
+    def conflict(self, transaction: Transaction) -> int:
+        # returns the timestamp of the younger transaction the current query
+        # conflicts with, 0 if it may run
+        timestamp = transaction.start_timestamp
+        query = transaction.current_query
+        item = query.get_data_item()
+        read_timestamp = self.read_timestamp.get(item, 0)
+        write_timestamp = self.write_timestamp.get(item, 0)
+        write_set = self.write_sets.get(timestamp)
+
+        if isinstance(query, Read):
+            if timestamp < write_timestamp:
+                return write_timestamp
+            self.read_timestamp[item] = max(read_timestamp, timestamp)
+            if write_set is not None and item in write_set:
+                query.value = write_set[item]
+            else:
+                query.value = self.storage.get(item)
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.READ, timestamp, item)
+            return 0
+
+        if isinstance(query, Write):
+            if timestamp < read_timestamp:
+                return read_timestamp
+            if timestamp < write_timestamp:
+                # the younger write is only final, and this one obsolete,
+                # once its transaction committed
+                if not self.thomas_write_rule or item in self.writers:
+                    return write_timestamp
+                if self.tracer.enabled:
+                    self.tracer.event(TraceEvent.SKIP, timestamp, item)
+                self.skipped_writes += 1
+                return 0
+            self.write_timestamp[item] = timestamp
+            self.writers[item] = timestamp
+            if write_set is None:
+                write_set = self.write_sets[timestamp] = {}
+            write_set[item] = transaction.write_value(query)
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.WRITE, timestamp, item)
+            return 0
+
+        raise Exception("Invalid query")
+
+    def finish(self, timestamp: int, commit: bool) -> None:
+        # installs or drops the buffered writes of a finished transaction
+        for item, value in self.write_sets.pop(timestamp, {}).items():
+            if commit:
+                self.storage.put(item, value)
+            if self.writers.get(item) == timestamp:
+                del self.writers[item]
+
+    def run(self):
+        started = time.perf_counter()
+        tracer = self.tracer
+        temp_schedule: Deque[int] = deque(self.schedule)
+        active_timestamp: Dict[int, None] = {}
+        next_timestamp = max(self.by_timestamp, default=0) + 1
+
+        # Entries of rolled back transactions are dropped lazily when they
+        # reach the head of the schedule
+        pending: Counter[int] = Counter(temp_schedule)
+        stale: Counter[int] = Counter()
+
+        # blocker timestamp -> {waiting timestamp: its entries held back},
+        # put back at the head of the schedule when the blocker finishes
+        waiting: Dict[int, Dict[int, int]] = {}
+
+        def wake(blocker: int):
+            waiters = waiting.pop(blocker, None)
+            if waiters is None:
+                return
+            for waiter, entries in reversed(waiters.items()):
+                temp_schedule.extendleft(waiter for _ in range(entries))
+                if tracer.enabled:
+                    tracer.event(TraceEvent.WAKE, waiter)
+
+        # Run until all transactions are finished
+        while temp_schedule:
+            current_timestamp = temp_schedule.popleft()
+
+            if stale[current_timestamp]:
+                stale[current_timestamp] -= 1
+                continue
+
+            pending[current_timestamp] -= 1
+
+            if current_timestamp not in active_timestamp:
+                active_timestamp[current_timestamp] = None
+                if tracer.enabled:
+                    tracer.event(TraceEvent.START, current_timestamp)
+
+            transaction = self.get_transaction(current_timestamp)
+
+            blocker = self.blocker(transaction)
+            if blocker:
+                waiters = waiting.setdefault(blocker, {})
+                if current_timestamp not in waiters:
+                    waiters[current_timestamp] = 0
+                    self.waits += 1
+                    if tracer.enabled:
+                        tracer.event(TraceEvent.WAIT, current_timestamp,
+                                     transaction.current_query.get_data_item(), len(waiters))
+                waiters[current_timestamp] += 1
+                pending[current_timestamp] += 1
+                continue
+
+            younger = self.conflict(transaction)
+
+            if younger:
+                if tracer.enabled:
+                    tracer.event(TraceEvent.ABORT, current_timestamp,
+                                 transaction.current_query.get_data_item(), younger)
+                stale[current_timestamp] += pending.pop(current_timestamp, 0)
+                del active_timestamp[current_timestamp]
+                self.finish(current_timestamp, False)
+                wake(current_timestamp)
+
+                self.rollback(transaction, next_timestamp)
+                self.aborts += 1
+
+                temp_schedule.extend(
+                    next_timestamp for _ in range(transaction.length)
+                )
+                pending[next_timestamp] += transaction.length
+                next_timestamp += 1
+                continue
+
+            transaction.next_query()
+            self.executed += 1
+
+            if transaction.is_finished():
+                self.finish(current_timestamp, True)
+                transaction.commit()
+                self.commits += 1
+                del active_timestamp[current_timestamp]
+                wake(current_timestamp)
+
+        self.elapsed += time.perf_counter() - started
+
+    def statistics(self) -> Dict[str, float]:
+        statistics = super().statistics()
+        statistics["skipped_writes"] = self.skipped_writes
+        statistics["waits"] = self.waits
+        return statistics
@@ -6,13 +6,18 @@
 # <Operation><Transaction ID>(<Data item>)) ;
 # <Operation> = R | W | C
 # <Transaction ID> = number
-# <Data item> = letter and optional
+# <Data item> = any characters but whitespace, parentheses and ';', only
+#               for R and W
+# whitespace may appear between the parts, the last ';' is optional
 
 # example
 # R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;
 
 # output the final schedule after two phase locking
 import enum
+import heapq
+import re
+from collections import deque
 
 # enum
 class Operation(enum.Enum):
@@ -26,25 +31,70 @@ class Operation(enum.Enum):
     def __repr__(self):
         return self.__str__()
 
-def parse_schedule(schedule: list) -> list:
+OPERATION_CODES = {
+    "R": Operation.READ, "r": Operation.READ,
+    "W": Operation.WRITE, "w": Operation.WRITE,
+    "C": Operation.COMMIT, "c": Operation.COMMIT,
+}
+
+# OPERATION_PATTERN matches one operation, SCHEDULE_PATTERN one operation
+# of a schedule string up to its ';' and SEPARATOR_PATTERN what may come
+# between two operations
+OPERATION = r"\s*([RrWwCc])\s*(\d+)\s*(?:\(\s*([^\s();]+)\s*\))?\s*"
+OPERATION_PATTERN = re.compile(OPERATION)
+SCHEDULE_PATTERN = re.compile(OPERATION + r"(?:;|$)")
+SEPARATOR_PATTERN = re.compile(r"[\s;]*")
+
+def parse_schedule(schedule: list, symbols: 'SymbolTable' = None) -> list:
     # parse the schedule
-    # return a list of tuple (operation, transaction_id, data_item)
-    result = []
-    s : str
-    for s in schedule:
-        match s[0].upper():
-            case "R":
-                operation = Operation.READ
-            case "W":
-                operation = Operation.WRITE
-            case "C":
-                operation = Operation.COMMIT
-            case _:
-                raise Exception("Invalid operation")
-        transaction_id = int(s[1])
-        data_item = s[3:-1]
-        result.append((operation, transaction_id, data_item))
-    return result
+    # return a list of tuple (operation, transaction_id, data_item), with
+    # symbols data items are their ids in it and commits have NO_ITEM
+    return list(iter_schedule(schedule, symbols))
+
+def iter_schedule(schedule, symbols: 'SymbolTable' = None):
+    # parse the schedule lazily, schedule may be any iterable of operation
+    # strings such as util.Util.read_operations
+    def matches():
+        fullmatch = OPERATION_PATTERN.fullmatch
+        s : str
+        for s in schedule:
+            match = fullmatch(s)
+            if match is None:
+                raise Exception(f"Invalid operation {s!r}")
+            yield match
+    return parse_matches(matches(), symbols)
+
+def tokenize_schedule(text: str, symbols: 'SymbolTable' = None):
+    # parse a whole schedule string in one pass, without splitting it
+    def matches():
+        position = 0
+        while True:
+            position = SEPARATOR_PATTERN.match(text, position).end()
+            if position == len(text):
+                return
+            match = SCHEDULE_PATTERN.match(text, position)
+            if match is None:
+                raise Exception(f"Invalid operation at position {position}")
+            position = match.end()
+            yield match
+    return parse_matches(matches(), symbols)
+
+def parse_matches(matches, symbols: 'SymbolTable' = None):
+    # data items are interned in symbols once, here, and replaced by their ids
+    codes = OPERATION_CODES
+    ids = symbols.ids if symbols is not None else None
+    no_item = "" if symbols is None else NO_ITEM
+    for match in matches:
+        letter, transaction_id, data_item = match.groups()
+        operation = codes[letter]
+        if (data_item is None) != (operation == Operation.COMMIT):
+            raise Exception(f"Invalid operation {match.group().strip()!r}")
+        if data_item is None:
+            data_item = no_item
+        elif ids is not None:
+            symbol = ids.get(data_item)
+            data_item = symbols.intern(data_item) if symbol is None else symbol
+        yield (operation, int(transaction_id), data_item)
     
 import os, sys
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -53,75 +103,270 @@ sys.path.append(CURRENT_DIR)
 PARENT_DIR = os.path.dirname(CURRENT_DIR)
 sys.path.append(PARENT_DIR)
 
-from transaction.LockManager import LockManager, LockType
-from util.Util import parse_input
+from transaction.LockManager import LockManager, IndexedLockManager, LockRequestManager, HierarchicalLockManager, LockType
+from util.Util import parse_input, read_operations, SymbolTable, NO_ITEM
+from util.Trace import Trace, write_trace
+from util.Tracer import Tracer, TraceEvent, NO_TRACER
+from storage.Storage import Storage, MemoryStore
+from concurrency_control.Deadlock import DeadlockPolicy, WaitsForGraph, make_policy
+from concurrency_control.History import History, EventType
+
+# trace record code -> operation
+TRACE_OPERATIONS = {operation.value: operation for operation in Operation}
+
+def iter_trace(trace: Trace, symbols: SymbolTable = None):
+    # replay the records of a binary trace as parsed operations, data items
+    # are the strings of the trace dictionary, or with symbols their ids in
+    # it, as parse_schedule returns them
+    if symbols is not None:
+        items = [symbols.intern(name) for name in trace.names]
+        items.append(NO_ITEM)
+    else:
+        items = trace.names + [""]
+    # the item of commits, NO_ITEM, indexes the last entry
+    operation = TRACE_OPERATIONS.__getitem__
+    item = items.__getitem__
+    for codes, transaction_ids, symbols_column in trace.columns():
+        yield from zip(map(operation, codes), transaction_ids, map(item, symbols_column))
+
+def convert_schedule(filename: str, trace_path: str, chunk_size: int = 1 << 20) -> int:
+    # convert a text schedule file to a binary trace, returns the number of operations
+    return write_trace(trace_path, iter_schedule(read_operations(filename, chunk_size)))
+
+OPERATION_EVENTS = {
+    Operation.READ: EventType.READ,
+    Operation.WRITE: EventType.WRITE,
+    Operation.COMMIT: EventType.COMMIT,
+}
+
+class TransactionLog:
+    '''
+    Work of one transaction, used to roll it back without scanning the
+    whole schedule and result.
+
+    Attributes:
+        positions (list): History positions of the transaction's entries, in order.
+        operations (list): (history position, operation) of its executed reads and writes.
+        locks (dict): data item -> history position of the first lock taken on it.
+        upgrades (dict): data item -> history position of its lock upgrade.
+        undo (list): (history position, data item, value it replaced) of its writes.
+    '''
+    def __init__(self):
+        self.positions = []
+        self.operations = []
+        self.locks = {}
+        self.upgrades = {}
+        self.undo = []
+
 class TwoPhaseLocking:
     
-    def __init__(self, schedule: list, lockmanager: LockManager = LockManager()):
+    def __init__(self, schedule: list, lockmanager: LockManager = None, storage: Storage = None,
+                 tracer: Tracer = None):
         self.schedule = schedule
-        self.parsed_schedule = parse_schedule(schedule)
-        self.locks_manager = lockmanager
-        self.waiting_queue = []
-        self.result = []
+        self.symbols = SymbolTable()
+        self.operations = deque(parse_schedule(schedule, self.symbols))
+        # operations not parsed yet, pulled when the deque runs empty
+        self.source = iter(())
+        # a shared default manager would carry locks from one run to the next
+        self.locks_manager = IndexedLockManager() if lockmanager is None else lockmanager
+        # data items are symbols of self.symbols from parsing on, the lock
+        # manager and the history work on them and names are only looked up
+        # for the storage, the tracer and printing
+        if isinstance(self.locks_manager, HierarchicalLockManager):
+            self.locks_manager.symbols = self.symbols
+        self.history = History(self.symbols)
+        self.logs = {}
+
+        # reads and writes run on the storage, writes in place under their
+        # exclusive lock, so a rollback restores the values they replaced
+        self.storage = MemoryStore() if storage is None else storage
+
+        # receives lock waits, aborts and deadlock events, verbose still
+        # prints the whole state after every operation
+        self.tracer = NO_TRACER if tracer is None else tracer
+
         self.upgrade = False
         self.rollback = False
         self.verbose = False
+
+        # per transaction wait state: queued (sequence, operation) pairs and
+        # the data item each waiting transaction is blocked on
+        self.waiting = {}
+        self.waiting_on = {}
+        self.wait_item = {}
+        self.queue_counter = 0
+        self.wakeup = "all"
+
+        # deadlock handling
+        self.policy = DeadlockPolicy()
+        self.steps = 0
+
+        # with a LockRequestManager, lock waits live in the manager's per item
+        # queues and a blocked transaction parks its operations here
+        self.queued = isinstance(self.locks_manager, LockRequestManager)
+        self.blocked = {}
     
+    @classmethod
+    def from_file(cls, filename: str, lockmanager: LockManager = None,
+                  storage: Storage = None, chunk_size: int = 1 << 20, tracer: Tracer = None) -> 'TwoPhaseLocking':
+        # stream the schedule from a file instead of parsing it up front
+        tpl = cls([], lockmanager, storage, tracer)
+        tpl.source = iter_schedule(read_operations(filename, chunk_size), tpl.symbols)
+        return tpl
+
+    @classmethod
+    def from_trace(cls, trace: Trace, lockmanager: LockManager = None,
+                   storage: Storage = None, tracer: Tracer = None) -> 'TwoPhaseLocking':
+        # replay a binary trace, records are read from its mapping during the run
+        tpl = cls([], lockmanager, storage, tracer)
+        tpl.source = iter_trace(trace, tpl.symbols)
+        return tpl
+
+    def has_operations(self) -> bool:
+        if not self.operations:
+            operation = next(self.source, None)
+            if operation is not None:
+                self.operations.append(operation)
+        return len(self.operations) > 0
+
+    def item_name(self, data_item: int) -> str:
+        return self.symbols.names[data_item] if data_item != NO_ITEM else ""
+
+    def item_names(self, operations) -> list:
+        name = self.item_name
+        return [(operation, transaction_id, name(data_item)) for operation, transaction_id, data_item in operations]
+
+    # schedule is consumed from the head of a deque, shown with item names
+    @property
+    def parsed_schedule(self) -> list:
+        return self.item_names(self.operations)
+
+    @parsed_schedule.setter
+    def parsed_schedule(self, schedule: list):
+        intern = self.symbols.intern
+        self.operations = deque((operation, transaction_id, intern(data_item) if data_item != "" else NO_ITEM)
+                                for operation, transaction_id, data_item in schedule)
+
     # queue method
-    def add_queue(self, operation: Operation, transaction_id: int, data_item: str):
-        self.waiting_queue.append((operation, transaction_id, data_item))
+    @property
+    def waiting_queue(self) -> list:
+        # queued operations of every waiting transaction in arrival order
+        return self.item_names(t for _, t in heapq.merge(*self.waiting.values()))
+
+    def add_queue(self, operation: Operation, transaction_id: int, data_item: int, wait_item: int = None):
+        entry = (self.queue_counter, (operation, transaction_id, data_item))
+        self.queue_counter += 1
+
+        queued = self.waiting.get(transaction_id)
+        if queued is None:
+            # unless told otherwise, the transaction is blocked on the data
+            # item of its first queued operation
+            wait_item = data_item if wait_item is None else wait_item
+            self.waiting[transaction_id] = [entry]
+            self.wait_item[transaction_id] = wait_item
+            waiters = self.waiting_on.setdefault(wait_item, {})
+            waiters[transaction_id] = None
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.WAIT, transaction_id, self.item_name(wait_item), len(waiters))
+        else:
+            queued.append(entry)
 
     def is_waiting(self, transaction_id: int) -> bool:
-        return transaction_id in [t[1] for t in self.waiting_queue]
+        return transaction_id in self.waiting
 
     def remove_queue(self, transaction_id: int):
-        self.waiting_queue = [t for t in self.waiting_queue if t[1] != transaction_id]
+        queued = self.waiting.pop(transaction_id, None)
+        if queued is None:
+            return
+
+        self.policy.on_wait_end(self, transaction_id)
+        data_item = self.wait_item.pop(transaction_id)
+        if self.tracer.enabled:
+            self.tracer.event(TraceEvent.WAKE, transaction_id, self.item_name(data_item))
+        waiters = self.waiting_on[data_item]
+        del waiters[transaction_id]
+        if not waiters:
+            del self.waiting_on[data_item]
 
     # result method
-    def add_result(self, operation: Operation, transaction_id: int, data_item: str=""):
-        transaction_id = str(transaction_id)
-        op_str = "R" if operation == Operation.READ else "W" if operation == Operation.WRITE else "C"
-        result_string = op_str + transaction_id
-        if data_item != "":
-            result_string += "(" + data_item + ")"
-        self.result.append(result_string)
-
-    def add_lock_result(self, transaction_id: int, data_item: str, lock_type: LockType):
-        transaction_id = str(transaction_id)
-        operation: str = "SL" if lock_type == LockType.S else "XL"
-        self.result.append(operation + transaction_id + "(" + data_item + ")")
-
-    def add_upgrade_result(self, transaction_id: int, data_item: str, lock_type: LockType):
-        transaction_id = str(transaction_id)
-        operation = "XU" if lock_type == LockType.X else "SU"
-        self.result.append(operation + transaction_id + "(" + data_item + ")")
-
-    def add_unlock_result(self ,transaction_id: int, data_item: str):
-        transaction_id = str(transaction_id)
-        self.result.append("UL" + transaction_id + "(" + data_item + ")")
-
-    def add_rollback_result(self, transaction_id: int, data_item: str):
-        transaction_id = str(transaction_id)
-        self.result.append("RB" + transaction_id + "(" + data_item + ")")
+    @property
+    def result(self) -> list:
+        # events are formatted only when the result is read
+        return self.history.to_strings()
+
+    def get_log(self, transaction_id: int) -> TransactionLog:
+        log = self.logs.get(transaction_id)
+        if log is None:
+            log = self.logs[transaction_id] = TransactionLog()
+        return log
+
+    def record(self, event_type: EventType, transaction_id: int,
+               data_item: int = NO_ITEM, lock_type: LockType = None) -> int:
+        position = self.history.append(event_type, transaction_id, data_item, lock_type)
+        self.get_log(transaction_id).positions.append(position)
+        return position
+
+    def executed_operations(self, transaction_id: int) -> int:
+        log = self.logs.get(transaction_id)
+        return len(log.operations) if log is not None else 0
+
+    def add_result(self, operation: Operation, transaction_id: int, data_item: int = NO_ITEM):
+        position = self.record(OPERATION_EVENTS[operation], transaction_id, data_item)
+        if operation != Operation.COMMIT:
+            self.logs[transaction_id].operations.append((position, (operation, transaction_id, data_item)))
+            self.execute(operation, transaction_id, data_item, position)
+
+    def execute(self, operation: Operation, transaction_id: int, data_item: int, position: int):
+        # the schedule has no values, a write stores the transaction's name
+        # as Transaction.write_value does. the storage is keyed by name
+        name = self.symbols.names[data_item]
+        if operation == Operation.READ:
+            self.storage.get(name)
+        else:
+            self.logs[transaction_id].undo.append((position, name, self.storage.get(name)))
+            self.storage.put(name, f"T{transaction_id}".encode())
+
+    def add_lock_result(self, transaction_id: int, data_item: int, lock_type: LockType):
+        position = self.record(EventType.LOCK, transaction_id, data_item, lock_type)
+        self.logs[transaction_id].locks.setdefault(data_item, position)
+
+    def add_upgrade_result(self, transaction_id: int, data_item: int, lock_type: LockType):
+        position = self.record(EventType.UPGRADE, transaction_id, data_item, lock_type)
+        self.logs[transaction_id].upgrades.setdefault(data_item, position)
+
+    def add_unlock_result(self ,transaction_id: int, data_item: int):
+        self.record(EventType.UNLOCK, transaction_id, data_item)
+
+    def add_rollback_result(self, transaction_id: int, data_item: int):
+        self.record(EventType.ROLLBACK, transaction_id, data_item)
 
     # schedule method
-    def queue_to_schedule(self):
-        to_add = []
-
-        while self.waiting_queue:
-            operation, transaction_id, data_item = self.waiting_queue.pop(0)
-            to_add.append((operation, transaction_id, data_item))
-
-        self.parsed_schedule = to_add + self.parsed_schedule 
-
-        self.waiting_queue = []    
+    def queue_to_schedule(self, data_items: list = None, exclude: int = None, grantable: bool = False):
+        # move queued operations back to the head of the schedule, either all
+        # of them or only those of transactions blocked on the given data
+        # items; grantable leaves out those still blocked by other holders
+        if data_items is None:
+            woken = [t for t in self.waiting if t != exclude]
+        else:
+            woken = [transaction_id for data_item in data_items
+                     for transaction_id in self.waiting_on.get(data_item, ())
+                     if transaction_id != exclude and not (grantable and any(
+                         t != transaction_id for t in self.locks_manager.get_transaction_ids(data_item)))]
+
+        queued = []
+        for transaction_id in woken:
+            queued.append(self.waiting[transaction_id])
+            self.remove_queue(transaction_id)
+
+        to_add = [t for _, t in heapq.merge(*queued)]
+        self.operations.extendleft(reversed(to_add))
 
     # print to stdout
-    def print_operation(self, operation: Operation, transaction_id: int, data_item: str):
+    def print_operation(self, operation: Operation, transaction_id: int, data_item: int):
         out = "Current Operation: "
         out += str(operation) + " " + str(transaction_id)
-        if data_item != "":
-            out += " (" + data_item + ")"
+        if data_item != NO_ITEM:
+            out += " (" + self.item_name(data_item) + ")"
         print(out)
 
     def print_result(self):
@@ -129,76 +374,89 @@ class TwoPhaseLocking:
         for r in self.result:
             print(r, end="; ")
 
+    def print_statistics(self):
+        print("Statistics:")
+        for key, value in self.policy.statistics().items():
+            print(key + ": " + str(value))
+
     def print_state(self):
         print("Schedule: ", self.parsed_schedule)
-        print("Locks Table: ", self.locks_manager.get_lock_table())
+        print("Locks Table: ", {(transaction_id, self.item_name(data_item)): lock_type
+                                for (transaction_id, data_item), lock_type in self.locks_manager.get_lock_table().items()})
         print("Waiting Queue: ", self.waiting_queue)
+        if self.queued:
+            print("Blocked: ", self.blocked)
         print("Result: ", self.result)
 
     # transaction algo
-    def rollback_transaction(self, transaction_id: int, data_item: str):
-        p_schedule = [t for t in self.schedule if str(transaction_id) in t]
-        t_schedule = [t for t in self.result if str(transaction_id) in t]
-                    
-        index = -1
-        for i in range(len(t_schedule)):
-            if "XL" + str(transaction_id) + "(" + data_item + ")" in t_schedule[i] or "SL" + str(transaction_id) + "(" + data_item + ")" in t_schedule[i]:
-                index = i
-                break
-    
-        t_remove = t_schedule[index:]
-        index = -1
-        for i in range(len(p_schedule)):
-            if p_schedule[i] in t_remove:
-                index = i
-                break
-
-        p_add = p_schedule[index:]
-        p_add = parse_schedule(p_add)
-
-        # print(t_remove)
-        # print(p_add)
-        # print(self.result)
-        # print(self.parsed_schedule)
-
-        self.result = [t for t in self.result if t not in t_remove]
-        self.parsed_schedule = [t for t in self.parsed_schedule if t not in p_add]
-
-        # print(self.result)
-        # print(self.parsed_schedule)
-        
+    def rollback_transaction(self, transaction_id: int, data_item: int, wait_item: int = None) -> int:
+        # roll the transaction back to its first lock on data_item, release
+        # the locks taken from there on and queue the operations it has to
+        # redo, returns the number of executed operations undone. costs
+        # O(work of the transaction)
+        log = self.get_log(transaction_id)
+        cut = log.locks.get(data_item, len(self.history))
+
+        while log.positions and log.positions[-1] >= cut:
+            self.history.remove(log.positions.pop())
+
+        redo = []
+        while log.operations and log.operations[-1][0] >= cut:
+            redo.append(log.operations.pop()[1])
+        redo.reverse()
+        wasted = len(redo)
+
+        log.locks = {item: position for item, position in log.locks.items() if position < cut}
+        downgrades = [item for item, position in log.upgrades.items() if position >= cut and item in log.locks]
+        log.upgrades = {item: position for item, position in log.upgrades.items() if position < cut}
+
+        while log.undo and log.undo[-1][0] >= cut:
+            _, item, value = log.undo.pop()
+            self.storage.put(item, value)
+
+        # queued operations come after the undone ones, operations still in
+        # the schedule are queued when they are reached
+        queued = self.waiting.get(transaction_id, [])
+        redo += [t for _, t in queued]
+        self.remove_queue(transaction_id)
+
+        # the locks taken before the cut still protect the operations that
+        # stay, releasing them would let the transaction lock again after
+        # an unlock and break two phase locking
         self.add_rollback_result(transaction_id, data_item)
-        for data_item in [t[1] for t in self.locks_manager.locks_table if t[0] == transaction_id]:
-            self.add_unlock_result(transaction_id, data_item)
-        self.locks_manager.unlock(transaction_id)
-        for t in p_add:
-            self.add_queue(t[0], t[1] , t[2])
-
-    def wound_wait(self, transaction_id :int, data_item:str):
-        conflicting_transactions = self.locks_manager.get_transaction_ids(data_item) + [transaction_id]
-        oldest_transaction = min(conflicting_transactions)
-        younger_transactions = [t for t in conflicting_transactions if t > oldest_transaction]
-
-        print("Wound wait: ")
-        print("Current transaction: ", transaction_id)
-        print("Oldest transaction: ", oldest_transaction)
-        print("Younger transactions: ", younger_transactions)
-
-        if oldest_transaction < transaction_id:
-            print("Add to queue\n")
-            self.add_queue(Operation.WRITE, transaction_id, data_item)
-            return
-        
-        for t in younger_transactions:
-            print("Rollback: ", t, data_item)
-            self.rollback_transaction(t, data_item)
-        
-        print()
-        self.parsed_schedule.insert(0, (Operation.WRITE, transaction_id, data_item))
-            
+        for data_item in self.locks_manager.get_locked_items(transaction_id):
+            if data_item not in log.locks:
+                self.add_unlock_result(transaction_id, data_item)
+                self.locks_manager.unlock_data(transaction_id, data_item)
+        for data_item in downgrades:
+            self.locks_manager.upgrade_lock(transaction_id, data_item, LockType.S)
+        for t in redo:
+            self.add_queue(t[0], t[1] , t[2], wait_item)
+        return wasted
+
+    def wait_for_lock(self, operation: Operation, transaction_id: int, data_item: int):
+        self.add_queue(operation, transaction_id, data_item)
+
+    def abort_transaction(self, transaction_id: int, wait_item: int,
+        lock_item: int = None, wake: bool = True) -> int:
+        # roll back from lock_item (default its first lock), the transaction
+        # then waits on wait_item; wake restarts the waiters the released
+        # locks unblock. only they can make progress, whatever the wakeup
+        # mode: waking the others runs the same victims into the same
+        # conflicts again
+        held = self.locks_manager.get_locked_items(transaction_id)
+        lock_item = held[0] if lock_item is None else lock_item
+
+        wasted = self.rollback_transaction(transaction_id, lock_item, wait_item)
+
+        if wake:
+            released = [t for t in held if not self.locks_manager.has_lock(transaction_id, t)]
+            self.queue_to_schedule(released, grantable=True)
+        return wasted
+
     def process_read_write(self, 
         operation: Operation, transaction_id: int, 
-        data_item: str,lock_type: LockType):
+        data_item: int,lock_type: LockType):
 
         if self.is_waiting(transaction_id):
             self.add_queue(operation, transaction_id, data_item)
@@ -206,7 +464,9 @@ class TwoPhaseLocking:
 
         if self.locks_manager.is_locked(data_item):
             if self.locks_manager.has_lock(transaction_id, data_item):
-                if self.locks_manager.has_lock_type(transaction_id, data_item, lock_type):
+                # the transaction's own lock covers the request, X covers S
+                if (self.locks_manager.has_lock_type(transaction_id, data_item, lock_type)
+                        or self.locks_manager.has_lock_type(transaction_id, data_item, LockType.X)):
                     self.add_result(operation, transaction_id, data_item)
                     return
 
@@ -216,58 +476,147 @@ class TwoPhaseLocking:
                     self.add_result(operation, transaction_id, data_item)
                     return
 
-            if self.upgrade and lock_type == self.locks_manager.lock_type(data_item) == LockType.S:
+            # readers do not overtake transactions waiting for the item, a
+            # waiter only ever waits for the holders it conflicted with
+            if (self.upgrade and lock_type == self.locks_manager.lock_type(data_item) == LockType.S
+                    and data_item not in self.waiting_on):
                 self.locks_manager.lock_data(transaction_id, data_item, lock_type)
                 self.add_lock_result(transaction_id, data_item, lock_type)
                 self.add_result(operation, transaction_id, data_item)
                 return
             
-            if self.rollback:
-                self.wound_wait(transaction_id, data_item)
-                return
-            
-            self.add_queue(operation, transaction_id, data_item)
+            self.policy.on_conflict(self, operation, transaction_id, data_item)
             return
 
         self.locks_manager.lock_data(transaction_id, data_item, lock_type)
         self.add_lock_result(transaction_id, data_item, lock_type)
         self.add_result(operation, transaction_id, data_item)
 
-    def process_commit(self, transaction_id: int, operation: Operation, data_item: str):
+    # queued lock requests
+    def request_lock(self,
+        operation: Operation, transaction_id: int,
+        data_item: int, lock_type: LockType):
+
+        if transaction_id in self.blocked:
+            self.blocked[transaction_id].append((operation, transaction_id, data_item))
+            return
+
+        held = self.locks_manager.granted_mode(transaction_id, data_item)
+        if not self.locks_manager.request(transaction_id, data_item, lock_type):
+            self.blocked[transaction_id] = [(operation, transaction_id, data_item)]
+            if self.tracer.enabled:
+                # a hierarchical request may wait on an ancestor of data_item
+                node = self.locks_manager.waiting_for[transaction_id]
+                self.tracer.event(TraceEvent.WAIT, transaction_id, self.item_name(node),
+                                  len(self.locks_manager.queues[node].waiting))
+            return
+
+        granted = self.locks_manager.granted_mode(transaction_id, data_item)
+        if held is None:
+            self.add_lock_result(transaction_id, data_item, granted)
+        elif held != granted:
+            self.add_upgrade_result(transaction_id, data_item, granted)
+        self.add_result(operation, transaction_id, data_item)
+
+    def resume(self, granted: list):
+        # run the operation each granted transaction was blocked on and put
+        # the operations it parked meanwhile back at the head of the schedule
+        to_add = []
+        for transaction_id, data_item, lock_type, upgraded in granted:
+            operation, _, _ = self.blocked[transaction_id][0]
+            if self.tracer.enabled:
+                self.tracer.event(TraceEvent.WAKE, transaction_id, self.item_name(data_item))
+            if upgraded:
+                self.add_upgrade_result(transaction_id, data_item, lock_type)
+            else:
+                self.add_lock_result(transaction_id, data_item, lock_type)
+            self.add_result(operation, transaction_id, data_item)
+            to_add.extend(self.blocked.pop(transaction_id)[1:])
+
+        self.operations.extendleft(reversed(to_add))
+
+    def process_queued_commit(self, transaction_id: int, operation: Operation, data_item: int):
+        if transaction_id in self.blocked:
+            self.blocked[transaction_id].append((operation, transaction_id, data_item))
+            return
+
+        self.add_result(operation, transaction_id, data_item)
+        for data_item in self.locks_manager.get_locked_items(transaction_id):
+            self.add_unlock_result(transaction_id, data_item)
+        self.logs.pop(transaction_id, None)
+        self.resume(self.locks_manager.release(transaction_id))
+
+    def process_commit(self, transaction_id: int, operation: Operation, data_item: int):
         if self.is_waiting(transaction_id):
             self.add_queue(operation, transaction_id, data_item)
             return
 
         self.add_result(operation, transaction_id, data_item)
         if self.locks_manager.is_locked_by(transaction_id):
-            for data_item in [t[1] for t in self.locks_manager.locks_table if t[0] == transaction_id]:
+            released = self.locks_manager.get_locked_items(transaction_id)
+            for data_item in released:
                 self.add_unlock_result(transaction_id, data_item)
             self.locks_manager.unlock(transaction_id)
-            self.queue_to_schedule()
+            self.policy.on_commit(self, transaction_id)
+            self.queue_to_schedule(released if self.wakeup == "targeted" else None)
+        # a committed transaction is never rolled back
+        self.logs.pop(transaction_id, None)
 
     # main method
-    def run(self, upgrade=False, rollback=False, verbose=False):
+    def run(self, upgrade=False, rollback=False, verbose=False, wakeup="all",
+            detect=False, victim="youngest", deadlock=None, max_steps=None):
+        # wakeup "all" replays the whole waiting queue on every commit,
+        # "targeted" only the transactions waiting on the released items
+        if wakeup not in ("all", "targeted"):
+            raise Exception("Invalid wakeup mode")
+        # deadlock is a DeadlockPolicy or one of "none", "wound-wait",
+        # "wait-die", "no-wait", "timeout" and "detect"; rollback and detect
+        # are shorthands for wound-wait and detect. detect aborts one victim
+        # per waits-for cycle, chosen by fewest executed operations ("ops"),
+        # "youngest" or fewest locks held ("locks"). max_steps bounds the
+        # processed operations, so a livelocked run fails instead of spinning
+        if detect and rollback:
+            raise Exception("Choose either wound wait or deadlock detection")
+        if deadlock is None:
+            deadlock = "wound-wait" if rollback else "detect" if detect else None
+
         self.upgrade = upgrade
         self.rollback = rollback
         self.verbose = verbose
-        while len(self.parsed_schedule) > 0:
+        self.wakeup = wakeup
+        self.policy = make_policy(deadlock, victim=victim)
+
+        if self.queued and type(self.policy) is not DeadlockPolicy:
+            raise Exception("Deadlock handling is not supported with queued lock requests")
+
+        while self.has_operations() or self.policy.on_idle(self):
     
             operation : Operation
             transaction_id : int
-            data_item : str
-            operation, transaction_id, data_item = self.parsed_schedule.pop(0) 
-
+            data_item : int
+            operation, transaction_id, data_item = self.operations.popleft()
+            self.steps += 1
+            if max_steps is not None and self.steps > max_steps:
+                raise Exception("Step limit exceeded")
 
             match operation:
                 case Operation.READ | Operation.WRITE:
                     lock_type = LockType.X if operation == Operation.WRITE or not self.upgrade else LockType.S
-                    self.process_read_write(operation, transaction_id, data_item, lock_type)
+                    if self.queued:
+                        self.request_lock(operation, transaction_id, data_item, lock_type)
+                    else:
+                        self.process_read_write(operation, transaction_id, data_item, lock_type)
 
                 case Operation.COMMIT:
-                    self.process_commit(transaction_id, operation, data_item)
+                    if self.queued:
+                        self.process_queued_commit(transaction_id, operation, data_item)
+                    else:
+                        self.process_commit(transaction_id, operation, data_item)
 
                 case _:
                     raise Exception("Invalid operation")
+
+            self.policy.on_step(self)
                 
             if self.verbose:
                 self.print_operation(operation, transaction_id, data_item)
@@ -275,8 +624,26 @@ class TwoPhaseLocking:
                 print()
         
         # raise error if deadlock
-        if len(self.waiting_queue) > 0:
-            raise Exception("Deadlock detected")
+        if len(self.waiting) > 0 or len(self.blocked) > 0:
+            if self.find_deadlock():
+                raise Exception("Deadlock detected")
+            raise Exception("Transactions wait for locks that are never released")
+
+    def find_deadlock(self) -> list:
+        # cycle of the waits-for graph of the transactions still waiting,
+        # empty if they only wait for transactions that never commit
+        graph = WaitsForGraph()
+        if self.queued:
+            waits = {transaction_id: list(self.locks_manager.queues[data_item].granted)
+                     for transaction_id, data_item in self.locks_manager.waiting_for.items()}
+        else:
+            waits = {transaction_id: self.locks_manager.get_transaction_ids(data_item)
+                     for transaction_id, data_item in self.wait_item.items()}
+        for transaction_id, holders in waits.items():
+            cycle = graph.add_waits(transaction_id, holders)
+            if cycle:
+                return cycle
+        return []
 
 if __name__ == "__main__":
 
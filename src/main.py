@@ -1,7 +1,9 @@
 from transaction.Query import Read, Write
 from concurrency_control.OCC import OCCTransaction, OCC
-from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, parse_input, LockManager
+from concurrency_control.MVCC import MVCCTransaction, MVCC
+from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, parse_input, IndexedLockManager
 from util.Util import menu_tpl, input_tpl, option_tpl, parse_input
+from util.Tracer import ConsoleTracer
 
 ITEM_A = 'A'
 ITEM_B = 'B'
@@ -23,11 +25,39 @@ def occ():
 
     concurrencyManager = OCC(
         [T1, T2],
-        [1, 1, 2, 2, 2, 2, 1, 1]
+        [1, 1, 2, 2, 2, 2, 1, 1],
+        tracer=ConsoleTracer()
     )
 
     concurrencyManager.run()
 
+def mvcc():
+    T1 = MVCCTransaction(1, [
+        Read(ITEM_B),
+        Write(ITEM_B),
+        Read(ITEM_A),
+        Write(ITEM_A)
+    ])
+
+    T2 = MVCCTransaction(2, [
+        Read(ITEM_B),
+        Write(ITEM_B),
+        Read(ITEM_A),
+        Write(ITEM_A)
+    ])
+
+    concurrencyManager = MVCC(
+        [T1, T2],
+        [1, 1, 2, 2, 2, 2, 1, 1],
+        tracer=ConsoleTracer()
+    )
+
+    concurrencyManager.run()
+
+    print("Statistics:")
+    for key, value in concurrencyManager.statistics().items():
+        print(key + ": " + str(value))
+
 def two_phase():
     print("Two-phase simple lock with some feature")
     print()
@@ -41,15 +71,17 @@ def two_phase():
 
         option = option_tpl()
         upgrade = option[0]
-        rollback = option[1]
+        deadlock = option[1]
         verbose = option[2]
         print()
 
-        tpl = TwoPhaseLocking(p_schedule, LockManager())
-        tpl.run(upgrade=upgrade, rollback=rollback, verbose=verbose)
+        tpl = TwoPhaseLocking(p_schedule, IndexedLockManager(), tracer=ConsoleTracer())
+        tpl.run(upgrade=upgrade, deadlock=deadlock, verbose=verbose)
         print()
 
         tpl.print_result()
+        print()
+        tpl.print_statistics()
     except Exception as e:
         print("Error: ", e)
 
@@ -60,6 +92,7 @@ if __name__ == "__main__":
     print("Choose an algorithm to run:")
     print("1. Optimistic Concurrency Control")
     print("2. Two Phase Locking")
+    print("3. Multiversion Concurrency Control")
     print()
     choice = input("Enter your choice: ")
     print()
@@ -67,4 +100,6 @@ if __name__ == "__main__":
     if choice == "1":
         occ()
     elif choice == "2":
-        two_phase()
\ No newline at end of file
+        two_phase()
+    elif choice == "3":
+        mvcc()
\ No newline at end of file
@@ -0,0 +1,281 @@
+# ARIES style recovery manager
+# updates are logged before they reach the disk (write-ahead), commits force
+# the log, and after a crash restart repeats history: analysis rebuilds the
+# transaction and dirty item tables from the last checkpoint, redo replays
+# every logged update the disk may have missed and undo rolls back the
+# transactions that never committed, logging compensation records (CLR) so
+# a crash during restart never undoes anything twice
+
+# the disk is a dict data item -> (value, LSN of the update that wrote it),
+# data items are cached in memory until flush_item writes them back
+
+import heapq
+import mmap
+import os
+import struct
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+import sys
+sys.path.append(CURRENT_DIR)
+
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PARENT_DIR)
+
+from recovery.WriteAheadLog import WriteAheadLog, LogRecord, RecordType, NO_LSN, decode, scan
+
+MASTER = struct.Struct("<q")
+
+class RecoveryManager:
+    '''
+    Transaction log and restart for a cached key value store.
+
+    Attributes:
+        wal (WriteAheadLog): The log.
+        disk (dict): data item -> (value, LSN), the durable state.
+        cache (dict): data item -> value of the items read or written since
+            they were last flushed, None for a removed item.
+        item_lsn (dict): data item -> LSN of the last update of a cached item.
+        dirty (dict): data item -> LSN of its first update not on disk yet.
+        transactions (dict): transaction_id -> LSN of its last record.
+        updates (dict): transaction_id -> its UPDATE records, for rollback.
+
+    Methods:
+        begin(transaction_id) -> None:
+            Starts a transaction.
+        read(transaction_id, data_item) -> bytes:
+            Returns the current value of the data item.
+        write(transaction_id, data_item, value) -> None:
+            Logs and applies an update, value None removes the item.
+        commit(transaction_id) -> None:
+            Commits, returning once the commit record is durable.
+        abort(transaction_id) -> None:
+            Rolls the transaction back.
+        flush_item(data_item) -> None:
+            Writes a cached item to disk, forcing the log first.
+        checkpoint() -> int:
+            Logs the transaction and dirty item tables and returns the LSN.
+        crash() -> None:
+            Loses everything not on disk or in the durable log.
+        restart() -> dict:
+            Runs analysis, redo and undo, returns the work done.
+    '''
+    def __init__(self, wal: WriteAheadLog, disk: dict = None):
+        self.wal = wal
+        self.disk = {} if disk is None else disk
+        self.cache = {}
+        self.item_lsn = {}
+        self.dirty = {}
+        self.transactions = {}
+        self.updates = {}
+
+    # master record, the LSN of the last complete checkpoint
+    @property
+    def master_path(self) -> str:
+        return self.wal.path + ".master"
+
+    def read_master(self) -> int:
+        try:
+            with open(self.master_path, "rb") as f:
+                return MASTER.unpack(f.read(MASTER.size))[0]
+        except (FileNotFoundError, struct.error):
+            return NO_LSN
+
+    def write_master(self, lsn: int):
+        temporary = self.master_path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(MASTER.pack(lsn))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.master_path)
+
+    # normal operation
+    def log(self, record: LogRecord) -> int:
+        lsn = self.wal.append(record)
+        self.transactions[record.transaction_id] = lsn
+        return lsn
+
+    def begin(self, transaction_id: int):
+        if transaction_id in self.transactions:
+            raise Exception(f"T{transaction_id} already started")
+        self.transactions[transaction_id] = NO_LSN
+        self.updates[transaction_id] = []
+        self.log(LogRecord(RecordType.BEGIN, transaction_id))
+
+    def read(self, transaction_id: int, data_item: str) -> bytes:
+        if data_item in self.cache:
+            return self.cache[data_item]
+        value = self.disk.get(data_item, (None, NO_LSN))[0]
+        self.cache[data_item] = value
+        return value
+
+    def apply(self, data_item: str, value: bytes, lsn: int):
+        self.cache[data_item] = value
+        self.item_lsn[data_item] = lsn
+        self.dirty.setdefault(data_item, lsn)
+
+    def write(self, transaction_id: int, data_item: str, value: bytes):
+        if transaction_id not in self.transactions:
+            raise Exception(f"T{transaction_id} not started")
+        record = LogRecord(RecordType.UPDATE, transaction_id, self.transactions[transaction_id],
+                           item=data_item, before=self.read(transaction_id, data_item), after=value)
+        self.apply(data_item, value, self.log(record))
+        self.updates[transaction_id].append(record)
+
+    def commit(self, transaction_id: int):
+        lsn = self.log(LogRecord(RecordType.COMMIT, transaction_id, self.transactions[transaction_id]))
+        self.wal.flush(lsn)
+        self.end(transaction_id)
+
+    def abort(self, transaction_id: int):
+        self.log(LogRecord(RecordType.ABORT, transaction_id, self.transactions[transaction_id]))
+        for record in reversed(self.updates[transaction_id]):
+            self.compensate(record)
+        self.end(transaction_id)
+
+    def compensate(self, record: LogRecord):
+        clr = LogRecord(RecordType.CLR, record.transaction_id, self.transactions[record.transaction_id],
+                        item=record.item, after=record.before, undo_next_lsn=record.prev_lsn)
+        self.apply(record.item, record.before, self.log(clr))
+
+    def end(self, transaction_id: int):
+        self.wal.append(LogRecord(RecordType.END, transaction_id, self.transactions.pop(transaction_id)))
+        self.updates.pop(transaction_id, None)
+
+    def flush_item(self, data_item: str):
+        if data_item not in self.dirty:
+            return
+        lsn = self.item_lsn[data_item]
+        self.wal.flush(lsn)
+        self.disk[data_item] = (self.cache[data_item], lsn)
+        del self.dirty[data_item]
+
+    def flush_all(self):
+        for data_item in list(self.dirty):
+            self.flush_item(data_item)
+
+    def checkpoint(self) -> int:
+        record = LogRecord(RecordType.CHECKPOINT, transactions=dict(self.transactions), dirty=dict(self.dirty))
+        lsn = self.wal.append(record)
+        self.wal.flush()
+        self.write_master(lsn)
+        return lsn
+
+    def crash(self):
+        self.wal.tail = bytearray()
+        self.wal.tail_records = 0
+        self.wal.file.close()
+        self.cache = {}
+        self.item_lsn = {}
+        self.dirty = {}
+        self.transactions = {}
+        self.updates = {}
+
+    # restart
+    def restart(self) -> dict:
+        started = time.perf_counter()
+        self.wal.flush()
+        # the log is mapped, not read, records are decoded from the mapping;
+        # the records undo appends lie past its end
+        with open(self.wal.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            statistics = {"log_bytes": len(data)}
+            committed = self.analysis(data, statistics)
+            self.redo(data, statistics)
+            self.undo(data, committed, statistics)
+        finally:
+            if size:
+                data.close()
+        self.wal.flush()
+
+        statistics["seconds"] = time.perf_counter() - started
+        return statistics
+
+    def analysis(self, data, statistics: dict) -> set:
+        # rebuilds the transaction and dirty item tables as of the crash,
+        # returns the transactions that committed but have no END record
+        checkpoint = self.read_master()
+        self.transactions = {}
+        self.dirty = {}
+        committed = set()
+        scanned = 0
+
+        start = 0 if checkpoint == NO_LSN else checkpoint
+        for record, _ in scan(data, start):
+            scanned += 1
+            if record.type == RecordType.CHECKPOINT:
+                if record.lsn == checkpoint:
+                    self.transactions.update(record.transactions)
+                    for data_item, rec_lsn in record.dirty.items():
+                        self.dirty.setdefault(data_item, rec_lsn)
+                continue
+
+            self.transactions[record.transaction_id] = record.lsn
+            match record.type:
+                case RecordType.COMMIT:
+                    committed.add(record.transaction_id)
+                case RecordType.END:
+                    del self.transactions[record.transaction_id]
+                    committed.discard(record.transaction_id)
+                case RecordType.UPDATE | RecordType.CLR:
+                    self.dirty.setdefault(record.item, record.lsn)
+
+        statistics["analysis_records"] = scanned
+        return committed
+
+    def redo(self, data, statistics: dict):
+        redone = 0
+        if self.dirty:
+            for record, _ in scan(data, min(self.dirty.values())):
+                if record.type not in (RecordType.UPDATE, RecordType.CLR):
+                    continue
+                rec_lsn = self.dirty.get(record.item)
+                if rec_lsn is None or record.lsn < rec_lsn:
+                    continue
+                if self.disk.get(record.item, (None, NO_LSN))[1] >= record.lsn:
+                    continue
+                self.cache[record.item] = record.after
+                self.item_lsn[record.item] = record.lsn
+                redone += 1
+
+        # items the disk already had are clean again
+        self.dirty = {data_item: rec_lsn for data_item, rec_lsn in self.dirty.items()
+                      if data_item in self.item_lsn}
+        statistics["redone"] = redone
+
+    def undo(self, data, committed: set, statistics: dict):
+        for transaction_id in committed:
+            self.end(transaction_id)
+
+        # ToUndo: (-LSN, transaction_id) of the next record of every loser
+        to_undo = [(-lsn, t) for t, lsn in self.transactions.items()]
+        heapq.heapify(to_undo)
+        statistics["losers"] = len(to_undo)
+        undone = 0
+
+        for _, transaction_id in to_undo:
+            self.log(LogRecord(RecordType.ABORT, transaction_id, self.transactions[transaction_id]))
+
+        # undo the losers together, latest record first
+        while to_undo:
+            lsn, transaction_id = heapq.heappop(to_undo)
+            record = decode(data, -lsn)
+            match record.type:
+                case RecordType.UPDATE:
+                    self.compensate(record)
+                    undone += 1
+                    next_lsn = record.prev_lsn
+                case RecordType.CLR:
+                    next_lsn = record.undo_next_lsn
+                case _:
+                    next_lsn = record.prev_lsn
+
+            if next_lsn == NO_LSN:
+                self.end(transaction_id)
+            else:
+                heapq.heappush(to_undo, (-next_lsn, transaction_id))
+
+        statistics["undone"] = undone
@@ -0,0 +1,294 @@
+# write-ahead log
+# append only binary log file, records are addressed by their byte offset
+# (the log sequence number, LSN)
+
+# record format, little endian
+# <length: uint32> <lsn: int64> <prev_lsn: int64> <transaction_id: int64>
+# <type: uint8> <payload> <crc32: uint32>
+# length counts the whole record, the crc covers everything before it, so a
+# torn write at the tail of the file is detected and ignored
+
+# payload
+# UPDATE      <item> <before image> <after image>
+# CLR         <item> <after image> <undo_next_lsn: int64>
+# CHECKPOINT  <count: uint32> (<transaction_id: int64> <last_lsn: int64>)*
+#             <count: uint32> (<item> <rec_lsn: int64>)*
+# other types have no payload
+# <item> is a uint16 length and utf-8 bytes, an image is an int32 length
+# (-1 for no value) and the bytes
+
+import enum
+import os
+import struct
+import threading
+import time
+import zlib
+
+NO_LSN = -1
+
+HEADER = struct.Struct("<IqqqB")
+CRC = struct.Struct("<I")
+LENGTH = struct.Struct("<I")
+ITEM = struct.Struct("<H")
+IMAGE = struct.Struct("<i")
+INT64 = struct.Struct("<q")
+COUNT = struct.Struct("<I")
+
+class RecordType(enum.IntEnum):
+    BEGIN = 1
+    UPDATE = 2
+    COMMIT = 3
+    ABORT = 4
+    END = 5
+    CLR = 6
+    CHECKPOINT = 7
+
+class LogRecord:
+    '''
+    A log record.
+
+    Attributes:
+        type (RecordType): The record type.
+        transaction_id (int): The transaction, 0 for checkpoints.
+        prev_lsn (int): LSN of the previous record of the transaction.
+        lsn (int): LSN of the record, set when it is appended.
+        item (str): Data item of UPDATE and CLR records.
+        before (bytes): Value before an UPDATE, None if the item was absent.
+        after (bytes): Value after an UPDATE or CLR, None to remove the item.
+        undo_next_lsn (int): Next record to undo after a CLR.
+        transactions (dict): Active transactions of a CHECKPOINT, transaction_id -> last LSN.
+        dirty (dict): Dirty items of a CHECKPOINT, item -> recovery LSN.
+    '''
+    __slots__ = ("type", "transaction_id", "prev_lsn", "lsn", "item", "before",
+                 "after", "undo_next_lsn", "transactions", "dirty")
+
+    def __init__(self, type: RecordType, transaction_id: int = 0, prev_lsn: int = NO_LSN,
+                 item: str = None, before: bytes = None, after: bytes = None,
+                 undo_next_lsn: int = NO_LSN, transactions: dict = None, dirty: dict = None):
+        self.type = type
+        self.transaction_id = transaction_id
+        self.prev_lsn = prev_lsn
+        self.lsn = NO_LSN
+        self.item = item
+        self.before = before
+        self.after = after
+        self.undo_next_lsn = undo_next_lsn
+        self.transactions = transactions
+        self.dirty = dirty
+
+    def __repr__(self):
+        return f"LogRecord({self.type.name}, T{self.transaction_id}, lsn={self.lsn}, item={self.item})"
+
+def pack_item(out: bytearray, item: str):
+    data = item.encode()
+    out += ITEM.pack(len(data))
+    out += data
+
+def pack_image(out: bytearray, image: bytes):
+    if image is None:
+        out += IMAGE.pack(-1)
+    else:
+        out += IMAGE.pack(len(image))
+        out += image
+
+def unpack_item(data, offset: int) -> tuple:
+    (length,) = ITEM.unpack_from(data, offset)
+    offset += ITEM.size
+    return bytes(data[offset:offset + length]).decode(), offset + length
+
+def unpack_image(data, offset: int) -> tuple:
+    (length,) = IMAGE.unpack_from(data, offset)
+    offset += IMAGE.size
+    if length < 0:
+        return None, offset
+    return bytes(data[offset:offset + length]), offset + length
+
+def encode(record: LogRecord, lsn: int) -> bytes:
+    payload = bytearray()
+    match record.type:
+        case RecordType.UPDATE:
+            pack_item(payload, record.item)
+            pack_image(payload, record.before)
+            pack_image(payload, record.after)
+        case RecordType.CLR:
+            pack_item(payload, record.item)
+            pack_image(payload, record.after)
+            payload += INT64.pack(record.undo_next_lsn)
+        case RecordType.CHECKPOINT:
+            payload += COUNT.pack(len(record.transactions))
+            for transaction_id, last_lsn in record.transactions.items():
+                payload += INT64.pack(transaction_id)
+                payload += INT64.pack(last_lsn)
+            payload += COUNT.pack(len(record.dirty))
+            for item, rec_lsn in record.dirty.items():
+                pack_item(payload, item)
+                payload += INT64.pack(rec_lsn)
+
+    length = HEADER.size + len(payload) + CRC.size
+    out = bytearray(HEADER.pack(length, lsn, record.prev_lsn, record.transaction_id, record.type))
+    out += payload
+    out += CRC.pack(zlib.crc32(out))
+    return bytes(out)
+
+def decode(data, offset: int) -> LogRecord:
+    # returns None for a truncated or corrupt record
+    if offset + HEADER.size > len(data):
+        return None
+    length, lsn, prev_lsn, transaction_id, type = HEADER.unpack_from(data, offset)
+    end = offset + length
+    if length < HEADER.size + CRC.size or end > len(data):
+        return None
+    (crc,) = CRC.unpack_from(data, end - CRC.size)
+    if crc != zlib.crc32(memoryview(data)[offset:end - CRC.size]):
+        return None
+
+    record = LogRecord(RecordType(type), transaction_id, prev_lsn)
+    record.lsn = lsn
+    position = offset + HEADER.size
+    match record.type:
+        case RecordType.UPDATE:
+            record.item, position = unpack_item(data, position)
+            record.before, position = unpack_image(data, position)
+            record.after, position = unpack_image(data, position)
+        case RecordType.CLR:
+            record.item, position = unpack_item(data, position)
+            record.after, position = unpack_image(data, position)
+            (record.undo_next_lsn,) = INT64.unpack_from(data, position)
+        case RecordType.CHECKPOINT:
+            record.transactions = {}
+            (count,) = COUNT.unpack_from(data, position)
+            position += COUNT.size
+            for _ in range(count):
+                (transaction_id,) = INT64.unpack_from(data, position)
+                (last_lsn,) = INT64.unpack_from(data, position + INT64.size)
+                record.transactions[transaction_id] = last_lsn
+                position += 2 * INT64.size
+            record.dirty = {}
+            (count,) = COUNT.unpack_from(data, position)
+            position += COUNT.size
+            for _ in range(count):
+                item, position = unpack_item(data, position)
+                (record.dirty[item],) = INT64.unpack_from(data, position)
+                position += INT64.size
+    return record
+
+def scan(data, offset: int = 0):
+    # yields (record, offset after it) up to the first torn or corrupt record
+    while True:
+        record = decode(data, offset)
+        if record is None:
+            return
+        offset += LENGTH.unpack_from(data, offset)[0]
+        yield record, offset
+
+class WriteAheadLog:
+    '''
+    Append only log file with group commit.
+
+    Records are appended to an in memory tail and written out by flush. A
+    committing transaction calls flush with the LSN of its commit record;
+    only one thread writes and fsyncs at a time and every thread that
+    queued behind it finds its record already durable, so concurrent
+    commits share one fsync. group_delay makes the flushing thread wait a
+    little for more commits before writing.
+
+    Attributes:
+        path (str): The log file.
+        sync (bool): fsync on flush, turn off to measure without the disk.
+        group_delay (float): Seconds the flushing thread waits for more commits.
+        next_lsn (int): LSN of the next appended record.
+        flushed_lsn (int): Records below this LSN are durable.
+        fsyncs (int): Number of flushes that wrote to the file.
+        flushed_records (int): Number of records written by those flushes.
+
+    Methods:
+        append(record) -> int:
+            Appends the record and returns its LSN.
+        flush(lsn) -> None:
+            Makes every record up to lsn durable, by default the whole tail.
+        records(start_lsn) -> Iterator[LogRecord]:
+            Reads the durable records from start_lsn on.
+        read(lsn) -> LogRecord:
+            Reads the record at lsn.
+        truncate_tail() -> None:
+            Cuts a torn record off the end of the file.
+    '''
+    def __init__(self, path: str, sync: bool = True, group_delay: float = 0.0):
+        self.path = path
+        self.sync = sync
+        self.group_delay = group_delay
+
+        self.file = open(path, "ab+")
+        self.truncate_tail()
+        self.file.seek(0, os.SEEK_END)
+        self.next_lsn = self.file.tell()
+        self.flushed_lsn = self.next_lsn
+
+        self.tail = bytearray()
+        self.tail_records = 0
+        self.latch = threading.Lock()
+        self.flush_latch = threading.Lock()
+        self.fsyncs = 0
+        self.flushed_records = 0
+
+    def append(self, record: LogRecord) -> int:
+        with self.latch:
+            lsn = self.next_lsn
+            data = encode(record, lsn)
+            self.tail += data
+            self.tail_records += 1
+            self.next_lsn += len(data)
+        record.lsn = lsn
+        return lsn
+
+    def flush(self, lsn: int = None):
+        if lsn is not None and lsn < self.flushed_lsn:
+            return
+        with self.flush_latch:
+            if lsn is not None and lsn < self.flushed_lsn:
+                return
+            if self.group_delay:
+                time.sleep(self.group_delay)
+            with self.latch:
+                data = self.tail
+                records = self.tail_records
+                end = self.next_lsn
+                self.tail = bytearray()
+                self.tail_records = 0
+            if not data:
+                return
+            self.file.write(data)
+            self.file.flush()
+            if self.sync:
+                os.fsync(self.file.fileno())
+            self.fsyncs += 1
+            self.flushed_records += records
+            self.flushed_lsn = end
+
+    def records(self, start_lsn: int = 0):
+        with open(self.path, "rb") as f:
+            data = memoryview(f.read())
+        for record, _ in scan(data, start_lsn):
+            yield record
+
+    def read(self, lsn: int) -> LogRecord:
+        if lsn >= self.flushed_lsn:
+            self.flush()
+        with open(self.path, "rb") as f:
+            f.seek(lsn)
+            (length,) = LENGTH.unpack(f.read(LENGTH.size))
+            f.seek(lsn)
+            return decode(f.read(length), 0)
+
+    def truncate_tail(self):
+        self.file.seek(0)
+        data = memoryview(self.file.read())
+        end = 0
+        for _, end in scan(data, 0):
+            pass
+        if end < len(data):
+            self.file.truncate(end)
+
+    def close(self):
+        self.flush()
+        self.file.close()
@@ -0,0 +1,43 @@
+# non interactive batch replay
+# runs TwoPhaseLocking on every schedule file of a directory or glob across
+# a process pool, prints one JSON object per file and the merged totals
+
+# usage
+# python3 src/replay.py <directory or glob> [--workers N] [--chunksize N]
+#     [--lock-manager indexed|queued] [--upgrade] [--deadlock POLICY]
+#     [--wakeup all|targeted] [--max-steps N] [--history] [--summary-only]
+
+import argparse
+import json
+
+from concurrency_control.BatchReplay import replay_schedules
+from util.Util import DEADLOCK_POLICIES
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay schedule files with two phase locking")
+    parser.add_argument("schedules", help="directory or glob of text schedules and binary traces")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per cpu")
+    parser.add_argument("--chunksize", type=int, default=None, help="files handed to a worker at a time")
+    parser.add_argument("--lock-manager", choices=["indexed", "queued"], default="indexed")
+    parser.add_argument("--upgrade", action="store_true", help="automatic lock upgrade")
+    parser.add_argument("--deadlock", choices=DEADLOCK_POLICIES, default="none")
+    parser.add_argument("--wakeup", choices=["all", "targeted"], default="all")
+    parser.add_argument("--max-steps", type=int, default=None, help="fail a schedule after this many steps")
+    parser.add_argument("--history", action="store_true", help="include the final schedule of every file")
+    parser.add_argument("--summary-only", action="store_true", help="only print the merged totals")
+    args = parser.parse_args()
+
+    options = {
+        "lock_manager": args.lock_manager,
+        "upgrade": args.upgrade,
+        "deadlock": args.deadlock,
+        "wakeup": args.wakeup,
+        "max_steps": args.max_steps,
+        "history": args.history,
+    }
+    results, totals = replay_schedules(args.schedules, options, args.workers, args.chunksize)
+
+    if not args.summary_only:
+        for result in results:
+            print(json.dumps(result))
+    print(json.dumps(totals))
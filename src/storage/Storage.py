@@ -0,0 +1,178 @@
+# key value storage behind the Read and Write queries
+# data items map to byte string values, a missing data item reads as None
+
+# MappedStore file format, records appended back to back
+# <key length: uint16> <value length: int32> <key: utf-8> <value>
+# a value length of -1 removes the data item, the unused end of the file is
+# zero, which ends the scan when the file is reopened
+
+import mmap
+import os
+import struct
+
+RECORD = struct.Struct("<Hi")
+REMOVED = -1
+
+class Storage:
+    '''
+    Storage Abstract Class.
+
+    Methods:
+        get(data_item) -> bytes:
+            Returns the value of the data item, None if it has none.
+        put(data_item, value) -> None:
+            Sets the value of the data item, None removes it.
+        close() -> None:
+            Releases the resources of the store.
+    '''
+    def get(self, data_item: str) -> bytes:
+        raise NotImplementedError()
+
+    def put(self, data_item: str, value: bytes):
+        raise NotImplementedError()
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    def __contains__(self, data_item: str) -> bool:
+        return self.get(data_item) is not None
+
+    def close(self):
+        pass
+
+class MemoryStore(Storage):
+    '''
+    In memory hash store.
+
+    Attributes:
+        values (dict): data item -> value.
+    '''
+    def __init__(self):
+        self.values = {}
+
+    def get(self, data_item: str) -> bytes:
+        return self.values.get(data_item)
+
+    def put(self, data_item: str, value: bytes):
+        if value is None:
+            self.values.pop(data_item, None)
+        else:
+            self.values[data_item] = value
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+class MappedStore(Storage):
+    '''
+    Memory mapped, file backed, append only store.
+
+    Every put appends a record to the mapped file and points the in memory
+    index at its value, reads copy the value straight out of the mapping.
+    When the file is full it is compacted if at least half of it is
+    overwritten records, otherwise its size is doubled.
+
+    Attributes:
+        path (str): The data file.
+        index (dict): data item -> (offset, length) of its value in the file.
+        used (int): Bytes of the file holding records.
+        garbage (int): Bytes of overwritten and removed records.
+
+    Methods:
+        compact() -> None:
+            Rewrites the file with only the live records.
+    '''
+    def __init__(self, path: str, capacity: int = 1 << 20):
+        self.path = path
+        self.index = {}
+        self.used = 0
+        self.garbage = 0
+
+        self.file = open(path, "a+b")
+        if os.path.getsize(path) < capacity:
+            self.file.truncate(capacity)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.load()
+
+    def load(self):
+        # rebuild the index from the records in the file
+        offset = 0
+        while offset + RECORD.size <= len(self.map):
+            key_length, value_length = RECORD.unpack_from(self.map, offset)
+            if key_length == 0:
+                break
+            start = offset + RECORD.size
+            data_item = self.map[start:start + key_length].decode()
+            self.discard(data_item)
+            start += key_length
+            if value_length == REMOVED:
+                self.garbage += RECORD.size + key_length
+                value_length = 0
+            else:
+                self.index[data_item] = (start, value_length)
+            offset = start + value_length
+        self.used = offset
+
+    def discard(self, data_item: str):
+        old = self.index.pop(data_item, None)
+        if old is not None:
+            offset, length = old
+            self.garbage += RECORD.size + len(data_item.encode()) + length
+
+    def get(self, data_item: str) -> bytes:
+        location = self.index.get(data_item)
+        if location is None:
+            return None
+        offset, length = location
+        return self.map[offset:offset + length]
+
+    def put(self, data_item: str, value: bytes):
+        if value is None and data_item not in self.index:
+            return
+        key = data_item.encode()
+        if not key:
+            raise Exception("Empty data item")
+        size = RECORD.size + len(key) + (0 if value is None else len(value))
+        if self.used + size > len(self.map):
+            self.reserve(size)
+
+        self.discard(data_item)
+        offset = self.used
+        RECORD.pack_into(self.map, offset, len(key), REMOVED if value is None else len(value))
+        offset += RECORD.size
+        self.map[offset:offset + len(key)] = key
+        offset += len(key)
+        if value is None:
+            self.garbage += size
+        else:
+            self.map[offset:offset + len(value)] = value
+            self.index[data_item] = (offset, len(value))
+        self.used += size
+
+    def reserve(self, size: int):
+        if self.garbage * 2 >= self.used:
+            self.compact()
+        capacity = len(self.map)
+        while self.used + size > capacity:
+            capacity *= 2
+        if capacity != len(self.map):
+            self.map.resize(capacity)
+
+    def compact(self):
+        live = [(data_item, self.get(data_item)) for data_item in self.index]
+        self.map[:self.used] = bytes(self.used)
+        self.index = {}
+        self.used = 0
+        self.garbage = 0
+        for data_item, value in live:
+            self.put(data_item, value)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
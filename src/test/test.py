@@ -1,4 +1,10 @@
 import unittest
+import asyncio
+import contextlib
+import io
+import threading
+import tempfile
+import json
 
 import os, sys
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -7,7 +13,26 @@ sys.path.append(CURRENT_DIR)
 PARENT_DIR = os.path.dirname(CURRENT_DIR)
 sys.path.append(PARENT_DIR)
 
-from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, parse_input, Operation, LockType, LockManager
+from concurrency_control.Deadlock import WaitsForGraph, WaitDie, Timeout
+from concurrency_control.History import EventType
+from concurrency_control.OCC import OCCTransaction, OCC, ValidationIndex
+from concurrency_control.MVCC import MVCCTransaction, MVCC
+from concurrency_control.TimestampOrdering import TimestampOrdering
+from concurrency_control.ThreadedLocking import ThreadedTwoPhaseLocking
+from concurrency_control.AsyncExecutor import AsyncTwoPhaseLocking, AsyncOCC
+from transaction.LockManager import ConcurrentLockManager
+from recovery.WriteAheadLog import WriteAheadLog, LogRecord, RecordType
+from recovery.RecoveryManager import RecoveryManager
+from storage.Storage import MemoryStore, MappedStore
+from util.Util import read_operations, NO_ITEM
+from util.Trace import Trace, write_trace
+from util.Workload import Workload
+from util.Tracer import ConsoleTracer, Collector, JsonTracer, TraceEvent
+from concurrency_control.BatchReplay import replay_schedules, find_schedules
+from concurrency_control.Serializability import PrecedenceGraph, HistoryRecorder, check_serializable
+from transaction.Query import Read, Write
+from transaction.Transaction import Transaction
+from concurrency_control.TwoPhaseLocking import TwoPhaseLocking, parse_input, parse_schedule, tokenize_schedule, convert_schedule, iter_trace, Operation, LockType, LockManager, IndexedLockManager, LockRequestManager, HierarchicalLockManager
 
 class TestTwoPhaseLocking(unittest.TestCase):
 
@@ -20,6 +45,95 @@ class TestTwoPhaseLocking(unittest.TestCase):
 
         self.assertEqual(t.parsed_schedule, expected)
 
+    def test_parse_multi_digit_ids(self):
+        expected = [(Operation.READ, 12, "Account_1"), (Operation.WRITE, 305, "X"), (Operation.COMMIT, 12, "")]
+
+        self.assertEqual(parse_schedule(["R12(Account_1)", " w 305 ( X ) ", "C12"]), expected)
+        self.assertEqual(list(tokenize_schedule("R12(Account_1);\n w 305 ( X ) ;C12;;")), expected)
+        self.assertEqual(list(tokenize_schedule("R12(Account_1); W305(X); C12")), expected)
+
+    def test_parse_invalid(self):
+        for schedule in ["X1(A)", "R(A)", "R1", "C1(A)", "R1(A) W1(A)", "R1(A"]:
+            with self.assertRaises(Exception):
+                list(tokenize_schedule(schedule))
+
+    def test_read_operations(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "schedule")
+            with open(path, "w") as f:
+                f.write("R1(X) ;W2(Y);\n W2(X); C1; C2")
+            # chunks end in the middle of operations
+            self.assertEqual(list(read_operations(path, chunk_size=4)),
+                ["R1(X)", "W2(Y)", "W2(X)", "C1", "C2"])
+
+    def test_from_file(self):
+        schedule = "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;"
+        t = TwoPhaseLocking(parse_input(schedule), LockManager())
+        t.run(upgrade=True, rollback=True)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "schedule")
+            with open(path, "w") as f:
+                f.write(schedule)
+            streamed = TwoPhaseLocking.from_file(path, LockManager(), chunk_size=8)
+            # nothing is parsed before the run
+            self.assertEqual(streamed.parsed_schedule, [])
+            streamed.run(upgrade=True, rollback=True)
+
+        self.assertEqual(streamed.result, t.result)
+
+    def test_from_trace(self):
+        schedule = "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2; R12(Account_1); W305(Y); C305; C12;"
+        t = TwoPhaseLocking(parse_input(schedule), LockManager())
+        t.run(upgrade=True, rollback=True)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "schedule")
+            trace_path = os.path.join(directory, "schedule.trace")
+            with open(path, "w") as f:
+                f.write(schedule)
+            self.assertEqual(convert_schedule(path, trace_path, chunk_size=8), 11)
+
+            with Trace(trace_path) as trace:
+                self.assertEqual(len(trace), 11)
+                self.assertEqual(trace.names, ["X", "Y", "Account_1"])
+                replayed = TwoPhaseLocking.from_trace(trace, LockManager())
+                self.assertEqual(replayed.parsed_schedule, [])
+                replayed.run(upgrade=True, rollback=True)
+
+            with open(path, "wb") as f:
+                f.write(b"R1(X); C1;" * 4)
+            with self.assertRaises(Exception):
+                Trace(path)
+
+        self.assertEqual(replayed.result, t.result)
+
+    def test_trace_blocks(self):
+        schedule = parse_schedule(parse_input("R1(X); W2(Y); C2; R1(Y); W3(X); W1(Z); C1; C3; R4(Z); C4; R5(X)"))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "schedule.trace")
+            for batch in [1, 4, 11, 64]:
+                self.assertEqual(write_trace(path, schedule, batch), 11)
+                with Trace(path) as trace:
+                    self.assertEqual(trace.block, batch)
+                    self.assertEqual([len(codes) for codes, _, _ in trace.columns()],
+                                     [min(batch, 11 - first) for first in range(0, 11, batch)])
+                    self.assertEqual([(Operation(code), transaction_id, trace.names[item] if item != NO_ITEM else "")
+                                      for code, transaction_id, item in trace.records()], schedule)
+                    self.assertEqual(list(iter_trace(trace)), schedule)
+
+            write_trace(path, [])
+            with Trace(path) as trace:
+                self.assertEqual(list(trace.records()), [])
+
+    def test_default_lock_manager(self):
+        first = TwoPhaseLocking(parse_input("W1(X); C1"))
+        first.locks_manager.lock_data(1, "X", LockType.X)
+        second = TwoPhaseLocking(parse_input("W2(X); C2"))
+
+        self.assertIsNot(first.locks_manager, second.locks_manager)
+        self.assertFalse(second.locks_manager.is_locked("X"))
+
     def test_lock(self):
         schedule ="R1(A); W1(A); C1"
         list_schedule = parse_input(schedule)
@@ -45,7 +159,7 @@ class TestTwoPhaseLocking(unittest.TestCase):
         schedule ="R1(A); W1(A); C1"
         list_schedule = parse_input(schedule)
         t = TwoPhaseLocking(list_schedule)
-        t.add_queue(Operation.READ, 1, "A")
+        t.add_queue(Operation.READ, 1, t.symbols.lookup("A"))
 
         self.assertTrue(t.is_waiting(1))
 
@@ -57,6 +171,50 @@ class TestTwoPhaseLocking(unittest.TestCase):
 
         self.assertEqual(t.waiting_queue, [])
 
+    def test_targeted_wakeup(self):
+        schedule ="R2(A); R3(B); C2; C3"
+        list_schedule = parse_input(schedule)
+        t = TwoPhaseLocking(list_schedule)
+        t.parsed_schedule = []
+        a, b = t.symbols.lookup("A"), t.symbols.lookup("B")
+        t.add_queue(Operation.READ, 2, a)
+        t.add_queue(Operation.READ, 3, b)
+        t.add_queue(Operation.COMMIT, 2, NO_ITEM)
+
+        t.queue_to_schedule([a])
+
+        self.assertEqual(t.parsed_schedule, [(Operation.READ, 2, "A"), (Operation.COMMIT, 2, "")])
+        self.assertEqual(t.waiting_queue, [(Operation.READ, 3, "B")])
+        self.assertFalse(t.is_waiting(2))
+        self.assertTrue(t.is_waiting(3))
+
+    def test_result_targeted(self):
+        sample_input_1 = "R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;"
+        sample_input_2 = "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;"
+
+        for sample in [sample_input_1, sample_input_2]:
+            for upgrade in [False, True]:
+                full = TwoPhaseLocking(parse_input(sample), LockManager())
+                full.run(upgrade=upgrade)
+                targeted = TwoPhaseLocking(parse_input(sample), LockManager())
+                targeted.run(upgrade=upgrade, wakeup="targeted")
+
+                self.assertEqual(full.result, targeted.result)
+
+    def test_rollback_transaction(self):
+        schedule ="R1(A); R1(B); R2(C)"
+        t = TwoPhaseLocking(parse_input(schedule), LockManager())
+        t.run()
+
+        wasted = t.rollback_transaction(1, t.symbols.lookup("B"))
+
+        self.assertEqual(wasted, 1)
+        # the lock on A still protects R1(A)
+        self.assertEqual(t.result, ['XL1(A)', 'R1(A)', 'XL2(C)', 'R2(C)', 'RB1(B)', 'UL1(B)'])
+        self.assertEqual(t.locks_manager.get_locked_items(1), [t.symbols.lookup("A")])
+        self.assertEqual(t.waiting_queue, [(Operation.READ, 1, "B")])
+        self.assertEqual(t.executed_operations(1), 1)
+
     def test_result_simple(self):
         sample_input_1 = "R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;"
         sample_input_2 = "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;"
@@ -115,7 +273,7 @@ class TestTwoPhaseLocking(unittest.TestCase):
             'UL3(Y)', 'XL2(Y)', 'W2(Y)', 'C2', 'UL2(X)', 'UL2(Y)']
         
         t2_result = ['SL1(X)', 'R1(X)', 'SL2(Y)', 'R2(Y)', 'SL1(Y)', 'R1(Y)', 'XU1(X)', 
-            'W1(X)', 'C1', 'UL1(X)', 'UL1(Y)', 'XL2(Y)', 'W2(Y)', 'C2', 'UL2(Y)']
+            'W1(X)', 'C1', 'UL1(X)', 'UL1(Y)', 'XU2(Y)', 'W2(Y)', 'C2', 'UL2(Y)']
         
         t3_result = ['SL1(X)', 'R1(X)', 'SL2(Y)', 'R2(Y)', 'SL1(Y)', 'R1(Y)', 'SL2(X)', 'R2(X)',
                 'C1', 'UL1(X)', 'UL1(Y)', 'C2', 'UL2(Y)', 'UL2(X)']
@@ -127,6 +285,1093 @@ class TestTwoPhaseLocking(unittest.TestCase):
         t4 = TwoPhaseLocking(s4, LockManager())
         self.assertRaises(Exception, t4.run, upgrade=True, rollback=False)
 
+class TestIndexedLockManager(unittest.TestCase):
+
+    def test_lock_unlock(self):
+        lm = IndexedLockManager()
+        lm.lock_data(1, "A", LockType.S)
+        lm.lock_data(2, "A", LockType.S)
+        lm.lock_data(1, "B", LockType.X)
+
+        self.assertTrue(lm.is_lock_shared("A"))
+        self.assertEqual(lm.get_transaction_ids("A"), [1, 2])
+        self.assertEqual(lm.get_locked_items(1), ["A", "B"])
+
+        lm.unlock(1)
+
+        self.assertFalse(lm.is_locked_by(1))
+        self.assertFalse(lm.is_locked("B"))
+        self.assertTrue(lm.has_lock(2, "A"))
+        self.assertFalse(lm.is_lock_shared("A"))
+        # still locked by T2
+        for manager in [lm, LockManager()]:
+            manager.lock_data(3, "C", LockType.S)
+            manager.lock_data(4, "C", LockType.S)
+            manager.unlock(3)
+            self.assertTrue(manager.is_locked("C"))
+            self.assertEqual(manager.lock_type("C"), LockType.S)
+
+    def test_same_result_as_flat_table(self):
+        samples = [
+            "R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;",
+            "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;",
+            "R1(X); R2(Y); R1(Y); R2(X); C1; C2;",
+            "R1(X) ;W2(Y) ;W2(X); W3(Y) ;W1(Y); C1; C2; C3;",
+        ]
+        for sample in samples:
+            for upgrade, rollback in [(False, False), (True, False), (True, True)]:
+                flat = TwoPhaseLocking(parse_input(sample), LockManager())
+                indexed = TwoPhaseLocking(parse_input(sample), IndexedLockManager())
+                try:
+                    flat.run(upgrade=upgrade, rollback=rollback)
+                except Exception:
+                    self.assertRaises(Exception, indexed.run, upgrade=upgrade, rollback=rollback)
+                    continue
+                indexed.run(upgrade=upgrade, rollback=rollback)
+                self.assertEqual(flat.result, indexed.result)
+
+class TestLockRequestManager(unittest.TestCase):
+
+    def test_compatibility(self):
+        lm = LockRequestManager()
+
+        self.assertTrue(lm.request(1, "A", LockType.S))
+        self.assertTrue(lm.request(2, "A", LockType.S))
+        self.assertFalse(lm.request(3, "A", LockType.X))
+        self.assertTrue(lm.request(4, "B", LockType.IX))
+        self.assertTrue(lm.request(5, "B", LockType.IS))
+        self.assertFalse(lm.request(6, "B", LockType.S))
+
+        self.assertEqual(lm.get_transaction_ids("A"), [1, 2])
+        self.assertTrue(lm.is_waiting(3))
+
+    def test_release_wakes_waiters_of_released_items(self):
+        lm = LockRequestManager()
+        lm.request(1, "A", LockType.X)
+        lm.request(2, "B", LockType.X)
+        lm.request(3, "A", LockType.S)
+        lm.request(4, "A", LockType.S)
+        lm.request(5, "B", LockType.S)
+
+        granted = lm.release(1)
+
+        self.assertEqual(granted, [(3, "A", LockType.S, False), (4, "A", LockType.S, False)])
+        self.assertTrue(lm.is_waiting(5))
+
+    def test_upgrade_waits_for_other_readers(self):
+        lm = LockRequestManager()
+        lm.request(1, "A", LockType.S)
+        lm.request(2, "A", LockType.S)
+
+        self.assertFalse(lm.request(1, "A", LockType.X))
+        self.assertEqual(lm.release(2), [(1, "A", LockType.X, True)])
+
+    def test_result_queued(self):
+        t1 = TwoPhaseLocking(parse_input("R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;"), LockRequestManager())
+        t1.run(upgrade=True)
+        t2 = TwoPhaseLocking(parse_input("R1(X); R2(X); W1(X); C1; C2"), LockRequestManager())
+        t2.run(upgrade=True)
+
+        t1_result = ['SL1(X)', 'R1(X)', 'SL2(Y)', 'R2(Y)', 'SL1(Y)', 'R1(Y)', 'XU1(X)',
+            'W1(X)', 'C1', 'UL1(X)', 'UL1(Y)', 'XU2(Y)', 'W2(Y)', 'C2', 'UL2(Y)']
+        t2_result = ['SL1(X)', 'R1(X)', 'SL2(X)', 'R2(X)', 'C2', 'UL2(X)',
+            'XU1(X)', 'W1(X)', 'C1', 'UL1(X)']
+
+        self.assertEqual(t1.result, t1_result)
+        self.assertEqual(t2.result, t2_result)
+
+class TestHierarchicalLockManager(unittest.TestCase):
+
+    def test_intention_locks(self):
+        lm = HierarchicalLockManager()
+
+        self.assertTrue(lm.request(1, "T.P1.R1", LockType.S))
+        self.assertEqual(lm.held[1], {"T": LockType.IS, "T.P1": LockType.IS, "T.P1.R1": LockType.S})
+        self.assertEqual(lm.get_locked_items(1), ["T.P1.R1"])
+
+        self.assertTrue(lm.request(2, "T.P2.R1", LockType.X))
+        self.assertFalse(lm.request(3, "T", LockType.X))
+        self.assertEqual(lm.waiting_for[3], "T")
+
+    def test_release_resumes_path(self):
+        lm = HierarchicalLockManager()
+        lm.request(1, "T", LockType.X)
+
+        self.assertFalse(lm.request(2, "T.P1.R1", LockType.S))
+        self.assertEqual(lm.waiting_for[2], "T")
+        self.assertEqual(lm.release(1), [(2, "T.P1.R1", LockType.S, False)])
+        self.assertEqual(lm.held[2]["T.P1"], LockType.IS)
+
+    def test_escalation(self):
+        lm = HierarchicalLockManager(escalation_threshold=3)
+        for i in range(3):
+            self.assertTrue(lm.request(1, f"T.P1.R{i}", LockType.S))
+
+        self.assertEqual(lm.escalations, 1)
+        self.assertEqual(lm.held[1], {"T": LockType.IS, "T.P1": LockType.S})
+        self.assertEqual(sorted(lm.queues), ["T", "T.P1"])
+
+        # covered reads take no new locks
+        self.assertTrue(lm.request(1, "T.P1.R7", LockType.S))
+        self.assertEqual(sorted(lm.queues), ["T", "T.P1"])
+        self.assertEqual(lm.granted_mode(1, "T.P1.R7"), LockType.S)
+
+        lm.release(1)
+        self.assertEqual(lm.queues, {})
+
+    def test_write_escalation(self):
+        lm = HierarchicalLockManager(escalation_threshold=2)
+        lm.request(1, "T.P1.R1", LockType.X)
+        lm.request(1, "T.P1.R2", LockType.S)
+
+        self.assertEqual(lm.held[1]["T.P1"], LockType.X)
+        self.assertFalse(lm.request(2, "T.P1", LockType.S))
+
+    def test_deescalation(self):
+        lm = HierarchicalLockManager(escalation_threshold=3)
+        for i in range(3):
+            lm.request(1, f"T.P1.R{i}", LockType.S)
+
+        self.assertTrue(lm.request(2, "T.P1.R5", LockType.X))
+        self.assertEqual(lm.deescalations, 1)
+        self.assertEqual(lm.held[1]["T.P1"], LockType.IS)
+        self.assertEqual(lm.get_locked_items(1), ["T.P1.R0", "T.P1.R1", "T.P1.R2"])
+        self.assertFalse(lm.request(2, "T.P1.R1", LockType.X))
+
+        # not escalated again before the transaction releases its locks
+        lm.request(1, "T.P1.R3", LockType.S)
+        self.assertEqual(lm.escalations, 1)
+        self.assertEqual(lm.release(1), [(2, "T.P1.R1", LockType.X, False)])
+
+    def test_escalate_again(self):
+        lm = HierarchicalLockManager(escalation_threshold=1)
+        # T escalates to S, then to X once the write below makes it SIX
+        self.assertTrue(lm.request(1, "T.P1.R3", LockType.S))
+        self.assertEqual(lm.held[1], {"T": LockType.S})
+        self.assertTrue(lm.request(1, "T.P0.R4", LockType.X))
+        self.assertEqual(lm.held[1], {"T": LockType.X})
+        # T.P1 and T, then T.P0 and T again
+        self.assertEqual(lm.escalations, 4)
+
+        # the read remembered from the first escalation still blocks the write
+        self.assertFalse(lm.request(2, "T.P1.R3", LockType.X))
+        self.assertEqual(lm.deescalations, 1)
+        self.assertEqual(lm.granted_mode(1, "T.P1.R3"), LockType.S)
+        self.assertEqual(lm.granted_mode(1, "T.P0.R4"), LockType.X)
+        self.assertEqual(lm.release(1), [(2, "T.P1.R3", LockType.X, False)])
+
+    def test_result_hierarchical(self):
+        schedule = "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;"
+        flat = TwoPhaseLocking(parse_input(schedule), LockRequestManager())
+        flat.run(upgrade=True)
+        hierarchical = TwoPhaseLocking(parse_input(schedule), HierarchicalLockManager())
+        hierarchical.run(upgrade=True)
+        self.assertEqual(hierarchical.result, flat.result)
+
+        lm = HierarchicalLockManager(escalation_threshold=2)
+        t = TwoPhaseLocking(parse_input("R1(T.P1.R1); R1(T.P1.R2); R1(T.P1.R3); W2(T.P1.R3); W2(T.P2.R1); R1(T.P2.R1); C1; C2"), lm)
+        t.run()
+        self.assertEqual(lm.escalations, 1)
+        self.assertEqual(check_serializable(t).serial_order(), [1, 2])
+        self.assertEqual(lm.queues, {})
+
+class TestDeadlockDetection(unittest.TestCase):
+
+    def test_waits_for_graph(self):
+        graph = WaitsForGraph()
+
+        self.assertEqual(graph.add_waits(1, [2]), [])
+        self.assertEqual(graph.add_waits(2, [3]), [])
+        self.assertEqual(graph.add_waits(3, [1]), [3, 1, 2])
+
+        graph.remove_transaction(1)
+
+        self.assertEqual(graph.find_cycle(3), [])
+        self.assertFalse(graph.is_waiting(1))
+
+    def test_result_detect(self):
+        sample_input_6 = "W1(X); W2(Y); W1(Y); W2(X); C1; C2"
+
+        t = TwoPhaseLocking(parse_input(sample_input_6), LockManager())
+        t.run(detect=True)
+
+        t_result = ['XL1(X)', 'W1(X)', 'RB2(Y)', 'UL2(Y)', 'XL1(Y)', 'W1(Y)', 'C1',
+            'UL1(X)', 'UL1(Y)', 'XL2(Y)', 'W2(Y)', 'XL2(X)', 'W2(X)', 'C2', 'UL2(Y)', 'UL2(X)']
+
+        self.assertEqual(t.result, t_result)
+        self.assertEqual(t.policy.deadlocks, 1)
+
+    def test_victim_cost(self):
+        # T2, the youngest, has executed the most operations
+        sample = "W2(A); W2(B); W2(C); W1(D); W2(D); W1(A); C1; C2"
+
+        youngest = TwoPhaseLocking(parse_input(sample), LockManager())
+        youngest.run(detect=True, victim="youngest")
+        ops = TwoPhaseLocking(parse_input(sample), LockManager())
+        ops.run(detect=True, victim="ops")
+
+        self.assertIn('RB2(A)', youngest.result)
+        self.assertNotIn('RB1(D)', youngest.result)
+        self.assertIn('RB1(D)', ops.result)
+        self.assertNotIn('RB2(A)', ops.result)
+
+        locks = TwoPhaseLocking(parse_input("W1(X); W2(Y); W2(Z); W1(Y); W2(X); C1; C2"), LockManager())
+        locks.run(detect=True, victim="locks")
+
+        self.assertIn('RB1(X)', locks.result)
+
+    def test_own_lock_is_no_deadlock(self):
+        # the read is covered by the transaction's own exclusive lock
+        for policy in ["none", "wound-wait", "wait-die", "no-wait", "timeout", "detect"]:
+            t = TwoPhaseLocking(parse_input("W1(X); R1(X); C1"), LockManager())
+            t.run(upgrade=True, deadlock=policy, max_steps=100)
+
+            self.assertEqual(t.result, ['XL1(X)', 'W1(X)', 'R1(X)', 'C1', 'UL1(X)'])
+
+        graph = WaitsForGraph()
+        self.assertEqual(graph.add_waits(1, [1, 2]), [])
+        with self.assertRaises(Exception):
+            graph.add_waits(3, [3])
+
+    def test_waiting_without_cycle(self):
+        # T1 never commits, so T2 waits forever without a deadlock
+        for lockmanager in [IndexedLockManager(), LockRequestManager()]:
+            t = TwoPhaseLocking(parse_input("W1(X); W2(X); C2"), lockmanager)
+            with self.assertRaisesRegex(Exception, "never released"):
+                t.run()
+            self.assertEqual(t.find_deadlock(), [])
+
+        t = TwoPhaseLocking(parse_input("W1(X); W2(Y); W1(Y); W2(X); C1; C2"))
+        with self.assertRaisesRegex(Exception, "Deadlock detected"):
+            t.run()
+        self.assertEqual(sorted(t.find_deadlock()), [1, 2])
+
+class TestDeadlockPolicies(unittest.TestCase):
+
+    def test_policies_resolve_deadlock(self):
+        sample_input_4 = "R1(X) ;W2(Y) ;W2(X); W3(Y) ;W1(Y); C1; C2; C3;"
+        sample_input_6 = "W1(X); W2(Y); W1(Y); W2(X); C1; C2"
+
+        for sample, commits in [(sample_input_4, 3), (sample_input_6, 2)]:
+            for policy in ["wound-wait", "wait-die", "no-wait", "timeout", "detect"]:
+                for wakeup in ["all", "targeted"]:
+                    t = TwoPhaseLocking(parse_input(sample), LockManager())
+                    t.run(deadlock=policy, wakeup=wakeup)
+
+                    self.assertEqual(len([r for r in t.result if r[0] == "C"]), commits)
+                    self.assertGreater(t.policy.statistics()["aborts"], 0)
+
+    def test_abort_wakes_only_unblocked_waiters(self):
+        # waking every waiter on an abort used to abort the same victims in a loop
+        sample = "W1(K2); R2(K0); W2(K2); R3(K0); W3(K2); W1(K0); C1; C2; C3"
+
+        for upgrade in [False, True]:
+            for policy in ["wound-wait", "wait-die", "no-wait", "timeout", "detect"]:
+                for wakeup in ["all", "targeted"]:
+                    t = TwoPhaseLocking(parse_input(sample), LockManager())
+                    t.run(upgrade=upgrade, deadlock=policy, wakeup=wakeup, max_steps=100)
+
+                    self.assertEqual(len([r for r in t.result if r[0] == "C"]), 3)
+                    self.assertLessEqual(t.policy.aborts, 3)
+
+    def test_random_workloads(self):
+        # every policy finishes contended workloads with a serializable history
+        for seed in range(40):
+            workload = Workload(transactions=8, operations=3, read_ratio=0.5, keys=4, concurrency=4, seed=seed)
+            for upgrade in [False, True]:
+                for policy in ["wound-wait", "wait-die", "no-wait", "timeout", "detect"]:
+                    for wakeup in ["all", "targeted"]:
+                        t = TwoPhaseLocking(parse_input("; ".join(workload.schedule())))
+                        t.run(upgrade=upgrade, deadlock=policy, wakeup=wakeup, max_steps=20 * len(workload))
+
+                        self.assertEqual(len([r for r in t.result if r[0] == "C"]), 8)
+                        self.assertTrue(check_serializable(t).is_serializable())
+
+    def test_wait_die(self):
+        sample_input_6 = "W1(X); W2(Y); W1(Y); W2(X); C1; C2"
+
+        t = TwoPhaseLocking(parse_input(sample_input_6), LockManager())
+        t.run(deadlock=WaitDie())
+
+        t_result = ['XL1(X)', 'W1(X)', 'RB2(Y)', 'UL2(Y)', 'XL1(Y)', 'W1(Y)',
+            'C1', 'UL1(X)', 'UL1(Y)', 'XL2(Y)', 'W2(Y)', 'XL2(X)', 'W2(X)', 'C2', 'UL2(Y)', 'UL2(X)']
+
+        self.assertEqual(t.result, t_result)
+        self.assertEqual(t.policy.statistics(),
+            {"policy": "wait-die", "aborts": 1, "wasted_operations": 1})
+
+    def test_timeout_without_deadlock(self):
+        sample_input_1 = "R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;"
+
+        t = TwoPhaseLocking(parse_input(sample_input_1), LockManager())
+        t.run(deadlock=Timeout(timeout=10))
+
+        self.assertEqual(t.policy.aborts, 0)
+
+class TestHistory(unittest.TestCase):
+
+    def test_history_events(self):
+        sample_input_6 = "W1(X); W2(Y); W1(Y); W2(X); C1; C2"
+
+        t = TwoPhaseLocking(parse_input(sample_input_6), LockManager())
+        t.run(deadlock=WaitDie())
+
+        locks = list(t.history.events({EventType.LOCK}, transaction_id=2))
+        self.assertEqual(locks, [(EventType.LOCK, 2, "Y", LockType.X), (EventType.LOCK, 2, "X", LockType.X)])
+        # the rolled back write of T2 is no longer in the history
+        writes = [e[2] for e in t.history.events({EventType.WRITE}, transaction_id=2)]
+        self.assertEqual(writes, ["Y", "X"])
+
+    def test_symbol_table(self):
+        t = TwoPhaseLocking(parse_input("R1(X); W2(Y); R2(X); C1; C2"))
+
+        self.assertEqual(t.symbols.names, ["X", "Y"])
+        self.assertEqual([op[2] for op in t.operations], [0, 1, 0, NO_ITEM, NO_ITEM])
+        self.assertIs(t.parsed_schedule[0][2], t.parsed_schedule[2][2])
+
+        # the history stores the parsed symbols, nothing is interned while running
+        def intern(name):
+            raise Exception(f"{name} interned while running")
+        t.symbols.intern = intern
+        t.run()
+        self.assertEqual(list(t.history.data_items[:3]), [0, 0, 1])
+        commits = [p for p, e in enumerate(t.history.event_types) if e == EventType.COMMIT]
+        self.assertEqual([t.history.data_items[p] for p in commits], [NO_ITEM, NO_ITEM])
+        self.assertEqual(t.result[:3], ["XL1(X)", "R1(X)", "XL2(Y)"])
+
+class TestOCC(unittest.TestCase):
+
+    def run_occ(self, occ: OCC) -> list:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            occ.run()
+        return [line for line in output.getvalue().splitlines() if line != ""]
+
+    def test_conflict_rolls_back(self):
+        T1 = OCCTransaction(1, [Read('B'), Write('B'), Read('A'), Write('A')])
+        T2 = OCCTransaction(2, [Read('B'), Write('B'), Read('A'), Write('A')])
+
+        lines = self.run_occ(OCC([T1, T2], [1, 1, 2, 2, 2, 2, 1, 1], tracer=ConsoleTracer()))
+
+        self.assertIn("Conflict with T1.", lines)
+        self.assertEqual([line for line in lines if line.endswith("committed.")],
+            ["T1 committed.", "T9 committed."])
+
+    def test_registry_follows_rollback(self):
+        T1 = OCCTransaction(1, [Read('B'), Write('B'), Read('A'), Write('A')])
+        T2 = OCCTransaction(2, [Read('B'), Write('B'), Read('A'), Write('A')])
+        occ = OCC([T1, T2], [1, 1, 2, 2, 2, 2, 1, 1])
+        self.run_occ(occ)
+
+        self.assertIs(occ.get_transaction(9), T2)
+        self.assertIs(occ.get_transaction_by_id(2), T2)
+        self.assertNotIn(2, occ.by_timestamp)
+
+    def test_rollback_statistics(self):
+        T1 = OCCTransaction(1, [Read('B'), Write('B'), Read('A'), Write('A')])
+        T2 = OCCTransaction(2, [Read('B'), Write('B'), Read('A'), Write('A')])
+        occ = OCC([T1, T2], [1, 1, 2, 2, 2, 2, 1, 1])
+        self.run_occ(occ)
+
+        # T2 runs its four queries again as T9
+        statistics = occ.statistics()
+        self.assertEqual((statistics["operations"], statistics["commits"], statistics["aborts"]), (12, 2, 1))
+
+    def test_restart_timestamps_are_unique(self):
+        # the restart of T3 used to take the start timestamp of a restarted
+        # transaction still running
+        queries = [[Read('K1'), Write('K1')], [Write('K1'), Read('K1')], [Write('K2'), Read('K0')],
+                   [Read('K2'), Write('K0')], [Write('K2'), Write('K1')]]
+        transactions = [OCCTransaction(i, q) for i, q in enumerate(queries, 1)]
+        occ = OCC(transactions, [2, 5, 1, 5, 1, 4, 4, 3, 2, 3])
+        self.run_occ(occ)
+
+        self.assertEqual(occ.commits, 5)
+        self.assertEqual(len(occ.by_timestamp), 5)
+
+    def test_validation_index(self):
+        T1 = OCCTransaction(1, [Write('A')])
+        T2 = OCCTransaction(2, [Read('A')])
+        T3 = OCCTransaction(3, [Read('B')])
+        occ = OCC([T1, T2, T3], [])
+        with contextlib.redirect_stdout(io.StringIO()):
+            for transaction in (T1, T2, T3):
+                transaction.next_query()
+
+        index = ValidationIndex()
+        for timestamp in (1, 2, 3):
+            index.start(timestamp)
+        # T1 is still running and older than T2
+        self.assertFalse(index.validate(T2, 5))
+
+        T1.end_timestamp = 4
+        index.commit(T1)
+        # T2 read A, which T1 wrote after T2 started
+        self.assertFalse(index.validate(T2, 5))
+        index.abort(2)
+        self.assertTrue(index.validate(T3, 5))
+
+        index.collect(4)
+        self.assertEqual(index.blocks, {})
+
+class TestMVCC(unittest.TestCase):
+
+    def run_mvcc(self, mvcc: MVCC) -> list:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            mvcc.run()
+        return [line for line in output.getvalue().splitlines() if line != ""]
+
+    def test_readers_see_snapshot(self):
+        T1 = MVCCTransaction(1, [Write('A')])
+        T2 = MVCCTransaction(2, [Read('A'), Read('A')])
+        T3 = MVCCTransaction(3, [Read('A')])
+        mvcc = MVCC([T1, T2, T3], [2, 1, 2, 3])
+        self.run_mvcc(mvcc)
+
+        # T2 started before T1 committed and keeps reading the initial version
+        self.assertEqual(T2.versions_read, [('A', 0), ('A', 0)])
+        self.assertEqual(T3.versions_read, [('A', 1)])
+        self.assertEqual(mvcc.aborts, 0)
+
+    def test_first_committer_wins(self):
+        T1 = MVCCTransaction(1, [Read('B'), Write('B'), Read('A'), Write('A')])
+        T2 = MVCCTransaction(2, [Read('B'), Write('B'), Read('A'), Write('A')])
+        mvcc = MVCC([T1, T2], [1, 1, 2, 2, 2, 2, 1, 1], tracer=ConsoleTracer())
+
+        lines = self.run_mvcc(mvcc)
+
+        self.assertIn("Conflict on B.", lines)
+        self.assertEqual([line for line in lines if line.endswith("committed.")],
+            ["T2 committed.", "T3 committed."])
+        self.assertIs(mvcc.get_transaction_by_id(1), mvcc.get_transaction(3))
+        self.assertEqual(mvcc.statistics()["aborts"], 1)
+
+    def test_garbage_collection(self):
+        transactions = [MVCCTransaction(t, [Write('A')]) for t in range(1, 6)]
+        mvcc = MVCC(transactions, [1, 2, 3, 4, 5])
+        self.run_mvcc(mvcc)
+
+        self.assertEqual(mvcc.versions.chains['A'], ([5], [5]))
+        self.assertEqual(mvcc.versions.collected, 4)
+
+class TestTimestampOrdering(unittest.TestCase):
+
+    def run_to(self, to: TimestampOrdering) -> list:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            to.run()
+        return [line for line in output.getvalue().splitlines() if line != ""]
+
+    def write_heavy(self, thomas_write_rule: bool) -> TimestampOrdering:
+        T1 = Transaction(1, [Write('A'), Write('B')])
+        T2 = Transaction(2, [Write('B')])
+        return TimestampOrdering([T1, T2], [1, 2, 1], thomas_write_rule, tracer=ConsoleTracer())
+
+    def test_obsolete_write_aborts(self):
+        to = self.write_heavy(False)
+        lines = self.run_to(to)
+
+        self.assertIn("Conflict with T2.", lines)
+        self.assertEqual(to.aborts, 1)
+        self.assertEqual(to.write_timestamp, {'A': 3, 'B': 3})
+
+    def test_thomas_write_rule(self):
+        to = self.write_heavy(True)
+        lines = self.run_to(to)
+
+        self.assertIn("W1(B) skipped.", lines)
+        self.assertEqual(to.statistics()["aborts"], 0)
+        self.assertEqual(to.statistics()["skipped_writes"], 1)
+        self.assertEqual(to.write_timestamp, {'A': 1, 'B': 2})
+        self.assertEqual(to.storage.get('B'), b"T2")
+
+    def test_rollback_keeps_younger_writes(self):
+        # T1 rolls back after the younger T2 committed X, T3 reads T2's X
+        T1 = Transaction(1, [Write('X'), Read('Y')])
+        T2 = Transaction(2, [Write('Y'), Write('X')])
+        T3 = Transaction(3, [Read('X')])
+        to = TimestampOrdering([T1, T2, T3], [1, 2, 2, 1, 3])
+        to.run()
+
+        self.assertEqual((to.commits, to.aborts), (3, 1))
+        self.assertEqual(T3.list_of_queries[0].value, b"T2")
+        # T1 ran again as T4 after T3, its write is the last one
+        self.assertEqual(to.storage.get('X'), b"T1")
+        self.assertEqual(to.storage.get('Y'), b"T2")
+
+    def test_no_dirty_reads(self):
+        # T2 waits for the uncommitted write of T1 and reads nothing T1
+        # wrote before it rolled back
+        T1 = Transaction(1, [Write('X'), Read('Y')])
+        T2 = Transaction(2, [Read('X')])
+        T3 = Transaction(3, [Write('Y')])
+        to = TimestampOrdering([T1, T2, T3], [1, 2, 3, 1], storage=MemoryStore())
+        to.storage.put('X', b"initial")
+        to.run()
+
+        self.assertEqual(to.statistics()["waits"], 1)
+        self.assertEqual((to.commits, to.aborts), (3, 1))
+        self.assertEqual(T2.list_of_queries[0].value, b"initial")
+        self.assertEqual(to.storage.get('X'), b"T1")
+        self.assertEqual(to.writers, {})
+        self.assertEqual(to.write_sets, {})
+
+    def test_rollback_skips_pending_entries(self):
+        T1 = Transaction(1, [Read('A'), Write('B'), Write('C')])
+        T2 = Transaction(2, [Write('A')])
+        collector = Collector()
+        to = TimestampOrdering([T1, T2], [2, 1, 1, 1], tracer=collector)
+        to.run()
+
+        # T1 rolls back on its first query, its two entries left in the
+        # schedule are skipped and it runs again as T3
+        self.assertEqual(collector.events[TraceEvent.START], 3)
+        self.assertEqual(to.statistics()["operations"], 4)
+        self.assertEqual((to.commits, to.aborts), (2, 1))
+        self.assertEqual(T1.start_timestamp, 3)
+        self.assertEqual(to.write_timestamp, {'A': 2, 'B': 3, 'C': 3})
+
+    def test_late_read_aborts(self):
+        T1 = Transaction(1, [Read('A')])
+        T2 = Transaction(2, [Write('A')])
+        to = TimestampOrdering([T1, T2], [2, 1], thomas_write_rule=True, tracer=ConsoleTracer())
+        lines = self.run_to(to)
+
+        self.assertEqual([line for line in lines if line.endswith("committed.")],
+            ["T2 committed.", "T3 committed."])
+        self.assertEqual(to.read_timestamp, {'A': 3})
+
+class TestThreadedLocking(unittest.TestCase):
+
+    def test_shared_and_exclusive(self):
+        lm = ConcurrentLockManager(stripes=4)
+
+        self.assertTrue(lm.acquire(1, "A", LockType.S))
+        self.assertTrue(lm.acquire(2, "A", LockType.S))
+        self.assertFalse(lm.acquire(3, "A", LockType.X, timeout=0.01))
+        # an upgrade waits for the other reader
+        self.assertFalse(lm.acquire(1, "A", LockType.X, timeout=0.01))
+
+        lm.release(2)
+        self.assertTrue(lm.acquire(1, "A", LockType.X, timeout=0.01))
+        self.assertEqual(lm.granted_mode(1, "A"), LockType.X)
+
+    def test_waiter_is_woken_on_release(self):
+        lm = ConcurrentLockManager()
+        lm.acquire(1, "A", LockType.X)
+
+        granted = []
+        waiter = threading.Thread(target=lambda: granted.append(lm.acquire(2, "A", LockType.X, timeout=5)))
+        waiter.start()
+        lm.release(1)
+        waiter.join()
+
+        self.assertEqual(granted, [True])
+        self.assertEqual(lm.get_locked_items(2), ["A"])
+
+    def test_deadlock_is_broken_by_timeout(self):
+        sample_input_6 = "W1(X); W2(Y); W1(Y); W2(X); C1; C2"
+
+        t = ThreadedTwoPhaseLocking(parse_input(sample_input_6), timeout=0.02, think_time=0.01)
+        t.run()
+
+        self.assertEqual(sorted(t.commit_order), [1, 2])
+        self.assertEqual(t.statistics()["commits"], 2)
+        self.assertEqual(t.locks_manager.held, {})
+
+class TestAsyncExecutor(unittest.TestCase):
+
+    def crosswise(self, first: str, second: str, order: list):
+        async def transaction(t):
+            await t.write(first)
+            await asyncio.sleep(0)
+            await t.write(second)
+            order.append(t.transaction_id)
+            return first
+        return transaction
+
+    def test_two_phase_locking_deadlock(self):
+        order = []
+        engine = AsyncTwoPhaseLocking()
+        results = asyncio.run(engine.run([self.crosswise("X", "Y", order), self.crosswise("Y", "X", order)]))
+
+        self.assertEqual(results, ["X", "Y"])
+        # the younger transaction is the victim
+        self.assertEqual(order, [1, 2])
+        self.assertEqual(engine.statistics(),
+            {"scheduler": "2pl", "commits": 2, "aborts": 1, "deadlocks": 1})
+        self.assertEqual(engine.locks_manager.queues, {})
+
+    def test_two_phase_locking_values(self):
+        async def increment(t):
+            balance = int(await t.read("A"))
+            await asyncio.sleep(0)
+            await t.write("A", str(balance + 1).encode())
+            return await t.read("A")
+
+        engine = AsyncTwoPhaseLocking()
+        engine.storage.put("A", b"100")
+        results = asyncio.run(engine.run([increment, increment]))
+
+        # both read A under S, the upgrade deadlock rolls back the younger one
+        self.assertEqual(results, [b"101", b"102"])
+        self.assertEqual(engine.storage.get("A"), b"102")
+        self.assertEqual(engine.undo, {})
+
+    def test_two_phase_locking_undo(self):
+        order = []
+        engine = AsyncTwoPhaseLocking()
+        engine.storage.put("Y", b"initial")
+        # the deadlock victim T2 wrote Y before it was rolled back, T1 must
+        # not see that write
+        async def first(t):
+            await t.write("X")
+            await asyncio.sleep(0)
+            value = await t.read("Y")
+            order.append(value)
+        asyncio.run(engine.run([first, self.crosswise("Y", "X", order)]))
+
+        self.assertEqual(engine.aborts, 1)
+        self.assertEqual(order, [b"initial", 2])
+        self.assertEqual(engine.storage.get("X"), b"T2")
+        self.assertEqual(engine.storage.get("Y"), b"T2")
+
+    def test_occ_validation(self):
+        async def writer(t):
+            await t.write("A")
+            await asyncio.sleep(0)
+
+        async def reader(t):
+            value = await t.read("A")
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return value
+
+        engine = AsyncOCC()
+        results = asyncio.run(engine.run([writer, reader]))
+
+        # the reader started before the writer committed A and read the old
+        # value, it fails validation and reads the committed value on retry
+        self.assertEqual(results, [None, b"T1"])
+        self.assertEqual(engine.commits, 2)
+        self.assertEqual(engine.aborts, 1)
+        self.assertEqual(engine.storage.get("A"), b"T1")
+        self.assertEqual(engine.running, {})
+        self.assertEqual(engine.index.running, set())
+
+    def test_occ_matches_sync_validation(self):
+        # an older transaction still running fails the younger one, as in OCC
+        async def reader(t):
+            value = await t.read("A")
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            return value
+
+        async def writer(t):
+            await t.write("A", b"new")
+            return await t.read("A")
+
+        engine = AsyncOCC()
+        engine.storage.put("A", b"old")
+        results = asyncio.run(engine.run([reader, writer]))
+
+        self.assertEqual(results, [b"old", b"new"])
+        self.assertEqual(engine.commits, 2)
+        # the writer is retried until the reader has committed
+        self.assertEqual(engine.aborts, 2)
+        self.assertEqual(engine.storage.get("A"), b"new")
+
+
+class TestRecovery(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "wal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def restart(self, manager: RecoveryManager) -> RecoveryManager:
+        manager.crash()
+        restarted = RecoveryManager(WriteAheadLog(self.path, sync=False), manager.disk)
+        self.statistics = restarted.restart()
+        return restarted
+
+    def test_log_round_trip(self):
+        wal = WriteAheadLog(self.path, sync=False)
+        lsn = wal.append(LogRecord(RecordType.UPDATE, 1, item="A", before=None, after=b"1"))
+        wal.append(LogRecord(RecordType.CHECKPOINT, transactions={1: lsn}, dirty={"A": lsn}))
+        wal.close()
+
+        records = list(WriteAheadLog(self.path, sync=False).records())
+        self.assertEqual([r.type for r in records], [RecordType.UPDATE, RecordType.CHECKPOINT])
+        self.assertEqual((records[0].item, records[0].before, records[0].after), ("A", None, b"1"))
+        self.assertEqual(records[1].transactions, {1: lsn})
+        self.assertEqual(records[1].dirty, {"A": lsn})
+
+    def test_torn_tail(self):
+        wal = WriteAheadLog(self.path, sync=False)
+        wal.append(LogRecord(RecordType.BEGIN, 1))
+        wal.append(LogRecord(RecordType.COMMIT, 1))
+        wal.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(size - 3)
+
+        wal = WriteAheadLog(self.path, sync=False)
+        self.assertEqual([r.type for r in wal.records()], [RecordType.BEGIN])
+        self.assertEqual(wal.next_lsn, os.path.getsize(self.path))
+
+    def test_redo_committed(self):
+        manager = RecoveryManager(WriteAheadLog(self.path, sync=False))
+        manager.begin(1)
+        manager.write(1, "A", b"1")
+        manager.write(1, "B", b"2")
+        manager.commit(1)
+
+        manager = self.restart(manager)
+        self.assertEqual(manager.read(2, "A"), b"1")
+        self.assertEqual(manager.read(2, "B"), b"2")
+        self.assertEqual(self.statistics["redone"], 2)
+        self.assertEqual(self.statistics["losers"], 0)
+
+    def test_undo_uncommitted(self):
+        manager = RecoveryManager(WriteAheadLog(self.path, sync=False))
+        manager.begin(1)
+        manager.write(1, "A", b"1")
+        manager.commit(1)
+        manager.begin(2)
+        manager.write(2, "A", b"2")
+        manager.write(2, "B", b"3")
+        # the uncommitted updates reach the disk
+        manager.flush_all()
+        self.assertEqual(manager.disk["A"][0], b"2")
+
+        manager = self.restart(manager)
+        self.assertEqual(manager.read(3, "A"), b"1")
+        self.assertEqual(manager.read(3, "B"), None)
+        self.assertEqual(self.statistics["losers"], 1)
+        self.assertEqual(self.statistics["undone"], 2)
+
+        # the compensation records make a second restart undo nothing
+        manager = self.restart(manager)
+        self.assertEqual(manager.read(3, "A"), b"1")
+        self.assertEqual(self.statistics["losers"], 0)
+
+    def test_undo_interleaved_losers(self):
+        manager = RecoveryManager(WriteAheadLog(self.path, sync=False))
+        for transaction_id in (1, 2, 3):
+            manager.begin(transaction_id)
+        manager.write(1, "A", b"1")
+        manager.write(2, "B", b"2")
+        manager.write(3, "A", b"3")
+        manager.write(1, "B", b"4")
+        manager.flush_all()
+
+        manager = self.restart(manager)
+        self.assertEqual((manager.read(4, "A"), manager.read(4, "B")), (None, None))
+        self.assertEqual((self.statistics["losers"], self.statistics["undone"]), (3, 4))
+        # the losers are undone together, latest update first
+        clrs = [r for r in manager.wal.records() if r.type == RecordType.CLR]
+        self.assertEqual([(r.transaction_id, r.item, r.after) for r in clrs],
+            [(1, "B", b"2"), (3, "A", b"1"), (2, "B", None), (1, "A", None)])
+
+    def test_unflushed_updates_are_lost(self):
+        manager = RecoveryManager(WriteAheadLog(self.path, sync=False))
+        manager.begin(1)
+        manager.write(1, "A", b"1")
+
+        manager = self.restart(manager)
+        self.assertEqual(manager.read(2, "A"), None)
+        self.assertEqual(self.statistics["losers"], 0)
+
+    def test_abort(self):
+        manager = RecoveryManager(WriteAheadLog(self.path, sync=False))
+        manager.begin(1)
+        manager.write(1, "A", b"1")
+        manager.commit(1)
+        manager.begin(2)
+        manager.write(2, "A", b"2")
+        manager.abort(2)
+        self.assertEqual(manager.read(3, "A"), b"1")
+
+        manager = self.restart(manager)
+        self.assertEqual(manager.read(3, "A"), b"1")
+
+    def test_checkpoint(self):
+        manager = RecoveryManager(WriteAheadLog(self.path, sync=False))
+        for transaction_id in range(1, 11):
+            manager.begin(transaction_id)
+            manager.write(transaction_id, f"I{transaction_id}", b"x")
+            manager.commit(transaction_id)
+        manager.flush_all()
+        manager.begin(11)
+        manager.write(11, "I1", b"y")
+        manager.checkpoint()
+        manager.begin(12)
+        manager.write(12, "I2", b"z")
+        manager.commit(12)
+
+        manager = self.restart(manager)
+        self.assertEqual(manager.read(13, "I1"), b"x")
+        self.assertEqual(manager.read(13, "I2"), b"z")
+        self.assertEqual(self.statistics["losers"], 1)
+        # analysis starts at the checkpoint
+        self.assertEqual(self.statistics["analysis_records"], 4)
+
+    def test_group_commit(self):
+        wal = WriteAheadLog(self.path, sync=False, group_delay=0.02)
+        manager = RecoveryManager(wal)
+        latch = threading.Lock()
+
+        def commit(transaction_id):
+            with latch:
+                manager.begin(transaction_id)
+                manager.write(transaction_id, f"I{transaction_id}", b"x")
+            manager.commit(transaction_id)
+
+        threads = [threading.Thread(target=commit, args=(t,)) for t in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # the commits share flushes
+        self.assertLess(wal.fsyncs, 8)
+        self.assertEqual(len(list(wal.records())), wal.flushed_records)
+
+
+class TestStorage(unittest.TestCase):
+
+    def run_quietly(self, function):
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+
+    def test_mapped_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data")
+            store = MappedStore(path, capacity=64)
+            for i in range(20):
+                store.put("A", str(i).encode())
+            store.put("B", b"x" * 100)
+            store.put("C", b"c")
+            store.put("C", None)
+            self.assertEqual(store.get("A"), b"19")
+            self.assertEqual(store.get("C"), None)
+            self.assertEqual(len(store), 2)
+            store.close()
+
+            store = MappedStore(path, capacity=64)
+            self.assertEqual(store.get("A"), b"19")
+            self.assertEqual(store.get("B"), b"x" * 100)
+            self.assertNotIn("C", store)
+            store.compact()
+            self.assertEqual(store.garbage, 0)
+            self.assertEqual(store.get("B"), b"x" * 100)
+            store.close()
+
+    def test_occ_installs_at_commit(self):
+        storage = MemoryStore()
+        storage.put('A', b'0')
+        T1 = OCCTransaction(1, [Write('A', b'1'), Read('A')])
+        T2 = OCCTransaction(2, [Read('A')])
+        occ = OCC([T1, T2], [1, 2, 1], storage)
+        self.run_quietly(occ.run)
+
+        # T1 reads its own write; T2 ran while T1 was running, fails
+        # validation and reads the committed value when it is redone
+        self.assertEqual(T1.list_of_queries[1].value, b'1')
+        self.assertEqual(occ.aborts, 1)
+        self.assertEqual(T2.list_of_queries[0].value, b'1')
+        self.assertEqual(storage.get('A'), b'1')
+
+    def test_occ_rollback_discards_writes(self):
+        storage = MemoryStore()
+        T1 = OCCTransaction(1, [Write('A')])
+        occ = OCC([T1], [], storage)
+        with contextlib.redirect_stdout(io.StringIO()):
+            T1.next_query()
+            occ.rollback(T1, 2)
+        self.assertEqual(storage.values, {})
+        self.assertEqual(T1.write_set, {})
+
+    def test_two_phase_locking_undoes_writes(self):
+        storage = MemoryStore()
+        t = TwoPhaseLocking(parse_input("W1(X); W2(Y); W1(Y); W2(X); C1; C2"), LockManager(), storage)
+        t.run(rollback=True)
+
+        # T2 wrote Y first but was wounded by T1, its write was undone and redone
+        self.assertEqual(storage.values, {"X": b"T2", "Y": b"T2"})
+
+    def test_timestamp_ordering_undoes_writes(self):
+        storage = MemoryStore()
+        T1 = Transaction(1, [Write('A'), Read('B')])
+        T2 = Transaction(2, [Write('B')])
+        to = TimestampOrdering([T1, T2], [1, 2, 1], storage=storage)
+        self.run_quietly(to.run)
+
+        self.assertEqual(to.aborts, 1)
+        self.assertEqual(storage.values, {"A": b"T1", "B": b"T2"})
+
+    def test_mvcc_reads_snapshot_values(self):
+        T1 = MVCCTransaction(1, [Write('A', b'new')])
+        T2 = MVCCTransaction(2, [Read('A'), Read('A')])
+        storage = MemoryStore()
+        storage.put('A', b'old')
+        mvcc = MVCC([T1, T2], [2, 1, 2], storage)
+        self.run_quietly(mvcc.run)
+
+        self.assertEqual([q.value for q in T2.list_of_queries], [b'old', b'old'])
+        self.assertEqual(storage.get('A'), b'new')
+
+class TestWorkload(unittest.TestCase):
+
+    def test_seeded(self):
+        workload = Workload(transactions=50, operations=4, read_ratio=0.75, keys=20, skew=1.0, seed=3)
+        self.assertEqual(workload.schedule(), Workload(50, 4, 0.75, 20, 1.0, seed=3).schedule())
+        self.assertNotEqual(workload.schedule(), Workload(50, 4, 0.75, 20, 1.0, seed=4).schedule())
+
+        schedule = parse_schedule(workload.schedule())
+        self.assertEqual(len(schedule), len(workload))
+        self.assertEqual(len(schedule), 50 * 5)
+        # every transaction runs its operations and then commits
+        for transaction_id in range(1, 51):
+            operations = [operation for operation, t, _ in schedule if t == transaction_id]
+            self.assertEqual(operations[-1], Operation.COMMIT)
+            self.assertNotIn(Operation.COMMIT, operations[:-1])
+
+    def test_skew(self):
+        uniform = Workload(transactions=200, operations=10, keys=100, skew=0.0)
+        skewed = Workload(transactions=200, operations=10, keys=100, skew=1.5)
+        hot = lambda workload: sum(key == 0 for queries in workload.queries for _, key in queries)
+        self.assertGreater(hot(skewed), 5 * hot(uniform))
+
+    def test_transaction_schedule(self):
+        workload = Workload(transactions=30, operations=3, keys=1000, concurrency=4, seed=1)
+        transactions, schedule = workload.transaction_schedule(OCCTransaction)
+        self.assertEqual(len(schedule), 30 * 3)
+        occ = OCC(transactions, schedule)
+        with contextlib.redirect_stdout(io.StringIO()):
+            occ.run()
+        self.assertEqual(occ.commits, 30)
+
+class TestTracer(unittest.TestCase):
+
+    def test_untraced_runs_are_silent(self):
+        T1 = OCCTransaction(1, [Read('B'), Write('B'), Read('A'), Write('A')])
+        T2 = OCCTransaction(2, [Read('B'), Write('B'), Read('A'), Write('A')])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            OCC([T1, T2], [1, 1, 2, 2, 2, 2, 1, 1]).run()
+            TwoPhaseLocking(parse_input("R1(X); W2(Y); W2(X); W3(Y); W1(Y); C1; C2; C3;"), LockManager()).run(rollback=True)
+        self.assertEqual(output.getvalue(), "")
+
+    def test_collector(self):
+        collector = Collector()
+        t = TwoPhaseLocking(parse_input("W1(X); W2(Y); W1(Y); W2(X); C1; C2"), LockManager(), tracer=collector)
+        t.run(detect=True)
+
+        self.assertEqual(collector.events[TraceEvent.DEADLOCK], 1)
+        self.assertEqual(collector.events[TraceEvent.WAIT], collector.events[TraceEvent.WAKE])
+        self.assertEqual(sum(collector.aborts_per_item.values()), t.policy.aborts)
+        self.assertEqual(sum(collector.wait_time.values()), collector.events[TraceEvent.WAKE])
+        self.assertEqual(collector.waiting, {})
+        self.assertEqual(collector.statistics()["events"]["deadlock"], 1)
+
+    def test_json_tracer(self):
+        output = io.StringIO()
+        T1 = Transaction(1, [Read('A')])
+        T2 = Transaction(2, [Write('A')])
+        TimestampOrdering([T1, T2], [2, 1], tracer=JsonTracer(output)).run()
+
+        events = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([e["event"] for e in events],
+            ["start", "write", "commit", "start", "abort", "rollback", "start", "read", "commit"])
+        self.assertEqual(events[4]["item"], "A")
+        self.assertEqual(events[4]["detail"], 2)
+
+class TestSerializability(unittest.TestCase):
+
+    def test_serial_order(self):
+        graph = check_serializable(parse_schedule(parse_input("R2(X); W1(Y); R3(Y); W2(Y); W3(Z); C1; C2; C3")))
+        self.assertTrue(graph.is_serializable())
+        self.assertEqual(graph.serial_order(), [1, 3, 2])
+        self.assertEqual(graph.find_cycle(), [])
+
+    def test_cycle(self):
+        graph = check_serializable(parse_schedule(parse_input("R1(X); R2(X); W1(X); W2(X); C1; C2")))
+        self.assertFalse(graph.is_serializable())
+        self.assertIsNone(graph.serial_order())
+        self.assertEqual(sorted(graph.find_cycle()), [1, 2])
+
+    def test_reused_transaction_ids(self):
+        graph = check_serializable(parse_schedule(parse_input("W1(X); C1; R2(X); W1(X); C1; C2")))
+        self.assertEqual(graph.serial_order(), [1, 2, 1])
+
+    def test_two_phase_locking_history(self):
+        t = TwoPhaseLocking(parse_input("R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;"), LockManager())
+        t.run(upgrade=True, detect=True)
+        self.assertEqual(check_serializable(t).serial_order(), [1, 2])
+        self.assertEqual(check_serializable(t.history).serial_order(),
+            PrecedenceGraph().add_operations(
+                (Operation[e.name], tid, item) for e, tid, item, _ in
+                t.history.events({EventType.READ, EventType.WRITE, EventType.COMMIT})).serial_order())
+
+    def test_recorded_histories(self):
+        T1 = OCCTransaction(1, [Read('B'), Write('B'), Read('A'), Write('A')])
+        T2 = OCCTransaction(2, [Read('B'), Write('B'), Read('A'), Write('A')])
+        recorder = HistoryRecorder(deferred_writes=True)
+        occ = OCC([T1, T2], [1, 1, 2, 2, 2, 2, 1, 1], tracer=recorder)
+        occ.run()
+        # the rolled back attempt of T2 is dropped
+        self.assertEqual(check_serializable(recorder).serial_order(), [1, 9])
+
+        recorder = HistoryRecorder(deferred_writes=True)
+        TimestampOrdering([Transaction(1, [Read('A')]), Transaction(2, [Write('A')])], [2, 1], tracer=recorder).run()
+        self.assertEqual(check_serializable(recorder).serial_order(), [2, 3])
+
+class TestBatchReplay(unittest.TestCase):
+
+    def write_schedules(self, directory: str):
+        schedules = ["R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;",
+                     "R1(X); R2(Y); R1(Y); W2(Y); W1(X); C1; C2;",
+                     "W1(X); W2(Y); W1(Y); W2(X); C1; C2"]
+        for i, schedule in enumerate(schedules):
+            path = os.path.join(directory, f"schedule{i}.txt")
+            with open(path, "w") as f:
+                f.write(schedule)
+            # the deadlocked schedule is also replayed as a binary trace
+            if i == 2:
+                convert_schedule(path, os.path.join(directory, f"schedule{i}.trace"))
+
+    def test_replay_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_schedules(directory)
+            self.assertEqual(len(find_schedules(directory)), 4)
+            self.assertEqual(len(find_schedules(os.path.join(directory, "*.txt"))), 3)
+
+            options = {"deadlock": "none", "history": True}
+            serial, serial_totals = replay_schedules(directory, options, workers=1)
+            parallel, parallel_totals = replay_schedules(directory, options, workers=2, chunksize=1)
+
+        strip = lambda results: [{k: v for k, v in r.items() if k != "seconds"} for r in results]
+        self.assertEqual(strip(parallel), strip(serial))
+        self.assertEqual([r.get("error") for r in serial], [None, None, "Deadlock detected", "Deadlock detected"])
+        self.assertEqual(serial_totals["files"], 4)
+        self.assertEqual(serial_totals["failed"], 2)
+        self.assertEqual(parallel_totals["operations"], serial_totals["operations"])
+
+        t = TwoPhaseLocking(parse_input("R1(X); W2(X); W2(Y); W3(Y); W1(X); C1; C2; C3;"), IndexedLockManager())
+        t.run()
+        self.assertEqual(serial[0]["result"], t.result)
+
+    def test_invalid_options(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_schedules(directory)
+            for options in [{"lock_manager": "queued", "deadlock": "wait-die"}, {"deadlock": "sometimes"}]:
+                with self.assertRaises(Exception):
+                    replay_schedules(directory, options, workers=2)
+
 
 if __name__ == '__main__':
     unittest.main()
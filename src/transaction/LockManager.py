@@ -1,8 +1,14 @@
 import enum
+import threading
+import time
+from collections import deque
 
 class LockType(enum.Enum):
     X = 1                       # exclusive lock
     S = 2                       # shared lock
+    IS = 3                      # intention shared lock
+    IX = 4                      # intention exclusive lock
+    SIX = 5                     # shared and intention exclusive lock
 
     def __lt__ (self, other : 'LockType'):
         return self.value < other.value
@@ -13,6 +19,38 @@ class LockType(enum.Enum):
     def __eq__ (self, other : 'LockType'):
         return self.value == other.value
 
+    def __hash__ (self):
+        return hash(self.value)
+
+# modes that may be granted together with the key mode
+COMPATIBILITY = {
+    LockType.IS:  {LockType.IS, LockType.IX, LockType.S, LockType.SIX},
+    LockType.IX:  {LockType.IS, LockType.IX},
+    LockType.S:   {LockType.IS, LockType.S},
+    LockType.SIX: {LockType.IS},
+    LockType.X:   set(),
+}
+
+# modes implied by holding the key mode
+COVERS = {
+    LockType.IS:  {LockType.IS},
+    LockType.IX:  {LockType.IS, LockType.IX},
+    LockType.S:   {LockType.IS, LockType.S},
+    LockType.SIX: {LockType.IS, LockType.IX, LockType.S, LockType.SIX},
+    LockType.X:   {LockType.IS, LockType.IX, LockType.S, LockType.SIX, LockType.X},
+}
+
+def is_compatible(held: LockType, requested: LockType) -> bool:
+    return requested in COMPATIBILITY[held]
+
+def supremum(a: LockType, b: LockType) -> LockType:
+    # weakest mode that covers both a and b
+    if b in COVERS[a]:
+        return a
+    if a in COVERS[b]:
+        return b
+    return LockType.SIX
+
 class LockManager:
     def __init__(self):
         self.locks_table = {}
@@ -32,14 +70,15 @@ class LockManager:
     def unlock_data(self, transaction_id: int, data_item: str):
         if (transaction_id, data_item) in self.locks_table:
             del self.locks_table[(transaction_id, data_item)]
-            if data_item in self.locks_table:
+            # the item stays locked while other transactions share it
+            if data_item in self.locks_table and not self.get_transaction_ids(data_item):
                 del self.locks_table[data_item]
 
     def is_locked(self, data_item: str) -> bool:
         return data_item in self.locks_table
             
     def is_locked_by(self, transaction_id: int) -> bool:
-        return transaction_id in [t[0] for t in self.locks_table]
+        return transaction_id in [t[0] for t in self.locks_table if isinstance(t, tuple)]
         
     def has_lock(self, transaction_id: int, data_item: str) -> bool:
         return (transaction_id, data_item) in self.locks_table
@@ -62,6 +101,617 @@ class LockManager:
         return [t[0] for t in self.locks_table if 
                 isinstance(t, tuple) and t[1] == data_item]
     
+    def get_locked_items(self, transaction_id: int) -> list:
+        return [t[1] for t in self.locks_table if
+                isinstance(t, tuple) and t[0] == transaction_id]
+
     def get_lock_table(self):
         # return lock table with key tuple only
-        return {k: self.locks_table[k] for k in self.locks_table if isinstance(k, tuple)}
\ No newline at end of file
+        return {k: self.locks_table[k] for k in self.locks_table if isinstance(k, tuple)}
+
+class IndexedLockManager(LockManager):
+    '''
+    Lock manager backed by per-item and per-transaction indexes.
+
+    Behaves exactly like LockManager, but instead of one flat table mixing
+    item keys and (transaction_id, data_item) keys it keeps three indexes,
+    so unlocking and holder lookups cost O(locks of the transaction/item)
+    instead of O(total locks).
+
+    Attributes:
+        item_locks (dict): data item -> lock type of the latest lock taken on it.
+        holders (dict): data item -> {transaction_id: lock type}.
+        held (dict): transaction_id -> {data item: lock type}, in acquisition order.
+    '''
+    def __init__(self):
+        self.item_locks = {}
+        self.holders = {}
+        self.held = {}
+
+    def lock_data(self, transaction_id: int, data_item: str, lock_type: LockType):
+        self.item_locks[data_item] = lock_type
+        self.holders.setdefault(data_item, {})[transaction_id] = lock_type
+        self.held.setdefault(transaction_id, {})[data_item] = lock_type
+
+    def unlock(self, transaction_id: int):
+        for data_item in self.held.pop(transaction_id, {}):
+            self._remove_holder(transaction_id, data_item)
+        return True
+
+    def unlock_data(self, transaction_id: int, data_item: str):
+        items = self.held.get(transaction_id)
+        if items is None or data_item not in items:
+            return
+        del items[data_item]
+        if not items:
+            del self.held[transaction_id]
+        self._remove_holder(transaction_id, data_item)
+
+    def _remove_holder(self, transaction_id: int, data_item: str):
+        holders = self.holders[data_item]
+        del holders[transaction_id]
+        if not holders:
+            del self.holders[data_item]
+            self.item_locks.pop(data_item, None)
+
+    def is_locked(self, data_item: str) -> bool:
+        return data_item in self.item_locks
+
+    def is_locked_by(self, transaction_id: int) -> bool:
+        return transaction_id in self.held
+
+    def has_lock(self, transaction_id: int, data_item: str) -> bool:
+        return data_item in self.held.get(transaction_id, ())
+
+    def has_lock_type(self, transaction_id: int, data_item: str, lock_type: LockType) -> bool:
+        return self.held[transaction_id][data_item] == lock_type
+
+    def lock_type(self, data_item: str) -> LockType:
+        return self.item_locks[data_item]
+
+    def upgrade_lock(self, transaction_id: int, data_item: str, lock_type: LockType):
+        self.lock_data(transaction_id, data_item, lock_type)
+
+    def is_lock_shared(self, data_item: str) -> bool:
+        return len(self.holders.get(data_item, ())) > 1
+
+    def get_transaction_ids(self, data_item: str) -> list:
+        return list(self.holders.get(data_item, ()))
+
+    def get_locked_items(self, transaction_id: int) -> list:
+        return list(self.held.get(transaction_id, ()))
+
+    def get_lock_table(self):
+        return {(transaction_id, data_item): lock_type
+                for transaction_id, items in self.held.items()
+                for data_item, lock_type in items.items()}
+
+class LockQueue:
+    '''
+    Lock request queue of a single data item.
+
+    Attributes:
+        granted (dict): transaction_id -> granted lock type (the granted group).
+        waiting (deque): FIFO of (transaction_id, lock_type) requests not granted yet.
+    '''
+    def __init__(self):
+        self.granted = {}
+        self.waiting = deque()
+
+    def is_grantable(self, transaction_id: int, lock_type: LockType) -> bool:
+        return all(is_compatible(mode, lock_type)
+                   for holder, mode in self.granted.items() if holder != transaction_id)
+
+    def group_mode(self) -> LockType:
+        mode = None
+        for held in self.granted.values():
+            mode = held if mode is None else supremum(mode, held)
+        return mode
+
+class LockRequestManager(LockManager):
+    '''
+    Lock manager with a granted group and a FIFO wait queue per data item.
+
+    Requests are checked against the S/X/IS/IX/SIX compatibility matrix.
+    A request that cannot be granted is queued on its data item, and
+    releasing a transaction's locks only re-examines the queues of the
+    items it released.
+
+    Attributes:
+        queues (dict): data item -> LockQueue.
+        held (dict): transaction_id -> {data item: lock type}, in acquisition order.
+        waiting_for (dict): transaction_id -> data item it is queued on.
+
+    Methods:
+        request(transaction_id, data_item, lock_type) -> bool:
+            Grants the lock or queues the request, returns True if granted.
+        release(transaction_id) -> list:
+            Releases every lock of the transaction and returns the newly
+            granted requests as (transaction_id, data_item, lock_type, upgraded).
+    '''
+    def __init__(self):
+        self.queues = {}
+        self.held = {}
+        self.waiting_for = {}
+
+    def request(self, transaction_id: int, data_item: str, lock_type: LockType) -> bool:
+        queue = self.queues.get(data_item)
+        if queue is None:
+            queue = self.queues[data_item] = LockQueue()
+
+        held = queue.granted.get(transaction_id)
+        if held is not None:
+            lock_type = supremum(held, lock_type)
+            if lock_type == held:
+                return True
+            if queue.is_grantable(transaction_id, lock_type):
+                self._grant(queue, transaction_id, data_item, lock_type)
+                return True
+            # conversions go ahead of new requests
+            queue.waiting.appendleft((transaction_id, lock_type))
+        else:
+            if not queue.waiting and queue.is_grantable(transaction_id, lock_type):
+                self._grant(queue, transaction_id, data_item, lock_type)
+                return True
+            queue.waiting.append((transaction_id, lock_type))
+
+        self.waiting_for[transaction_id] = data_item
+        return False
+
+    def release(self, transaction_id: int) -> list:
+        granted = []
+        data_item = self.waiting_for.pop(transaction_id, None)
+        if data_item is not None:
+            queue = self.queues[data_item]
+            queue.waiting = deque(r for r in queue.waiting if r[0] != transaction_id)
+            granted.extend(self._grant_waiters(data_item))
+
+        for data_item in self.held.pop(transaction_id, {}):
+            del self.queues[data_item].granted[transaction_id]
+            granted.extend(self._grant_waiters(data_item))
+        return granted
+
+    def _grant(self, queue: LockQueue, transaction_id: int, data_item: str, lock_type: LockType):
+        queue.granted[transaction_id] = lock_type
+        self.held.setdefault(transaction_id, {})[data_item] = lock_type
+
+    def _grant_waiters(self, data_item: str) -> list:
+        queue = self.queues[data_item]
+        granted = []
+        while queue.waiting:
+            transaction_id, lock_type = queue.waiting[0]
+            if not queue.is_grantable(transaction_id, lock_type):
+                break
+            queue.waiting.popleft()
+            upgraded = transaction_id in queue.granted
+            self._grant(queue, transaction_id, data_item, lock_type)
+            del self.waiting_for[transaction_id]
+            granted.append((transaction_id, data_item, lock_type, upgraded))
+
+        if not queue.granted and not queue.waiting:
+            del self.queues[data_item]
+        return granted
+
+    def granted_mode(self, transaction_id: int, data_item: str) -> LockType:
+        return self.held.get(transaction_id, {}).get(data_item)
+
+    def is_waiting(self, transaction_id: int) -> bool:
+        return transaction_id in self.waiting_for
+
+    # LockManager interface
+    def lock_data(self, transaction_id: int, data_item: str, lock_type: LockType):
+        queue = self.queues.get(data_item)
+        if queue is None:
+            queue = self.queues[data_item] = LockQueue()
+        self._grant(queue, transaction_id, data_item, lock_type)
+
+    def unlock(self, transaction_id: int):
+        self.release(transaction_id)
+        return True
+
+    def unlock_data(self, transaction_id: int, data_item: str):
+        items = self.held.get(transaction_id)
+        if items is None or data_item not in items:
+            return
+        del items[data_item]
+        if not items:
+            del self.held[transaction_id]
+        del self.queues[data_item].granted[transaction_id]
+        self._grant_waiters(data_item)
+
+    def is_locked(self, data_item: str) -> bool:
+        queue = self.queues.get(data_item)
+        return queue is not None and len(queue.granted) > 0
+
+    def is_locked_by(self, transaction_id: int) -> bool:
+        return transaction_id in self.held
+
+    def has_lock(self, transaction_id: int, data_item: str) -> bool:
+        return data_item in self.held.get(transaction_id, ())
+
+    def has_lock_type(self, transaction_id: int, data_item: str, lock_type: LockType) -> bool:
+        return self.held[transaction_id][data_item] == lock_type
+
+    def lock_type(self, data_item: str) -> LockType:
+        return self.queues[data_item].group_mode()
+
+    def upgrade_lock(self, transaction_id: int, data_item: str, lock_type: LockType):
+        self.lock_data(transaction_id, data_item, lock_type)
+
+    def is_lock_shared(self, data_item: str) -> bool:
+        queue = self.queues.get(data_item)
+        return queue is not None and len(queue.granted) > 1
+
+    def get_transaction_ids(self, data_item: str) -> list:
+        queue = self.queues.get(data_item)
+        return list(queue.granted) if queue is not None else []
+
+    def get_locked_items(self, transaction_id: int) -> list:
+        return list(self.held.get(transaction_id, ()))
+
+    def get_lock_table(self):
+        return {(transaction_id, data_item): lock_type
+                for transaction_id, items in self.held.items()
+                for data_item, lock_type in items.items()}
+
+# modes a transaction holding the key mode on a node holds implicitly on
+# every node below it, intention modes cover nothing
+IMPLICIT = {
+    LockType.S: LockType.S,
+    LockType.SIX: LockType.S,
+    LockType.X: LockType.X,
+}
+
+def intention(lock_type: LockType) -> LockType:
+    # mode taken on the ancestors of a node locked in lock_type
+    return LockType.IS if lock_type in (LockType.S, LockType.IS) else LockType.IX
+
+class HierarchicalLockManager(LockRequestManager):
+    '''
+    Multigranularity lock manager over hierarchical data item names.
+
+    A data item such as "T.P3.R17" lies below its ancestors "T" and "T.P3".
+    A lock on a data item first takes the intention mode (IS for S, IX for
+    X) on every ancestor, top down, so a request waits on the first node
+    it conflicts on and is resumed by release. A lock held in S, SIX or X
+    on a node covers the nodes below it.
+
+    When a transaction holds escalation_threshold S or X locks directly
+    below a node, they are replaced by one S (or X if the transaction holds
+    IX on the node) lock on the node, provided no other transaction
+    conflicts or waits there. The data items it accessed below an escalated
+    node are remembered, and when another transaction requests a
+    conflicting lock on the node the escalation is undone, the node goes
+    back to an intention mode with the remembered locks below it, and it is
+    not escalated again before the transaction releases its locks.
+
+    Attributes:
+        escalation_threshold (int): Locks below a node that trigger escalation.
+        separator (str): Separator of the levels of a data item name.
+        symbols (SymbolTable): Set when data items are symbols of it, the
+            ancestors are then interned in it too, None for names.
+        children (dict): transaction_id -> {node: {child: None}} of the
+            S and X locks held directly below each node.
+        escalated (dict): transaction_id -> {node: {data item: lock type}}
+            accessed below each escalated node.
+        pinned (dict): transaction_id -> nodes it may not escalate again.
+        pending (dict): transaction_id -> (data item, lock type, path index,
+            lock type held before) of its request in progress.
+        escalations (int): Number of escalations.
+        deescalations (int): Number of escalations undone.
+
+    Methods:
+        path(data_item) -> list:
+            Returns the ancestors of the data item, top down, and the item.
+        covering(transaction_id, data_item) -> tuple:
+            Returns (node, mode) of the nearest ancestor whose lock covers
+            the data item, None if there is none.
+    '''
+    def __init__(self, escalation_threshold: int = 1000, separator: str = "."):
+        super().__init__()
+        if escalation_threshold < 1:
+            raise Exception("Invalid escalation threshold")
+        self.escalation_threshold = escalation_threshold
+        self.separator = separator
+        self.symbols = None
+        self.children = {}
+        self.escalated = {}
+        self.pinned = {}
+        self.pending = {}
+        self.escalations = 0
+        self.deescalations = 0
+
+    def _name(self, data_item) -> str:
+        return data_item if self.symbols is None else self.symbols.names[data_item]
+
+    def _node(self, name: str):
+        return name if self.symbols is None else self.symbols.intern(name)
+
+    def path(self, data_item: str) -> list:
+        parts = self._name(data_item).split(self.separator)
+        return [self._node(self.separator.join(parts[:i])) for i in range(1, len(parts) + 1)]
+
+    def parent(self, data_item: str) -> str:
+        name = self._name(data_item)
+        index = name.rfind(self.separator)
+        return self._node(name[:index]) if index >= 0 else None
+
+    def is_below(self, data_item: str, node: str) -> bool:
+        return self._name(data_item).startswith(self._name(node) + self.separator)
+
+    def covering(self, transaction_id: int, data_item: str) -> tuple:
+        held = self.held.get(transaction_id)
+        if not held:
+            return None
+        node = self.parent(data_item)
+        while node is not None:
+            mode = held.get(node)
+            if mode in IMPLICIT:
+                return node, mode
+            node = self.parent(node)
+        return None
+
+    def granted_mode(self, transaction_id: int, data_item: str) -> LockType:
+        mode = self.held.get(transaction_id, {}).get(data_item)
+        cover = self.covering(transaction_id, data_item)
+        if cover is None:
+            return mode
+        implicit = IMPLICIT[cover[1]]
+        return implicit if mode is None else supremum(mode, implicit)
+
+    def request(self, transaction_id: int, data_item: str, lock_type: LockType) -> bool:
+        self.pending[transaction_id] = (data_item, lock_type, 0,
+                                        self.granted_mode(transaction_id, data_item))
+        return self._acquire(transaction_id, 0)
+
+    def _acquire(self, transaction_id: int, start: int) -> bool:
+        # lock the path of the pending request from index start, returns
+        # False if the request is queued on one of its nodes
+        data_item, lock_type, _, held = self.pending[transaction_id]
+
+        cover = self.covering(transaction_id, data_item)
+        if cover is not None and lock_type in COVERS[IMPLICIT[cover[1]]]:
+            accessed = self.escalated.get(transaction_id, {}).get(cover[0])
+            if accessed is not None:
+                old = accessed.get(data_item)
+                accessed[data_item] = lock_type if old is None else supremum(old, lock_type)
+            del self.pending[transaction_id]
+            return True
+
+        path = self.path(data_item)
+        for index in range(start, len(path)):
+            node = path[index]
+            mode = lock_type if index == len(path) - 1 else intention(lock_type)
+            self._deescalate_conflicting(transaction_id, node, mode)
+            if not super().request(transaction_id, node, mode):
+                self.pending[transaction_id] = (data_item, lock_type, index, held)
+                return False
+
+        del self.pending[transaction_id]
+        self._count(transaction_id, data_item)
+        return True
+
+    def release(self, transaction_id: int) -> list:
+        self.children.pop(transaction_id, None)
+        self.escalated.pop(transaction_id, None)
+        self.pinned.pop(transaction_id, None)
+        self.pending.pop(transaction_id, None)
+
+        # a grant on an ancestor moves the waiting request down its path,
+        # only requests that reach their data item are returned
+        granted = []
+        for waiter, _, _, _ in super().release(transaction_id):
+            data_item, _, index, held = self.pending[waiter]
+            if self._acquire(waiter, index + 1):
+                granted.append((waiter, data_item, self.granted_mode(waiter, data_item), held is not None))
+        return granted
+
+    def _count(self, transaction_id: int, node: str):
+        # count the lock on node below its parent and escalate the parents
+        # that reach the threshold
+        children = self.children.setdefault(transaction_id, {})
+        pinned = self.pinned.get(transaction_id, ())
+        parent = self.parent(node)
+        while parent is not None and parent not in pinned:
+            below = children.setdefault(parent, {})
+            below[node] = None
+            if len(below) < self.escalation_threshold or not self._escalate(transaction_id, parent):
+                return
+            node, parent = parent, self.parent(parent)
+
+    def _escalate(self, transaction_id: int, node: str) -> bool:
+        held = self.held[transaction_id]
+        mode = LockType.S if held[node] == LockType.IS else LockType.X
+        queue = self.queues[node]
+        if queue.waiting or not queue.is_grantable(transaction_id, mode):
+            return False
+
+        below = [item for item in held if self.is_below(item, node)]
+        if any(self.queues[item].waiting for item in below):
+            return False
+
+        escalated = self.escalated.setdefault(transaction_id, {})
+        # a node escalated to S and escalated again to X keeps what it
+        # remembered from the first escalation
+        accessed = escalated.pop(node, {})
+
+        def remember(item: str, lock_type: LockType):
+            old = accessed.get(item)
+            accessed[item] = lock_type if old is None else supremum(old, lock_type)
+
+        for item in below:
+            if item in escalated:
+                # remembered there instead of its escalated lock
+                for below_item, below_mode in escalated.pop(item).items():
+                    remember(below_item, below_mode)
+            elif held[item] in IMPLICIT:
+                remember(item, held[item])
+            del held[item]
+            item_queue = self.queues[item]
+            del item_queue.granted[transaction_id]
+            if not item_queue.granted:
+                del self.queues[item]
+        escalated[node] = accessed
+
+        children = self.children[transaction_id]
+        for item in [item for item in children if item == node or self.is_below(item, node)]:
+            del children[item]
+
+        self._grant(queue, transaction_id, node, mode)
+        self.escalations += 1
+        return True
+
+    def _deescalate_conflicting(self, transaction_id: int, node: str, lock_type: LockType):
+        queue = self.queues.get(node)
+        if queue is None:
+            return
+        for holder, mode in list(queue.granted.items()):
+            if (holder != transaction_id and not is_compatible(mode, lock_type)
+                    and node in self.escalated.get(holder, ())):
+                self._deescalate(holder, node)
+
+    def _deescalate(self, transaction_id: int, node: str):
+        accessed = self.escalated[transaction_id].pop(node)
+        shared = self.held[transaction_id][node] == LockType.S
+        mode = LockType.IS if shared and all(m == LockType.S for m in accessed.values()) else LockType.IX
+        self.queues[node].granted[transaction_id] = mode
+        self.held[transaction_id][node] = mode
+
+        # nothing below the node conflicts with what the escalated lock covered
+        for item, item_mode in accessed.items():
+            for ancestor in self.path(item)[:-1]:
+                if self.is_below(ancestor, node):
+                    self._add_lock(transaction_id, ancestor, intention(item_mode))
+            self._add_lock(transaction_id, item, item_mode)
+            self.children.setdefault(transaction_id, {}).setdefault(self.parent(item), {})[item] = None
+
+        self.pinned.setdefault(transaction_id, set()).add(node)
+        self.deescalations += 1
+
+    def _add_lock(self, transaction_id: int, data_item: str, lock_type: LockType):
+        queue = self.queues.get(data_item)
+        if queue is None:
+            queue = self.queues[data_item] = LockQueue()
+        held = queue.granted.get(transaction_id)
+        self._grant(queue, transaction_id, data_item, lock_type if held is None else supremum(held, lock_type))
+
+    def get_locked_items(self, transaction_id: int) -> list:
+        # intention locks are implied by the locks below them
+        return [item for item, mode in self.held.get(transaction_id, {}).items() if mode in IMPLICIT]
+
+class LatchedLockQueue(LockQueue):
+    '''
+    LockQueue with a condition variable on the latch of its stripe.
+
+    Attributes:
+        condition (threading.Condition): Waiters of this data item.
+    '''
+    def __init__(self, latch: threading.Lock):
+        super().__init__()
+        self.condition = threading.Condition(latch)
+
+class ConcurrentLockManager:
+    '''
+    Thread-safe lock manager for transactions running in their own threads.
+
+    Data items are hashed onto stripes, each with its own latch and table,
+    so requests on unrelated items rarely contend. A request that cannot be
+    granted blocks on the condition variable of its data item and is woken
+    only when that item changes.
+
+    Attributes:
+        latches (list): Stripe latches.
+        tables (list): Per stripe data item -> LatchedLockQueue.
+        held (dict): transaction_id -> {data item: lock type}, only touched
+            by the thread running the transaction.
+
+    Methods:
+        acquire(transaction_id, data_item, lock_type, timeout) -> bool:
+            Blocks until the lock is granted, returns False on timeout.
+        release(transaction_id) -> None:
+            Releases every lock of the transaction and wakes the waiters
+            of the released items.
+    '''
+    def __init__(self, stripes: int = 64):
+        self.latches = [threading.Lock() for _ in range(stripes)]
+        self.tables = [{} for _ in range(stripes)]
+        self.held = {}
+        self.held_latch = threading.Lock()
+
+    def stripe(self, data_item: str) -> int:
+        return hash(data_item) % len(self.latches)
+
+    def acquire(self, transaction_id: int, data_item: str, lock_type: LockType, timeout: float = None) -> bool:
+        index = self.stripe(data_item)
+        latch = self.latches[index]
+        table = self.tables[index]
+
+        with latch:
+            queue = table.get(data_item)
+            if queue is None:
+                queue = table[data_item] = LatchedLockQueue(latch)
+
+            held = queue.granted.get(transaction_id)
+            if held is not None:
+                lock_type = supremum(held, lock_type)
+                if lock_type == held:
+                    return True
+
+            if not queue.waiting and queue.is_grantable(transaction_id, lock_type):
+                queue.granted[transaction_id] = lock_type
+            elif not self._wait(queue, transaction_id, lock_type, held is not None, timeout):
+                if not queue.granted and not queue.waiting:
+                    del table[data_item]
+                return False
+
+        items = self.held.get(transaction_id)
+        if items is None:
+            with self.held_latch:
+                items = self.held[transaction_id] = {}
+        items[data_item] = lock_type
+        return True
+
+    def _wait(self, queue: LatchedLockQueue, transaction_id: int, lock_type: LockType,
+              conversion: bool, timeout: float) -> bool:
+        # called with the stripe latch held, conversions go ahead of new requests
+        request = (transaction_id, lock_type)
+        if conversion:
+            queue.waiting.appendleft(request)
+        else:
+            queue.waiting.append(request)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while queue.waiting[0] is not request or not queue.is_grantable(transaction_id, lock_type):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                queue.waiting.remove(request)
+                queue.condition.notify_all()
+                return False
+            queue.condition.wait(remaining)
+
+        queue.waiting.popleft()
+        queue.granted[transaction_id] = lock_type
+        # the next request may be compatible as well
+        queue.condition.notify_all()
+        return True
+
+    def release(self, transaction_id: int):
+        with self.held_latch:
+            items = self.held.pop(transaction_id, {})
+
+        for data_item in items:
+            index = self.stripe(data_item)
+            with self.latches[index]:
+                table = self.tables[index]
+                queue = table[data_item]
+                del queue.granted[transaction_id]
+                if queue.waiting:
+                    queue.condition.notify_all()
+                elif not queue.granted:
+                    del table[data_item]
+
+    def granted_mode(self, transaction_id: int, data_item: str) -> LockType:
+        return self.held.get(transaction_id, {}).get(data_item)
+
+    def get_locked_items(self, transaction_id: int) -> list:
+        return list(self.held.get(transaction_id, ()))
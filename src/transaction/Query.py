@@ -1,19 +1,16 @@
 from typing import List
 
 class Query:
-    def __init__(self, item: str) -> None:
+    def __init__(self, item: str, value: bytes = None) -> None:
         self.item: str = item
+        # value written, or the value read once a read has run
+        self.value: bytes = value
     
     def get_data_item(self) -> List[str]:
         return self.item
-    
-    def show(self) -> None:
-        raise NotImplementedError()
 
 class Read(Query):
-    def show(self, timestamp: int) -> None:
-        print(f"R{timestamp}({self.item})")
+    pass
 
 class Write(Query):
-    def show(self, timestamp: int) -> None:
-        print(f"W{timestamp}({self.item})")
\ No newline at end of file
+    pass
@@ -1,13 +1,24 @@
-from typing import List
+from typing import List, Tuple
 
-from .Query import Query
+from .Query import Query, Read, Write
+from util.Tracer import NO_TRACER, TraceEvent
 
 class Transaction:
     def __init__(self, start_timestamp: int, list_of_queries: List[Query]) -> None:
         self.start_timestamp = start_timestamp
+        # stays the same when a rollback moves the start timestamp
+        self.transaction_id = start_timestamp
         self.list_of_queries = list_of_queries
         self.query_index = 0
 
+        # set by the concurrency control, writes go to it in place and
+        # keep the value they replaced to undo them on rollback
+        self.storage = None
+        self.undo: List[Tuple[str, bytes]] = []
+
+        # set by the concurrency control, receives the transaction's events
+        self.tracer = NO_TRACER
+
     @property
     def length(self) -> int:
         return len(self.list_of_queries)
@@ -22,12 +33,40 @@ class Transaction:
     def next_query(self) -> None:
         self.query_index += 1
 
+    def read(self, data_item: str) -> bytes:
+        return self.storage.get(data_item)
+
+    def write(self, data_item: str, value: bytes) -> None:
+        self.undo.append((data_item, self.storage.get(data_item)))
+        self.storage.put(data_item, value)
+
+    def write_value(self, query: Write) -> bytes:
+        # a write without a value writes the transaction's name
+        return f"T{self.transaction_id}".encode() if query.value is None else query.value
+
+    def execute(self) -> None:
+        # runs the current query against the storage
+        if self.storage is None:
+            return
+        query = self.current_query
+        item = query.get_data_item()
+        if isinstance(query, Read):
+            query.value = self.read(item)
+        elif isinstance(query, Write):
+            self.write(item, self.write_value(query))
+
     def rollback(self, new_timestamp: int) -> None:
-        print(f"T{self.start_timestamp} rolled back.")
-        print()
+        for data_item, value in reversed(self.undo):
+            self.storage.put(data_item, value)
+        self.undo = []
+
+        if self.tracer.enabled:
+            self.tracer.event(TraceEvent.ROLLBACK, self.start_timestamp)
         self.start_timestamp = new_timestamp
         self.query_index = 0
 
     def commit(self) -> None:
-        print(f"T{self.start_timestamp} committed.")
-        print()
+        self.undo = []
+
+        if self.tracer.enabled:
+            self.tracer.event(TraceEvent.COMMIT, self.start_timestamp)
@@ -0,0 +1,171 @@
+# binary schedule trace
+# a compact alternative to the R1(X); W2(X); C1; text format, a header,
+# operation records stored column by column in blocks and the dictionary of
+# data items
+
+# file format, little endian
+# <magic: "SCHD"> <version: uint16> <reserved: uint16> <count: uint64>
+# <dictionary offset: uint64> <block: uint32> <reserved: uint32>
+# <block>* of block records each, the last one of the rest,
+#   <transaction_id: uint32>* <item: int32>* <code: uint8>* <zero padding to 4 bytes>
+# <dictionary> <items: uint32> (<length: uint16> <utf-8>)*
+# code is the value of the Operation, item is the id of the data item in the
+# dictionary, in order of first appearance, or -1 for commits. the columns
+# of a block are read as typed memoryviews of the mapping, without
+# unpacking a tuple per record
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from util.Util import SymbolTable, NO_ITEM
+
+MAGIC = b"SCHD"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHQQII")
+ITEMS = struct.Struct("<I")
+ITEM = struct.Struct("<H")
+
+# the columns are cast to native integers, swapped on big endian machines
+SWAP = sys.byteorder != "little"
+
+def block_size(records: int) -> int:
+    # bytes of a block of records, padded so every block starts aligned
+    return records * 9 + (-records & 3)
+
+def write_block(f, transaction_ids: array, items: array, codes: bytearray):
+    if SWAP:
+        transaction_ids.byteswap()
+        items.byteswap()
+    f.write(transaction_ids)
+    f.write(items)
+    f.write(codes)
+    f.write(bytes(-len(codes) & 3))
+
+def write_trace(filename: str, operations, batch: int = 1 << 16) -> int:
+    # write parsed (operation, transaction_id, data_item) tuples as a trace,
+    # returns the number of records. operations may be any iterable, records
+    # are written one block of batch records at a time so the schedule is
+    # never held in memory
+    symbols = SymbolTable()
+    intern = symbols.intern
+    count = 0
+    with open(filename, "wb") as f:
+        f.write(bytes(HEADER.size))
+        transaction_ids, items, codes = array('I'), array('i'), bytearray()
+        for operation, transaction_id, data_item in operations:
+            transaction_ids.append(transaction_id)
+            items.append(intern(data_item) if data_item != "" else NO_ITEM)
+            codes.append(operation.value)
+            if len(codes) == batch:
+                write_block(f, transaction_ids, items, codes)
+                count += batch
+                transaction_ids, items, codes = array('I'), array('i'), bytearray()
+        if codes:
+            write_block(f, transaction_ids, items, codes)
+            count += len(codes)
+
+        dictionary = f.tell()
+        f.write(ITEMS.pack(len(symbols)))
+        for name in symbols.names:
+            name = name.encode()
+            f.write(ITEM.pack(len(name)))
+            f.write(name)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, count, dictionary, batch, 0))
+    return count
+
+class Trace:
+    '''
+    Memory mapped binary schedule trace.
+
+    Records are read straight from the mapping, one block of columns at a
+    time, while they are iterated, only the dictionary is decoded when the
+    trace is opened.
+
+    Attributes:
+        path (str): The trace file.
+        count (int): Number of records.
+        block (int): Records per block.
+        names (list): item id -> data item.
+
+    Methods:
+        columns() -> iterator:
+            Yields (codes, transaction ids, item ids) sequences of every
+            block in order.
+        records() -> iterator:
+            Yields (code, transaction_id, item id) of every record in order.
+        close() -> None:
+            Unmaps the trace.
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise Exception("Invalid trace file")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.dictionary, self.block, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or (self.count and not self.block):
+            self.close()
+            raise Exception("Invalid trace file")
+        full, rest = divmod(self.count, self.block) if self.count else (0, 0)
+        if HEADER.size + full * block_size(self.block) + block_size(rest) != self.dictionary:
+            self.close()
+            raise Exception("Truncated trace file")
+        self.names = self.load_names()
+
+    def load_names(self) -> list:
+        names = []
+        (items,) = ITEMS.unpack_from(self.map, self.dictionary)
+        offset = self.dictionary + ITEMS.size
+        for _ in range(items):
+            (length,) = ITEM.unpack_from(self.map, offset)
+            offset += ITEM.size
+            names.append(self.map[offset:offset + length].decode())
+            offset += length
+        return names
+
+    def __len__(self) -> int:
+        return self.count
+
+    def columns(self):
+        # the views are released once the next block is asked for, callers
+        # do not keep them
+        view = memoryview(self.map)
+        offset = HEADER.size
+        try:
+            for first in range(0, self.count, self.block):
+                records = min(self.block, self.count - first)
+                columns = (view[offset + 8 * records:offset + 9 * records],
+                           view[offset:offset + 4 * records].cast('I'),
+                           view[offset + 4 * records:offset + 8 * records].cast('i'))
+                if SWAP:
+                    columns = (columns[0], array('I', columns[1]), array('i', columns[2]))
+                    columns[1].byteswap()
+                    columns[2].byteswap()
+                yield columns
+                for column in columns:
+                    if isinstance(column, memoryview):
+                        column.release()
+                offset += block_size(records)
+        finally:
+            view.release()
+
+    def records(self):
+        for codes, transaction_ids, items in self.columns():
+            yield from zip(codes, transaction_ids, items)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> 'Trace':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
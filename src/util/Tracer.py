@@ -0,0 +1,166 @@
+# tracing of concurrency control runs
+# engines report what happens to a Tracer instead of printing it. the
+# default tracer is disabled, engines check Tracer.enabled before building
+# an event, so an untraced run pays one attribute test per event site
+
+# events, reported with a transaction, a data item ("" if none) and a detail
+# START     transaction started (OCC, MVCC, timestamp ordering)
+# READ      read ran
+# WRITE     write ran
+# SKIP      write skipped by Thomas's write rule
+# COMMIT    transaction committed
+# ROLLBACK  transaction rolled back to a new start timestamp
+# ABORT     transaction aborted on the data item, detail is the transaction
+#           it conflicted with if known
+# WAIT      transaction blocked on the data item, detail is the number of
+#           transactions waiting on it
+# WAKE      transaction stopped waiting, granted or aborted
+# WOUND     transaction wounds the holders of the data item, detail is the
+#           list of wounded transactions
+# DEADLOCK  waits-for cycle found, detail is the cycle, transaction the victim
+
+import enum
+import json
+import time
+from collections import Counter
+
+class TraceEvent(enum.IntEnum):
+    START = 1
+    READ = 2
+    WRITE = 3
+    SKIP = 4
+    COMMIT = 5
+    ROLLBACK = 6
+    ABORT = 7
+    WAIT = 8
+    WAKE = 9
+    WOUND = 10
+    DEADLOCK = 11
+
+class Tracer:
+    '''
+    Tracer Base Class, ignores every event.
+
+    Attributes:
+        enabled (bool): False if events may be skipped without calling event.
+
+    Methods:
+        event(event, transaction_id, data_item, detail) -> None:
+            Called for every event of a run.
+    '''
+    enabled = False
+
+    def event(self, event: TraceEvent, transaction_id: int, data_item: str = "", detail=None):
+        pass
+
+NO_TRACER = Tracer()
+
+class ConsoleTracer(Tracer):
+    '''
+    Prints events as the simulator shows them.
+    '''
+    enabled = True
+
+    def event(self, event: TraceEvent, transaction_id: int, data_item: str = "", detail=None):
+        match event:
+            case TraceEvent.START:
+                print(f"T{transaction_id} started.")
+            case TraceEvent.READ:
+                print(f"R{transaction_id}({data_item})")
+            case TraceEvent.WRITE:
+                print(f"W{transaction_id}({data_item})")
+            case TraceEvent.SKIP:
+                print(f"W{transaction_id}({data_item}) skipped.")
+            case TraceEvent.COMMIT:
+                print(f"T{transaction_id} committed.")
+                print()
+            case TraceEvent.ROLLBACK:
+                print(f"T{transaction_id} rolled back.")
+                print()
+            case TraceEvent.ABORT:
+                if detail is not None:
+                    print(f"Conflict with T{detail}.")
+                else:
+                    print(f"Conflict on {data_item}.")
+            case TraceEvent.WAIT:
+                print(f"T{transaction_id} waits for {data_item}.")
+            case TraceEvent.WOUND:
+                print(f"Wound wait: T{transaction_id} rolls back {detail} on {data_item}.")
+            case TraceEvent.DEADLOCK:
+                print(f"Deadlock: {detail}, victim T{transaction_id}.")
+
+class Collector(Tracer):
+    '''
+    Counts events and keeps histograms of lock waits.
+
+    Wait times are measured from WAIT to WAKE and bucketed by powers of two
+    microseconds, bucket b holds waits shorter than 2^b us.
+
+    Attributes:
+        events (Counter): TraceEvent -> count.
+        aborts_per_item (Counter): data item -> aborts on it.
+        wait_time (Counter): bucket -> waits.
+        queue_length (Counter): transactions waiting on the item -> waits.
+        total_wait (float): Seconds spent waiting by all transactions.
+        waiting (dict): transaction_id -> perf_counter when it started waiting.
+
+    Methods:
+        statistics() -> dict:
+            Returns the counters and histograms.
+    '''
+    enabled = True
+
+    def __init__(self):
+        self.events = Counter()
+        self.aborts_per_item = Counter()
+        self.wait_time = Counter()
+        self.queue_length = Counter()
+        self.total_wait = 0.0
+        self.waiting = {}
+
+    def event(self, event: TraceEvent, transaction_id: int, data_item: str = "", detail=None):
+        self.events[event] += 1
+        if event == TraceEvent.WAIT:
+            self.waiting[transaction_id] = time.perf_counter()
+            self.queue_length[detail] += 1
+        elif event == TraceEvent.WAKE:
+            started = self.waiting.pop(transaction_id, None)
+            if started is not None:
+                waited = time.perf_counter() - started
+                self.total_wait += waited
+                self.wait_time[int(waited * 1e6).bit_length()] += 1
+        elif event == TraceEvent.ABORT and data_item != "":
+            self.aborts_per_item[data_item] += 1
+
+    def statistics(self) -> dict:
+        return {
+            "events": {event.name.lower(): count for event, count in self.events.items()},
+            "aborts_per_item": dict(self.aborts_per_item.most_common()),
+            "wait_time_us": {f"<{1 << bucket}": count for bucket, count in sorted(self.wait_time.items())},
+            "queue_length": dict(sorted(self.queue_length.items())),
+            "total_wait_seconds": self.total_wait,
+        }
+
+class JsonTracer(Tracer):
+    '''
+    Writes every event as a JSON object on its own line.
+
+    Attributes:
+        file: Text file the events are written to.
+        started (float): perf_counter when the tracer was created, event
+            times are seconds since then.
+    '''
+    enabled = True
+
+    def __init__(self, file):
+        self.file = file
+        self.started = time.perf_counter()
+
+    def event(self, event: TraceEvent, transaction_id: int, data_item: str = "", detail=None):
+        self.file.write(json.dumps({
+            "time": time.perf_counter() - self.started,
+            "event": event.name.lower(),
+            "transaction": transaction_id,
+            "item": data_item,
+            "detail": detail,
+        }) + "\n")
@@ -9,6 +9,68 @@ def read_file(filename: str) -> str:
     with open(filename, 'r') as f:
         return f.read()
 
+def read_operations(filename: str, chunk_size: int = 1 << 20):
+    # yields the operations of a schedule file one at a time, reading it in
+    # chunks so only one chunk is in memory however large the file is
+    with open(filename, 'r') as f:
+        rest = ""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parts = (rest + chunk).split(";")
+            # the last part may continue in the next chunk
+            rest = parts.pop()
+            for s in parts:
+                s = s.strip()
+                if s != '':
+                    yield s
+        rest = rest.strip()
+        if rest != '':
+            yield rest
+
+# symbol of operations without a data item, such as commits
+NO_ITEM = -1
+
+class SymbolTable:
+    '''
+    Maps data item names to dense integer ids, in order of first appearance.
+
+    Attributes:
+        ids (dict): data item -> id.
+        names (list): id -> data item.
+
+    Methods:
+        intern(name) -> int:
+            Returns the id of name, assigning the next free id if it is new.
+        lookup(name) -> int:
+            Returns the id of name, or -1 if it was never interned.
+        name(symbol) -> str:
+            Returns the data item with the given id.
+    '''
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def intern(self, name: str) -> int:
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol
+
+    def lookup(self, name: str) -> int:
+        return self.ids.get(name, NO_ITEM)
+
+    def name(self, symbol: int) -> str:
+        return self.names[symbol]
+
 # two phase lock menu
 def menu_tpl() -> str:
 
@@ -31,24 +93,32 @@ def input_tpl(choice: str, sample: str) -> str:
     else:
         raise Exception("Invalid choice")
 
+DEADLOCK_POLICIES = ["none", "wound-wait", "wait-die", "no-wait", "timeout", "detect"]
+
 def option_tpl() -> list:
     # return y or n if user want to user option
     # 1st option automatic lock retrieval
-    # 2nd option deadlock prevention with wound wait scheme
+    # 2nd option deadlock handling policy
     # 3rd option verbose mode
 
     print("All option default is No")
     print("Do you want to enable automatic lock retrieval? (y/n)")
     option1 = input("Enter your choice: ")
 
-    print("Do you want to enable deadlock prevention with wound wait scheme? (y/n)")
+    print("Choose deadlock handling:")
+    print("1. None")
+    print("2. Wound wait")
+    print("3. Wait die")
+    print("4. No wait")
+    print("5. Timeout")
+    print("6. Waits-for graph detection")
     option2 = input("Enter your choice: ")
 
     print("Do you want to enable verbose mode? (y/n)")
     option3 = input("Enter your choice: ")
 
     option1 = True if option1.lower() == 'y' else False
-    option2 = True if option2.lower() == 'y' else False
+    option2 = DEADLOCK_POLICIES[int(option2) - 1] if option2 in ["2", "3", "4", "5", "6"] else "none"
     option3 = True if option3.lower() == 'y' else False
 
     return [option1, option2, option3]
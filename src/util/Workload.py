@@ -0,0 +1,130 @@
+# synthetic workload generator
+# builds seeded random transactions over a fixed set of keys and interleaves
+# them, the same workload can be given to TwoPhaseLocking as a schedule and
+# to OCC, MVCC and timestamp ordering as transactions
+
+# keys are drawn from a Zipfian distribution, key k (from 0) is picked with
+# probability proportional to 1 / (k + 1)^skew, skew 0 is uniform
+
+import bisect
+import itertools
+import random
+
+from transaction.Query import Read, Write
+
+class Workload:
+    '''
+    Seeded synthetic workload.
+
+    Every transaction runs operations reads and writes followed by a
+    commit. At most concurrency transactions are active at a time, each
+    step of the interleaving runs the next operation of one of them picked
+    at random, and a transaction that commits is replaced by the next one.
+
+    Attributes:
+        transactions (int): Number of transactions.
+        operations (int): Reads and writes per transaction.
+        read_ratio (float): Fraction of the operations that are reads.
+        keys (int): Number of distinct data items.
+        skew (float): Zipfian exponent of the key distribution.
+        concurrency (int): Transactions active at a time.
+        seed (int): Seed of the generator.
+        queries (list): transaction id - 1 -> list of (is_read, key) pairs.
+        order (list): Transaction id of every step of the interleaving.
+
+    Methods:
+        schedule() -> list:
+            Returns the interleaving as operation strings for TwoPhaseLocking.
+        transaction_schedule(transaction_class) -> tuple:
+            Returns (transactions, schedule) for a ConcurrencyControl engine.
+    '''
+    def __init__(self, transactions: int = 100, operations: int = 10, read_ratio: float = 0.5,
+                 keys: int = 1000, skew: float = 0.0, concurrency: int = 8, seed: int = 0):
+        if transactions < 1 or operations < 1 or keys < 1 or concurrency < 1:
+            raise Exception("Invalid workload parameters")
+        if not 0.0 <= read_ratio <= 1.0:
+            raise Exception("Invalid read ratio")
+        self.transactions = transactions
+        self.operations = operations
+        self.read_ratio = read_ratio
+        self.keys = keys
+        self.skew = skew
+        self.concurrency = concurrency
+        self.seed = seed
+
+        rng = random.Random(seed)
+        self.queries = self.generate_queries(rng)
+        self.order = self.interleave(rng)
+
+    def key_weights(self) -> list:
+        # cumulative Zipfian weights of the keys
+        return list(itertools.accumulate(1.0 / (k + 1) ** self.skew for k in range(self.keys)))
+
+    def generate_queries(self, rng: random.Random) -> list:
+        weights = self.key_weights()
+        total = weights[-1]
+        keys = self.keys - 1
+        queries = []
+        for _ in range(self.transactions):
+            queries.append([
+                (rng.random() < self.read_ratio,
+                 min(bisect.bisect(weights, rng.random() * total), keys))
+                for _ in range(self.operations)
+            ])
+        return queries
+
+    def interleave(self, rng: random.Random) -> list:
+        # reads and writes of every transaction plus its commit
+        steps = self.operations + 1
+        active = []
+        left = {}
+        next_id = 1
+        order = []
+        while active or next_id <= self.transactions:
+            while len(active) < self.concurrency and next_id <= self.transactions:
+                active.append(next_id)
+                left[next_id] = steps
+                next_id += 1
+            index = rng.randrange(len(active))
+            transaction_id = active[index]
+            order.append(transaction_id)
+            left[transaction_id] -= 1
+            if left[transaction_id] == 0:
+                active[index] = active[-1]
+                active.pop()
+        return order
+
+    def __len__(self) -> int:
+        # operations of the schedule, commits included
+        return len(self.order)
+
+    def schedule(self) -> list:
+        position = [0] * (self.transactions + 1)
+        schedule = []
+        for transaction_id in self.order:
+            queries = self.queries[transaction_id - 1]
+            index = position[transaction_id]
+            if index == len(queries):
+                schedule.append(f"C{transaction_id}")
+            else:
+                is_read, key = queries[index]
+                schedule.append(f"{'R' if is_read else 'W'}{transaction_id}(K{key})")
+            position[transaction_id] = index + 1
+        return schedule
+
+    def transaction_schedule(self, transaction_class) -> tuple:
+        # commits are implicit after the last query, so they are left out of
+        # the schedule of start timestamps
+        transactions = [
+            transaction_class(transaction_id, [
+                Read(f"K{key}") if is_read else Write(f"K{key}") for is_read, key in queries
+            ])
+            for transaction_id, queries in enumerate(self.queries, 1)
+        ]
+        position = [0] * (self.transactions + 1)
+        schedule = []
+        for transaction_id in self.order:
+            if position[transaction_id] < self.operations:
+                schedule.append(transaction_id)
+            position[transaction_id] += 1
+        return transactions, schedule